@@ -4,8 +4,9 @@ import re
 import json
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from reviewer import llm # Import the shared LLM instance
-from utils import safe_truncate # Import the truncater
+from reviewer import llm_for # The shared LLM instance, behind the response cache
+from context_packer import diff_items, text_items, section, pack_sections, format_usage
+from config import EVAL_TOKEN_BUDGET
 
 # --- NEW: RAG-aware evaluator prompt ---
 evaluator_prompt = ChatPromptTemplate.from_messages([
@@ -36,37 +37,67 @@ def meta_evaluate(diff: str, review: str, static_output: str, context: str):
     """
     Calls the evaluator LLM chain and returns parsed JSON (dict) and raw output.
     """
-    chain = evaluator_prompt | llm | StrOutputParser()
+    # Only parseable answers are cached; a garbled one would otherwise pin this PR at 5.0 on every rerun
+    chain = evaluator_prompt | llm_for("meta_evaluator", valid=lambda raw: is_llm_evaluation(parse_evaluation(raw))) \
+        | StrOutputParser()
     try:
-        # Truncate inputs for the evaluator
-        truncated_diff = safe_truncate(diff, 4000)
-        truncated_review = safe_truncate(review, 4000)
-        truncated_static = safe_truncate(static_output, 2000)
-        truncated_context = safe_truncate(context, 2000)
+        # Pack inputs into the evaluator's token budget (the review itself comes first)
+        packed, usage = pack_sections([
+            section("review", text_items(review), 0.35, "\n\n"),
+            section("diff", diff_items(diff), 0.35),
+            section("static", text_items(static_output), 0.1, "\n\n"),
+            section("context", text_items(context, "\n---\n"), 0.2, "\n---\n"),
+        ], EVAL_TOKEN_BUDGET)
+        print(f"  Evaluator budget: {format_usage(usage, EVAL_TOKEN_BUDGET)}")
 
         raw = chain.invoke({
-            "diff": truncated_diff, 
-            "review": truncated_review,
-            "static": truncated_static,
-            "context": truncated_context
+            "diff": packed["diff"], 
+            "review": packed["review"],
+            "static": packed["static"],
+            "context": packed["context"]
         })
     except Exception as e:
         return {"error": f"evaluator invoke failed: {e}"}, None
+    return parse_evaluation(raw), raw
 
-    # Robust JSON parsing
-    parsed = None
+
+def parse_evaluation(raw: str):
+    """Robust JSON parsing of the evaluator output; an {"error", "raw"} dict if there is none."""
     try:
-        parsed = json.loads(raw.strip())
+        return json.loads(raw.strip())
     except Exception:
         m = re.search(r"\{.*\}", raw, flags=re.S)
         if m:
             try:
-                parsed = json.loads(m.group(0))
+                return json.loads(m.group(0))
             except Exception:
-                parsed = {"error": "could not parse JSON", "raw": raw}
-        else:
-            parsed = {"error": "no JSON in evaluator output", "raw": raw}
-    return parsed, raw
+                return {"error": "could not parse JSON", "raw": raw}
+        return {"error": "no JSON in evaluator output", "raw": raw}
+
+# --- Scores ---
+# Weights of the evaluator's fields in the meta score
+META_WEIGHTS = {"clarity": 0.18, "usefulness": 0.28, "depth": 0.2, "actionability": 0.24, "positivity": 0.1}
+
+
+def is_llm_evaluation(meta_parsed) -> bool:
+    """True for a parsed evaluator answer (not an error, not a local estimate)."""
+    return isinstance(meta_parsed, dict) and "error" not in meta_parsed and "clarity" in meta_parsed
+
+
+def weighted_meta_score(meta_parsed: dict) -> float:
+    return sum(meta_parsed.get(k, 5) * w for k, w in META_WEIGHTS.items())
+
+
+def heuristic_score(heur: dict) -> float:
+    """0-10 score from heuristic_metrics: sections, bullets, length, bug/suggestion mentions."""
+    sections = heur.get("sections_presence", {})
+    sec_frac = sum(sections.values()) / max(1, len(sections))
+    bullets_score = min(heur.get("bullet_points", 0), 10) / 10.0
+    words = heur.get("length_words", 0)
+    length_score = 1.0 if 80 <= words <= 800 else max(0.0, min(words/80, 1.0 - (words-800)/2000))
+
+    return (0.45 * sec_frac + 0.25 * bullets_score + 0.25 * length_score +
+            0.05 * heur.get("mentions_bug", False) + 0.05 * heur.get("mentions_suggest", False)) * 10
 
 # --- Heuristic functions (copied from your V1 code) ---
 def heuristic_metrics(review: str):
@@ -0,0 +1,149 @@
+# bandit.py
+#
+# Responsible for:
+#  - Choosing the review prompt per PR as a contextual bandit (one arm per prompt template)
+#      * each arm keeps its own ridge regression of review score on the PR feature vector
+#        (features_to_vector, log-scaled counts + a bias term), so prompts are not ordered
+#        along a numeric "prompt index" feature
+#      * LinUCB (mean + alpha * confidence width) or Thompson sampling (a draw from the
+#        arm's posterior) decides, so exploration shrinks as each arm gathers evidence
+#  - O(d²) updates: each arm stores A⁻¹ directly and folds in one observation with the
+#    Sherman–Morrison rank-one formula (no refits, no matrix inversion)
+#  - A compact JSON state (A⁻¹, b and a count per arm), kept in selector_state.json under
+#    "bandit" and rebuilt from the score history if missing
+
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from config import SELECTOR_POLICY, BANDIT_ALPHA, BANDIT_LAMBDA
+
+# features_to_vector positions of the count features (log-scaled; net_changes keeps its sign)
+COUNT_FEATURES = [0, 1, 2, 3]
+SIGNED_COUNT_FEATURES = [4]
+# Rewards are centered on this score, so an arm with no data predicts it
+REWARD_BASELINE = 5.0
+
+
+def bandit_context(features_vector) -> np.ndarray:
+    """
+    Fixed transform of the 14 PR features plus a bias term. No fitted scaler on purpose:
+    a scaler that drifts would silently invalidate every arm's accumulated statistics.
+    """
+    x = np.asarray(features_vector, dtype=float).copy()
+    x[COUNT_FEATURES] = np.log1p(np.maximum(x[COUNT_FEATURES], 0))
+    x[SIGNED_COUNT_FEATURES] = np.sign(x[SIGNED_COUNT_FEATURES]) * np.log1p(np.abs(x[SIGNED_COUNT_FEATURES]))
+    return np.append(x, 1.0)
+
+
+class PromptBandit:
+    """
+    Per-prompt linear bandit. select() and update() are not locked here;
+    the selector calls both under its model lock.
+    """
+
+    def __init__(self, prompt_names: List[str], policy: str = SELECTOR_POLICY, alpha: float = BANDIT_ALPHA,
+                 ridge: float = BANDIT_LAMBDA, seed: Optional[int] = None):
+        self.prompt_names = prompt_names
+        self.policy = policy if policy in ("linucb", "thompson") else "linucb"
+        self.alpha = alpha
+        self.ridge = ridge
+        self.dim: Optional[int] = None
+        self.arms: Dict[str, dict] = {}
+        self._rng = np.random.default_rng(seed)
+
+    # ------------------------------
+    # Arms
+    # ------------------------------
+    def _arm(self, name: str) -> dict:
+        if name not in self.arms:
+            self.arms[name] = {"A_inv": np.eye(self.dim) / self.ridge, "b": np.zeros(self.dim), "n": 0}
+        return self.arms[name]
+
+    def _context(self, features_vector) -> np.ndarray:
+        x = bandit_context(features_vector)
+        if self.dim != len(x):
+            if self.arms:
+                print(f"⚠️ Bandit feature size changed ({self.dim} -> {len(x)}); starting from the prior.")
+            self.dim, self.arms = len(x), {}
+        return x
+
+    def estimate(self, name: str, x: np.ndarray) -> Tuple[float, float]:
+        """(predicted score, confidence width) of one arm for context `x`."""
+        arm = self._arm(name)
+        A_inv_x = arm["A_inv"] @ x
+        return REWARD_BASELINE + float((arm["A_inv"] @ arm["b"]) @ x), float(np.sqrt(max(x @ A_inv_x, 0.0)))
+
+    # ------------------------------
+    # Selection and updates
+    # ------------------------------
+    def select(self, features_vector) -> str:
+        x = self._context(features_vector)
+        best, best_key = self.prompt_names[0], None
+        for name in self.prompt_names:
+            arm = self._arm(name)
+            mean, width = self.estimate(name, x)
+            if self.policy == "thompson":
+                # θ ~ N(θ̂, alpha² A⁻¹); the draw only matters through θ·x ~ N(mean, (alpha * width)²)
+                value = mean + self.alpha * width * float(self._rng.standard_normal())
+            else:
+                value = mean + self.alpha * width
+            print(f"  {name}: predicted score = {mean:.2f} ± {width:.2f} -> {self.policy} {value:.2f} (n={arm['n']})")
+            # Ties (e.g. untried arms) go to the arm with the fewest observations
+            key = (round(value, 9), -arm["n"])
+            if best_key is None or key > best_key:
+                best, best_key = name, key
+        return best
+
+    def update(self, features_vector, prompt_name: str, score: float):
+        """Sherman–Morrison: A⁻¹ ← A⁻¹ − (A⁻¹x)(A⁻¹x)ᵀ / (1 + xᵀA⁻¹x); b ← b + r·x."""
+        x = self._context(features_vector)
+        arm = self._arm(prompt_name)
+        A_inv_x = arm["A_inv"] @ x
+        arm["A_inv"] -= np.outer(A_inv_x, A_inv_x) / (1.0 + x @ A_inv_x)
+        arm["b"] += (score - REWARD_BASELINE) * x
+        arm["n"] += 1
+
+    def replay(self, feature_history, prompt_history, score_history) -> int:
+        """Rebuilds the arms from the selector's history (prompt indices into prompt_names)."""
+        count = 0
+        for features, prompt_index, score in zip(feature_history, prompt_history, score_history):
+            if 0 <= prompt_index < len(self.prompt_names):
+                self.update(features, self.prompt_names[prompt_index], score)
+                count += 1
+        return count
+
+    # ------------------------------
+    # Persistence
+    # ------------------------------
+    def to_state(self) -> dict:
+        """JSON-serialisable state (stored by the selector in selector_state.json)."""
+        return {
+            "policy": self.policy,
+            "ridge": self.ridge,
+            "dim": self.dim,
+            "arms": {name: {"A_inv": arm["A_inv"].tolist(), "b": arm["b"].tolist(), "n": arm["n"]}
+                     for name, arm in self.arms.items()},
+        }
+
+    def from_state(self, state: Optional[dict]) -> bool:
+        """False if there is no usable state (missing, malformed, or saved with another ridge prior)."""
+        if not state:
+            return False
+        try:
+            if state.get("ridge") != self.ridge:
+                print("Bandit state was saved with a different ridge prior; rebuilding it.")
+                return False
+            self.dim = state["dim"]
+            self.arms = {
+                name: {"A_inv": np.array(arm["A_inv"], dtype=float), "b": np.array(arm["b"], dtype=float),
+                       "n": int(arm["n"])}
+                for name, arm in state.get("arms", {}).items()
+            }
+        except Exception as e:
+            print(f"Failed to load bandit state: {e}")
+            self.dim, self.arms = None, {}
+            return False
+        print(f"Loaded bandit state ({sum(arm['n'] for arm in self.arms.values())} observations)")
+        return True
+
+    def stats(self) -> dict:
+        return {"policy": self.policy, "observations": {name: arm["n"] for name, arm in self.arms.items()}}
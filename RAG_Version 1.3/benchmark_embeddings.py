@@ -0,0 +1,90 @@
+# benchmark_embeddings.py
+#
+# Compares embedding throughput (chunks/sec) of the EmbeddingEngine modes on a
+# synthetic, code-like corpus, and checks every mode still returns 384-dim
+# vectors that agree with the plain torch model.
+#
+# Usage:
+#   python benchmark_embeddings.py [--chunks 2000] [--workers 4] [--batch-size 64] [--modes torch,int8,onnx]
+
+import argparse
+import os
+import random
+import time
+import numpy as np
+from embedding_engine import EmbeddingEngine
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBEDDING_DIMENSION = 384
+
+_WORDS = [
+    "def", "return", "self", "config", "request", "response", "user", "token", "index",
+    "vector", "retriever", "diff", "review", "prompt", "error", "cache", "batch", "model",
+    "import", "class", "for", "in", "if", "else", "None", "True", "value", "items", "path",
+]
+
+
+def synthetic_corpus(n_chunks: int, chunk_chars: int = 800, seed: int = 7):
+    """Deterministic pseudo-code chunks of roughly `chunk_chars` characters."""
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(n_chunks):
+        lines = [f"def func_{i}(arg):"]
+        while sum(len(l) + 1 for l in lines) < chunk_chars:
+            lines.append("    " + " ".join(rng.choice(_WORDS) for _ in range(rng.randint(4, 10))))
+        corpus.append("\n".join(lines))
+    return corpus
+
+
+def run_mode(backend: str, workers: int, batch_size: int, corpus):
+    engine = EmbeddingEngine(EMBEDDING_MODEL, backend=backend, workers=workers, batch_size=batch_size)
+    try:
+        # Warm-up: load models (and start every worker) outside the timed region
+        engine.embed_documents(corpus[:batch_size * max(1, workers) + 1])
+        start = time.perf_counter()
+        vectors = np.asarray(engine.embed_documents(corpus), dtype=np.float32)
+        elapsed = time.perf_counter() - start
+    finally:
+        engine.close()
+    return vectors, len(corpus) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding engine modes")
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--modes", default="torch,int8,onnx")
+    args = parser.parse_args()
+
+    corpus = synthetic_corpus(args.chunks)
+    print(f"Synthetic corpus: {len(corpus)} chunks, {args.workers} workers, batch size {args.batch_size}\n")
+
+    modes = [("torch", 1)]
+    for backend in args.modes.split(","):
+        backend = backend.strip()
+        if args.workers > 1:
+            modes.append((backend, args.workers))
+        if backend != "torch":
+            modes.append((backend, 1))
+
+    baseline = None
+    print(f"{'mode':<22}{'chunks/sec':>12}{'speedup':>10}{'dim':>6}{'cos vs torch':>14}")
+    for backend, workers in modes:
+        label = f"{backend} x{workers}"
+        try:
+            vectors, rate = run_mode(backend, workers, args.batch_size, corpus)
+        except Exception as e:
+            print(f"{label:<22}  skipped: {e}")
+            continue
+        if baseline is None:
+            baseline = (vectors, rate)
+        base_vectors, base_rate = baseline
+        cosine = float(np.mean(np.sum(vectors * base_vectors, axis=1) /
+                               (np.linalg.norm(vectors, axis=1) * np.linalg.norm(base_vectors, axis=1))))
+        ok = "" if vectors.shape[1] == EMBEDDING_DIMENSION else "  (!) wrong dimension"
+        print(f"{label:<22}{rate:>12.1f}{rate / base_rate:>9.2f}x{vectors.shape[1]:>6}{cosine:>14.4f}{ok}")
+
+
+if __name__ == "__main__":
+    main()
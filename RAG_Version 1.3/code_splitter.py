@@ -0,0 +1,245 @@
+# code_splitter.py
+#
+# Responsible for:
+#  - Splitting source files at natural unit boundaries instead of arbitrary character offsets
+#      * Python: top-level functions/classes via `ast`; a class over the budget is opened per member
+#      * Brace languages (JS/TS, Java, C/C++, Go, Kotlin, Rust, PHP): brace-depth heuristic;
+#        class/interface/impl/... bodies are split again, one unit per member
+#      * Ruby: top-level def/class/module + `end` heuristic
+#  - Sub-splitting units that are too large, merging small neighbours up to the budget
+#  - Falling back to the generic character splitter for non-code files
+
+import ast
+import os
+import re
+from typing import List, Optional, Tuple
+from langchain_core.documents import Document
+from langchain_text_splitters import Language, RecursiveCharacterTextSplitter
+from diff_parser import FILE_LANG_MAP
+
+# LangChain separators used when a single unit is larger than the budget
+LANGCHAIN_LANGUAGES = {
+    "python": Language.PYTHON,
+    "javascript": Language.JS,
+    "java": Language.JAVA,
+    "cpp": Language.CPP,
+    "go": Language.GO,
+    "kotlin": Language.KOTLIN,
+    "rust": Language.RUST,
+    "ruby": Language.RUBY,
+    "php": Language.PHP,
+}
+
+BRACE_LANGUAGES = {"javascript", "java", "cpp", "go", "kotlin", "rust", "php"}
+
+# Strings and line comments are removed before counting braces
+_STRIP_FOR_BRACES = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|`[^`]*`|//.*$|#.*$')
+_RUBY_UNIT_START = re.compile(r"^(def|class|module)\b")
+# Declarations whose body holds members (methods, nested types) rather than statements
+_CONTAINER_DECL = re.compile(r"\b(class|interface|enum|struct|trait|impl|object|namespace|record)\b")
+
+# A unit is (start_line, end_line), 0-based and inclusive
+Unit = Tuple[int, int]
+
+
+def detect_language(path: str) -> str:
+    ext = path.rsplit(".", 1)[-1].lower() if "." in os.path.basename(path) else ""
+    return FILE_LANG_MAP.get(ext, "")
+
+
+# ------------------------------
+# Unit detection per language
+# ------------------------------
+def _node_start(node: ast.stmt) -> int:
+    return min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])]) - 1
+
+
+def _python_block_units(body: List[ast.stmt], first: int, last: int, lines: List[str],
+                        max_chars: Optional[int]) -> List[Unit]:
+    """
+    Defs/classes of `body` (lines first..last) with their decorators; the statements
+    between them form their own units. A class longer than `max_chars` is opened:
+    its header, then the same split of its body.
+    """
+    units: List[Unit] = []
+    cursor = first
+    for node in body:
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        start, end = _node_start(node), node.end_lineno - 1
+        if start > cursor:
+            units.append((cursor, start - 1))
+        body_start = _node_start(node.body[0])
+        if (isinstance(node, ast.ClassDef) and max_chars and body_start > start
+                and len("\n".join(lines[start:end + 1])) > max_chars):
+            units.append((start, body_start - 1))
+            units.extend(_python_block_units(node.body, body_start, end, lines, max_chars))
+        else:
+            units.append((start, end))
+        cursor = end + 1
+    if cursor <= last:
+        units.append((cursor, last))
+    return units
+
+
+def _python_units(text: str, lines: List[str], max_chars: Optional[int] = None) -> List[Unit]:
+    """Top-level defs/classes; classes over `max_chars` are split per member."""
+    return _python_block_units(ast.parse(text).body, 0, len(lines) - 1, lines, max_chars)
+
+
+def _container_body(lines: List[str], start: int, end: int):
+    """
+    (open_line, close_line) if unit start..end is a class-like declaration whose
+    body opens on its own brace (K&R or Allman) and closes on the last line; else None.
+    """
+    depth = 0
+    for i in range(start, end):
+        code = _STRIP_FOR_BRACES.sub("", lines[i])
+        depth += code.count("{") - code.count("}")
+        if depth == 0:
+            continue
+        header = code if code.strip() != "{" or i == start else _STRIP_FOR_BRACES.sub("", lines[i - 1])
+        last = _STRIP_FOR_BRACES.sub("", lines[end]).strip()
+        if depth == 1 and _CONTAINER_DECL.search(header) and last.startswith("}") and i + 1 < end:
+            return i, end
+        return None
+    return None
+
+
+def _brace_units(lines: List[str], start: int = 0, end: int = None) -> List[Unit]:
+    """
+    A unit closes when brace depth returns to 0, or at a blank line at depth 0.
+    Class-like units are opened up: header, one unit per member, closing brace.
+    """
+    end = len(lines) - 1 if end is None else end
+    top: List[Unit] = []
+    depth = 0
+    unit_start = start
+    for i in range(start, end + 1):
+        line = lines[i]
+        code = _STRIP_FOR_BRACES.sub("", line)
+        opened, closed = code.count("{"), code.count("}")
+        depth = max(0, depth + opened - closed)
+        if depth == 0 and (closed or not line.strip()) and i >= unit_start:
+            top.append((unit_start, i))
+            unit_start = i + 1
+    if unit_start <= end:
+        top.append((unit_start, end))
+
+    units: List[Unit] = []
+    for unit in top:
+        body = _container_body(lines, *unit)
+        if body is None:
+            units.append(unit)
+            continue
+        open_line, close_line = body
+        units.append((unit[0], open_line))
+        units.extend(_brace_units(lines, open_line + 1, close_line - 1))
+        units.append((close_line, close_line))
+    return units
+
+
+def _ruby_units(lines: List[str]) -> List[Unit]:
+    """New unit at every top-level def/class/module."""
+    starts = [0] + [i for i, line in enumerate(lines) if i and _RUBY_UNIT_START.match(line)]
+    return [(s, e - 1) for s, e in zip(starts, starts[1:] + [len(lines)]) if e > s]
+
+
+def find_units(text: str, language: str, max_chars: Optional[int] = None) -> List[Unit]:
+    lines = text.split("\n")
+    if language == "python":
+        try:
+            return _python_units(text, lines, max_chars)
+        except (SyntaxError, ValueError):
+            pass  # fall through to the line heuristic
+    if language in BRACE_LANGUAGES:
+        return _brace_units(lines)
+    if language == "ruby":
+        return _ruby_units(lines)
+    return [(0, len(lines) - 1)]
+
+
+# ------------------------------
+# Splitter
+# ------------------------------
+class CodeAwareSplitter:
+    """
+    Drop-in for `RecursiveCharacterTextSplitter.split_documents`.
+    Code is cut at unit boundaries, units larger than `code_chunk_size` are
+    sub-split with language separators, and small adjacent units are merged
+    up to the budget. Code chunks carry no overlap; other files use the
+    generic splitter with `chunk_size`/`chunk_overlap`.
+    """
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 100, code_chunk_size: int = 1500):
+        self.code_chunk_size = code_chunk_size
+        self.generic = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+    def _sub_split(self, text: str, language: str) -> List[str]:
+        lc_language = LANGCHAIN_LANGUAGES.get(language)
+        if lc_language is None:
+            splitter = RecursiveCharacterTextSplitter(chunk_size=self.code_chunk_size, chunk_overlap=0)
+        else:
+            splitter = RecursiveCharacterTextSplitter.from_language(
+                lc_language, chunk_size=self.code_chunk_size, chunk_overlap=0
+            )
+        return splitter.split_text(text)
+
+    def _sub_split_lines(self, lines: List[str], start: int, end: int, language: str) -> List[Tuple[str, int, int]]:
+        """Sub-splits lines start..end; each piece gets its own 1-based line range."""
+        unit_text = "\n".join(lines[start:end + 1])
+        pieces = []
+        cursor = 0
+        for piece in self._sub_split(unit_text, language):
+            offset = unit_text.find(piece, cursor)
+            if offset < 0:  # the splitter changed the text; fall back to the whole unit
+                pieces.append((piece, start + 1, end + 1))
+                continue
+            first = start + unit_text.count("\n", 0, offset)
+            pieces.append((piece, first + 1, first + piece.count("\n") + 1))
+            cursor = offset + len(piece)
+        return pieces
+
+    def split_code(self, text: str, language: str) -> List[Tuple[str, int, int]]:
+        """Returns (chunk_text, start_line, end_line) tuples; lines are 1-based."""
+        lines = text.split("\n")
+        chunks: List[Tuple[str, int, int]] = []
+        buffer: List[str] = []
+        buffer_start = 0
+        buffer_len = 0
+
+        def flush(end_line: int):
+            nonlocal buffer, buffer_len
+            body = "\n".join(buffer).strip("\n")
+            if body.strip():
+                chunks.append((body, buffer_start + 1, end_line + 1))
+            buffer, buffer_len = [], 0
+
+        for start, end in find_units(text, language, self.code_chunk_size):
+            unit_text = "\n".join(lines[start:end + 1])
+            if len(unit_text) > self.code_chunk_size:
+                flush(start - 1)
+                chunks.extend(self._sub_split_lines(lines, start, end, language))
+                buffer_start = end + 1
+                continue
+            if buffer and buffer_len + len(unit_text) + 1 > self.code_chunk_size:
+                flush(start - 1)
+            if not buffer:
+                buffer_start = start
+            buffer.append(unit_text)
+            buffer_len += len(unit_text) + 1
+        flush(len(lines) - 1)
+        return chunks
+
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        out: List[Document] = []
+        for doc in documents:
+            language = detect_language(doc.metadata.get("source", ""))
+            if not language:
+                out.extend(self.generic.split_documents([doc]))
+                continue
+            for body, start_line, end_line in self.split_code(doc.page_content, language):
+                metadata = dict(doc.metadata)
+                metadata.update({"language": language, "start_line": start_line, "end_line": end_line})
+                out.append(Document(page_content=body, metadata=metadata))
+        return out
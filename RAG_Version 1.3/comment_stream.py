@@ -0,0 +1,107 @@
+# comment_stream.py
+#
+# Responsible for:
+#  - The review comment layout on GitHub (shared by the streamed and the one-shot post)
+#  - Streaming mode (REVIEW_STREAMING): a placeholder comment is posted as soon as the PR is
+#    known to exist, then edited in place while the review text streams in
+#      * in-progress edits are throttled (STREAM_EDIT_INTERVAL seconds and STREAM_MIN_CHARS new
+#        characters apart, at most STREAM_MAX_EDITS) and skipped when the rate limit runs low
+#      * the final edit carries the complete review and its score
+
+import time
+from typing import Optional
+from config import STREAM_EDIT_INTERVAL, STREAM_MIN_CHARS, STREAM_MAX_EDITS
+from github_client import get_client
+from reviewer import post_review_comment, update_review_comment
+
+
+def review_comment_body(prompt_name: Optional[str], review_text: str, score=None, status: Optional[str] = None) -> str:
+    """The comment posted on the PR; `status` marks a review that is still being written."""
+    meta = f"Prompt: `{prompt_name}`" if prompt_name else "Selecting prompt..."
+    meta += f" | Score: **{score}/10**" if score is not None else " | Score: pending"
+    body = (
+        f"🤖 **AI-Powered Review** 🤖\n\n"
+        f"*({meta})*\n\n"
+        f"---\n\n"
+        f"{review_text}"
+    )
+    if status:
+        body += f"\n\n⏳ *{status}*"
+    return body
+
+
+class StreamingComment:
+    """
+    One PR comment that grows with the review. start() posts the placeholder;
+    append() buffers text and edits the comment when the throttle allows;
+    finish() writes the final body. Used by a single review thread.
+    """
+
+    def __init__(self, owner: str, repo: str, pr_number: int, token: str,
+                 interval: float = STREAM_EDIT_INTERVAL, min_chars: int = STREAM_MIN_CHARS,
+                 max_edits: int = STREAM_MAX_EDITS):
+        self.owner, self.repo, self.pr_number, self.token = owner, repo, pr_number, token
+        self.interval = interval
+        self.min_chars = min_chars
+        self.max_edits = max_edits
+        self.comment_id = None
+        self.prompt_name = None
+        self.text = ""
+        self.edits = 0
+        self._edited_len = 0
+        self._last_edit = 0.0
+
+    def start(self) -> bool:
+        """Posts the placeholder. False (streaming off for this PR) if GitHub refuses it."""
+        try:
+            comment = post_review_comment(self.owner, self.repo, self.pr_number, self.token,
+                                          review_comment_body(None, "", status="Review in progress..."))
+        except Exception as e:
+            print(f"⚠️ Could not post placeholder comment on PR #{self.pr_number}, streaming disabled: {e}")
+            return False
+        self.comment_id = comment.get("id")
+        self._last_edit = time.monotonic()
+        print(f"💬 Placeholder comment posted on PR #{self.pr_number} ({comment.get('html_url', self.comment_id)})")
+        return self.comment_id is not None
+
+    def _quota_ok(self) -> bool:
+        # In-progress edits are optional: leave the remaining quota to the calls that must happen
+        client = get_client(self.token)
+        remaining = client.rate_limit_remaining
+        return remaining is None or remaining > 2 * client.rate_limit_reserve
+
+    def _edit(self, body: str):
+        update_review_comment(self.owner, self.repo, self.comment_id, self.token, body)
+        self._last_edit = time.monotonic()
+        self._edited_len = len(self.text)
+
+    def set_prompt(self, prompt_name: str):
+        self.prompt_name = prompt_name
+
+    def append(self, chunk: str):
+        self.text += chunk
+        if (self.comment_id is None or self.edits >= self.max_edits
+                or time.monotonic() - self._last_edit < self.interval
+                or len(self.text) - self._edited_len < self.min_chars or not self._quota_ok()):
+            return
+        try:
+            self._edit(review_comment_body(self.prompt_name, self.text, status="Still writing..."))
+            self.edits += 1
+        except Exception as e:
+            # Stop in-progress edits; the final edit is still attempted
+            print(f"⚠️ In-progress edit failed on PR #{self.pr_number}: {e}")
+            self.edits = self.max_edits
+
+    def finish(self, body: str):
+        """Replaces the comment with the final review (raises if GitHub rejects the edit)."""
+        self._edit(body)
+
+    def fail(self, error):
+        """Leaves a note instead of a comment that says "in progress" forever."""
+        if self.comment_id is None:
+            return
+        try:
+            self._edit(review_comment_body(self.prompt_name, self.text,
+                                           status=f"Review could not be completed: {error}"))
+        except Exception as e:
+            print(f"⚠️ Could not mark comment on PR #{self.pr_number} as failed: {e}")
@@ -24,15 +24,226 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME")
 
+# "pinecone" (remote index) or "local" (memory-mapped store in LOCAL_INDEX_DIR)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone").lower()
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "local_index")
+
+# --- Ingest Config ---
+# "incremental" re-embeds only files changed since the last ingested commit;
+# "full" always rebuilds from scratch (also used as the fallback).
+INGEST_MODE = os.getenv("INGEST_MODE", "incremental").lower()
+# Everything ingest needs from its previous run (state file, lexical index, embedding cache)
+# lives in one directory, so CI can restore and save it as a single cache entry
+STATE_DIR = os.getenv("STATE_DIR", "rag_state")
+INGEST_STATE_FILE = os.getenv("INGEST_STATE_FILE", os.path.join(STATE_DIR, "ingest_state.json"))
+
+# Delete pre-existing vectors with random (non-deterministic) IDs during
+# reconciliation. Only safe when the index holds nothing but this repo.
+INGEST_PURGE_LEGACY_IDS = os.getenv("INGEST_PURGE_LEGACY_IDS", "false").lower() == "true"
+
+# Pre-scan filter: files above this size, or under these directories, are never read
+try:
+    INGEST_MAX_FILE_BYTES = int(os.getenv("INGEST_MAX_FILE_BYTES", str(256 * 1024)))
+except (TypeError, ValueError):
+    INGEST_MAX_FILE_BYTES = 256 * 1024
+INGEST_SKIP_DIRS = {
+    d.strip() for d in os.getenv(
+        "INGEST_SKIP_DIRS",
+        "node_modules,vendor,third_party,dist,build,.venv,venv,__pycache__,site-packages,.tox,.mypy_cache,.pytest_cache",
+    ).split(",") if d.strip()
+}
+
+# Streaming pipeline: chunks per embed/upsert batch, max chunks held in memory, upload threads
+try:
+    INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+    INGEST_MAX_IN_FLIGHT = int(os.getenv("INGEST_MAX_IN_FLIGHT", "512"))
+    INGEST_UPLOAD_WORKERS = int(os.getenv("INGEST_UPLOAD_WORKERS", "2"))
+except (TypeError, ValueError):
+    INGEST_BATCH_SIZE, INGEST_MAX_IN_FLIGHT, INGEST_UPLOAD_WORKERS = 64, 512, 2
+
+# --- Embedding Engine Config ---
+# Backend: "torch" (default), "int8" (dynamic quantization) or "onnx" (ONNX Runtime)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE")  # e.g. onnx/model_qint8_avx512_vnni.onnx
+try:
+    # Worker processes for ingest embedding (1 = in-process) and chunks per worker task
+    EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "1"))
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+except (TypeError, ValueError):
+    EMBEDDING_WORKERS, EMBEDDING_BATCH_SIZE = 1, 64
+
+# --- Embedding Cache Config ---
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(STATE_DIR, "embedding_cache.sqlite"))
+try:
+    # ~1.5 KB per 384-dim vector, so the default caps the file at roughly 300 MB
+    EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+except (TypeError, ValueError):
+    EMBEDDING_CACHE_MAX_ENTRIES = 200000
+
+# --- Retrieval Query Cache Config ---
+QUERY_CACHE_ENABLED = os.getenv("QUERY_CACHE_ENABLED", "true").lower() == "true"
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH", os.path.join(STATE_DIR, "query_cache.sqlite"))
+try:
+    QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "2000"))
+    QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    # Cosine similarity above which a cached query's results are reused
+    QUERY_CACHE_SIMILARITY = float(os.getenv("QUERY_CACHE_SIMILARITY", "0.95"))
+except (TypeError, ValueError):
+    QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_TTL_SECONDS, QUERY_CACHE_SIMILARITY = 2000, 7 * 24 * 3600, 0.95
+
+# --- Prompt Token Budgets (context_packer.py) ---
+try:
+    # Tokens for the packed sections of the review / evaluator prompts (template text not included)
+    REVIEW_TOKEN_BUDGET = int(os.getenv("REVIEW_TOKEN_BUDGET", "6000"))
+    EVAL_TOKEN_BUDGET = int(os.getenv("EVAL_TOKEN_BUDGET", "6000"))
+except (TypeError, ValueError):
+    REVIEW_TOKEN_BUDGET, EVAL_TOKEN_BUDGET = 6000, 6000
+
+# --- LLM Response Cache Config ---
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+# Bypass: always call the LLM (the fresh answer still replaces the cached one)
+LLM_CACHE_BYPASS = os.getenv("LLM_CACHE_BYPASS", "false").lower() == "true"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(STATE_DIR, "llm_cache.sqlite"))
+try:
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+except (TypeError, ValueError):
+    LLM_CACHE_MAX_ENTRIES = 5000
+
+# --- LLM Call Policy Config (llm_guard.py) ---
+try:
+    # Per-request timeout, and the total deadline for one call including retries and backoff
+    LLM_CALL_TIMEOUT = float(os.getenv("LLM_CALL_TIMEOUT", "60"))
+    LLM_CALL_DEADLINE = float(os.getenv("LLM_CALL_DEADLINE", "180"))
+    LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+    LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+    LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "20"))
+except (TypeError, ValueError):
+    LLM_CALL_TIMEOUT, LLM_CALL_DEADLINE, LLM_MAX_RETRIES, LLM_BACKOFF_BASE, LLM_BACKOFF_MAX = 60.0, 180.0, 3, 1.0, 20.0
+# Hedging: once a request outlives the prompt's observed p95, send a duplicate and take the first answer
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+try:
+    LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+except (TypeError, ValueError):
+    LLM_HEDGE_MIN_SAMPLES = 20
+LLM_LATENCY_PATH = os.getenv("LLM_LATENCY_PATH", "llm_latency.json")
+
+# --- GitHub Client Config ---
+GITHUB_CACHE_PATH = os.getenv("GITHUB_CACHE_PATH", os.path.join(STATE_DIR, "github_cache.sqlite"))
+try:
+    GITHUB_MAX_RETRIES = int(os.getenv("GITHUB_MAX_RETRIES", "3"))
+    # Calls kept in reserve: below this many remaining, wait for the rate-limit reset
+    GITHUB_RATE_LIMIT_RESERVE = int(os.getenv("GITHUB_RATE_LIMIT_RESERVE", "10"))
+except (TypeError, ValueError):
+    GITHUB_MAX_RETRIES, GITHUB_RATE_LIMIT_RESERVE = 3, 10
+
+# --- PR Diff Source Config ---
+# "auto": local clone when available, else the API; "local" / "api" force one source
+DIFF_SOURCE = os.getenv("DIFF_SOURCE", "auto").lower()
+DIFF_REPO_PATH = os.getenv("DIFF_REPO_PATH")  # defaults to the shared clone passed on the CLI
+# Optional git pathspecs, comma-separated, e.g. ":(exclude)*.lock,:(exclude)dist/"
+DIFF_PATHSPECS = [p.strip() for p in os.getenv("DIFF_PATHSPECS", "").split(",") if p.strip()]
+
+# --- Batch Review Config ---
+try:
+    # PRs reviewed concurrently by run_iterative_selector (1 = one at a time)
+    REVIEW_WORKERS = int(os.getenv("REVIEW_WORKERS", "1"))
+except (TypeError, ValueError):
+    REVIEW_WORKERS = 1
+try:
+    # Optional backfill list, e.g. PR_NUMBERS=12,15,18 (overrides the single PR_NUMBER)
+    PR_NUMBERS = [int(n) for n in os.getenv("PR_NUMBERS", "").split(",") if n.strip()]
+except (TypeError, ValueError):
+    PR_NUMBERS = []
+
+# --- Streaming Review Config (comment_stream.py) ---
+# Post a placeholder comment at once and edit it in place while the review streams in
+REVIEW_STREAMING = os.getenv("REVIEW_STREAMING", "false").lower() == "true"
+try:
+    # An in-progress edit needs both this many seconds since the last edit and this many new characters
+    STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "3"))
+    STREAM_MIN_CHARS = int(os.getenv("STREAM_MIN_CHARS", "200"))
+    # Upper bound on in-progress edits per comment (the final edit is always sent)
+    STREAM_MAX_EDITS = int(os.getenv("STREAM_MAX_EDITS", "30"))
+except (TypeError, ValueError):
+    STREAM_EDIT_INTERVAL, STREAM_MIN_CHARS, STREAM_MAX_EDITS = 3.0, 200, 30
+
+# --- Prompt Selection Config (bandit.py) ---
+# "linucb" or "thompson": per-prompt contextual bandit; "sgd": the original single SGDRegressor
+SELECTOR_POLICY = os.getenv("SELECTOR_POLICY", "linucb").lower()
+try:
+    # Exploration strength (UCB width / posterior scale) and ridge prior of each arm
+    BANDIT_ALPHA = float(os.getenv("BANDIT_ALPHA", "1.0"))
+    BANDIT_LAMBDA = float(os.getenv("BANDIT_LAMBDA", "1.0"))
+except (TypeError, ValueError):
+    BANDIT_ALPHA, BANDIT_LAMBDA = 1.0, 1.0
+
+# --- Hybrid Retrieval Config ---
+# "hybrid" fuses BM25 (lexical_index.py) with vector search; "vector" is vector-only
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", os.path.join(STATE_DIR, "lexical_index.sqlite"))
+
+# --- Repository Cache Config (repo_manager.py) ---
+# One bare, blob-less mirror per repo plus a pool of reusable worktrees, instead of fresh clones
+REPO_CACHE_DIR = os.getenv("REPO_CACHE_DIR", "repo_cache")
+try:
+    WORKTREE_POOL_SIZE = int(os.getenv("WORKTREE_POOL_SIZE", "4"))
+except (TypeError, ValueError):
+    WORKTREE_POOL_SIZE = 4
+
+# --- Semgrep Config (semgrep_cache.py) ---
+# "auto" pulls rules from the registry; point this at a local rule pack directory to run offline
+SEMGREP_CONFIG = os.getenv("SEMGREP_CONFIG", "auto")
+SEMGREP_CACHE_PATH = os.getenv("SEMGREP_CACHE_PATH", os.path.join(STATE_DIR, "semgrep_cache.sqlite"))
+try:
+    # Upper bound for one analyzer shard (each shard's own timeout adapts below this)
+    SEMGREP_TIMEOUT = int(os.getenv("SEMGREP_TIMEOUT", "120"))
+except (TypeError, ValueError):
+    SEMGREP_TIMEOUT = 120
+
+# --- Static Analyzers Config (static_analyzers.py) ---
+# Analyzers to run: "semgrep" (all languages) and/or "ruff" (Python); missing tools are skipped
+STATIC_ANALYZERS = [a.strip().lower() for a in os.getenv("STATIC_ANALYZERS", "semgrep,ruff").split(",") if a.strip()]
+RUFF_SELECT = os.getenv("RUFF_SELECT", "E9,F,B")
+try:
+    # Shards run in parallel (one process each); a shard holds at most STATIC_SHARD_FILES files
+    STATIC_WORKERS = int(os.getenv("STATIC_WORKERS", str(min(4, os.cpu_count() or 1))))
+    STATIC_SHARD_FILES = int(os.getenv("STATIC_SHARD_FILES", "8"))
+except (TypeError, ValueError):
+    STATIC_WORKERS, STATIC_SHARD_FILES = min(4, os.cpu_count() or 1), 8
+
+# --- Tiered Evaluation Config (local_evaluator.py) ---
+# "tiered": local scorer first, LLM judge only when it is unsure (or audited); "llm": always the LLM judge
+EVAL_MODE = os.getenv("EVAL_MODE", "tiered").lower()
+# Per-PR result files (iterative_results_pr*.json); under STATE_DIR so CI keeps them between runs
+RESULTS_DIR = os.getenv("RESULTS_DIR", os.path.join(STATE_DIR, "results"))
+# Stored results the local scorer trains on (comma-separated globs)
+EVAL_HISTORY_GLOBS = [g.strip() for g in os.getenv(
+    "EVAL_HISTORY_GLOBS",
+    f"{os.path.join(RESULTS_DIR, 'iterative_results_pr*.json')},iterative_results_pr*.json,Outputs/iterative_results_pr*.json",
+).split(",") if g.strip()]
+try:
+    EVAL_LOCAL_MIN_SAMPLES = int(os.getenv("EVAL_LOCAL_MIN_SAMPLES", "20"))
+    # Model uncertainty (std in score points, 0-10 scale, judge noise excluded) above which the LLM judge is asked
+    EVAL_LOCAL_MAX_STD = float(os.getenv("EVAL_LOCAL_MAX_STD", "1.0"))
+    # Share of confident local evaluations still sent to the LLM judge, to measure local error
+    EVAL_AUDIT_RATE = float(os.getenv("EVAL_AUDIT_RATE", "0.1"))
+except (TypeError, ValueError):
+    EVAL_LOCAL_MIN_SAMPLES, EVAL_LOCAL_MAX_STD, EVAL_AUDIT_RATE = 20, 1.0, 0.1
+
 # --- Validation ---
 # We check that all CRITICAL variables are present. 
 # We exclude PR_NUMBER from this check because it might be passed via arguments in some scripts.
+# Pinecone credentials are only required when the Pinecone backend is selected.
+USE_PINECONE = VECTOR_BACKEND != "local"
+if not USE_PINECONE:
+    PINECONE_INDEX_NAME = PINECONE_INDEX_NAME or "local"
+
 required_vars = [
     OWNER, 
     REPO, 
     GITHUB_TOKEN, 
     GROQ_API_KEY, 
-    PINECONE_API_KEY, 
+    PINECONE_API_KEY or not USE_PINECONE, 
     PINECONE_INDEX_NAME
 ]
 
@@ -43,7 +254,7 @@ if not all(required_vars):
     if not REPO: missing.append("REPO")
     if not GITHUB_TOKEN: missing.append("GITHUB_TOKEN")
     if not GROQ_API_KEY: missing.append("GROQ_API_KEY")
-    if not PINECONE_API_KEY: missing.append("PINECONE_API_KEY")
+    if not PINECONE_API_KEY and USE_PINECONE: missing.append("PINECONE_API_KEY")
     if not PINECONE_INDEX_NAME: missing.append("PINECONE_INDEX_NAME")
     
     raise SystemExit(f" Missing required .env variables: {', '.join(missing)}")
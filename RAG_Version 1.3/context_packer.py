@@ -0,0 +1,146 @@
+# context_packer.py
+#
+# Responsible for:
+#  - Counting prompt tokens with a local tokenizer (tiktoken; ~4 chars/token if it is missing)
+#  - Packing prompt sections (diff hunks, Semgrep findings, retrieved chunks, ...) into one
+#    total token budget by priority, instead of fixed per-section character cuts
+#      * each section first gets its share of the budget, filled with whole items
+#      * space left over is handed out highest priority first; only then is an item cut
+#  - Reporting tokens used per section
+
+from typing import Dict, List, Optional, Tuple
+from diff_parser import parse_diff
+
+try:
+    import tiktoken
+    # Not Llama's own tokenizer, but within a few percent of it on code and English
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken not installed, or its vocab cannot be downloaded
+    _ENCODING = None
+
+TRUNCATION_MARK = "\n... (truncated)"
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+# ------------------------------
+# Splitting inputs into items
+# ------------------------------
+def diff_items(diff_text: str) -> List[str]:
+    """One item per hunk, the file's first hunk led by its `diff --git` header."""
+    items = []
+    for f in parse_diff(diff_text).files:
+        header = f"diff --git a/{f.old_path} b/{f.new_path}"
+        if f.status in ("added", "deleted", "renamed", "binary"):
+            header += f" ({f.status})"
+        if not f.hunks:
+            items.append(header)
+            continue
+        for i, hunk in enumerate(f.hunks):
+            items.append(f"{header}\n{hunk.text}" if i == 0 else hunk.text)
+    return items or ([diff_text] if diff_text else [])
+
+
+def text_items(text: str, separator: str = "\n\n") -> List[str]:
+    return [part for part in (text or "").split(separator) if part.strip()]
+
+
+def section(name: str, items: List[str], share: float, joiner: str = "\n") -> dict:
+    """A prompt section: `items` in priority order, `share` = fraction of the budget it starts with."""
+    return {"name": name, "items": items, "share": share, "joiner": joiner}
+
+
+# ------------------------------
+# Packing
+# ------------------------------
+def _fit_item(item: str, budget: int) -> Tuple[str, int]:
+    """Longest line-aligned prefix of `item` (plus a truncation mark) within `budget` tokens."""
+    lines = item.split("\n")
+    lo, hi = 0, len(lines)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens("\n".join(lines[:mid]) + TRUNCATION_MARK) <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    if lo == 0:
+        return "", 0
+    text = "\n".join(lines[:lo]) + TRUNCATION_MARK
+    return text, count_tokens(text)
+
+
+def _fill(state: dict, budget: int, allow_cut: bool) -> int:
+    """
+    Adds whole items to one section until `budget` more tokens are used.
+    With `allow_cut`, the first item that does not fit is cut to the space
+    left (line-aligned) and filling stops. Returns tokens spent.
+    """
+    spent = 0
+    joiner_cost = count_tokens(state["joiner"])
+    while state["next"] < len(state["items"]):
+        glue = joiner_cost if state["parts"] else 0
+        item, cost = state["items"][state["next"]], state["costs"][state["next"]] + glue
+        if cost > budget - spent:
+            if not allow_cut:
+                break
+            item, cost = _fit_item(item, budget - spent - glue)
+            if item:
+                state["parts"].append(item)
+                state["next"] += 1
+                state["truncated"] = True
+                spent += cost + glue
+            break
+        state["parts"].append(item)
+        state["next"] += 1
+        spent += cost
+    state["tokens"] += spent
+    return spent
+
+
+def pack_sections(sections: List[dict], budget: int) -> Tuple[Dict[str, str], Dict[str, dict]]:
+    """
+    Packs `sections` (listed highest priority first) into `budget` tokens.
+    Returns ({name: packed_text}, {name: usage}) where usage has tokens,
+    items kept / total and whether the section was cut.
+    """
+    states = []
+    for s in sections:
+        states.append({
+            **s, "parts": [], "next": 0, "tokens": 0, "truncated": False,
+            "costs": [count_tokens(item) for item in s["items"]],
+        })
+
+    # Pass 1: every section fills its own share with whole items
+    remaining = budget
+    for state in states:
+        remaining -= _fill(state, int(budget * state["share"]), allow_cut=False)
+
+    # Pass 2: leftover goes to whatever still has content, highest priority first (cutting the last item)
+    for state in states:
+        if remaining <= 0:
+            break
+        remaining -= _fill(state, remaining, allow_cut=True)
+
+    packed, usage = {}, {}
+    for state in states:
+        packed[state["name"]] = state["joiner"].join(state["parts"])
+        usage[state["name"]] = {
+            "tokens": state["tokens"],
+            "items": f"{state['next']}/{len(state['items'])}",
+            "truncated": state["truncated"] or state["next"] < len(state["items"]),
+        }
+    return packed, usage
+
+
+def format_usage(usage: Dict[str, dict], budget: Optional[int] = None) -> str:
+    used = sum(u["tokens"] for u in usage.values())
+    parts = ", ".join(
+        f"{name}={u['tokens']} ({u['items']}{', cut' if u['truncated'] else ''})" for name, u in usage.items()
+    )
+    return f"{used}{f'/{budget}' if budget else ''} tokens: {parts}"
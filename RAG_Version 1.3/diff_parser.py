@@ -0,0 +1,236 @@
+# diff_parser.py
+#
+# Responsible for:
+#  - Reading a unified diff once, line by line, into a compact file -> hunk -> line structure
+#      * per file: old/new path, status (added / deleted / renamed / modified / binary), language
+#      * per hunk: old/new line ranges, function context, raw lines
+#      * added/removed counts that ignore the ---/+++ header lines
+#  - Sharing the parse: `parse_diff` is memoized, so features, static analysis,
+#    retrieval and prompt packing all read the same structure for a PR
+
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Map extensions to languages (used for file detection)
+FILE_LANG_MAP = {
+    "py": "python",
+    "js": "javascript", "jsx": "javascript", "ts": "javascript", "tsx": "javascript",
+    "java": "java",
+    "cpp": "cpp", "cc": "cpp", "cxx": "cpp", "h": "cpp", "hpp": "cpp",
+    "go": "go",
+    "kt": "kotlin",
+    "rs": "rust",
+    "rb": "ruby",
+    "php": "php"
+}
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@ ?(.*)")
+_GIT_HEADER = re.compile(r"^diff --git a/(.*) b/(.*)$")
+
+
+def language_of(path: str) -> str:
+    name = path.rsplit("/", 1)[-1]
+    ext = name.rsplit(".", 1)[-1].lower() if "." in name else ""
+    return FILE_LANG_MAP.get(ext, "")
+
+
+class Hunk:
+    """One `@@` block. `lines` are the raw diff lines (prefix char included)."""
+
+    __slots__ = ("header", "old_start", "old_len", "new_start", "new_len", "context", "lines",
+                 "additions", "deletions")
+
+    def __init__(self, header: str, old_start: int, old_len: int, new_start: int, new_len: int, context: str):
+        self.header = header
+        self.old_start, self.old_len = old_start, old_len
+        self.new_start, self.new_len = new_start, new_len
+        self.context = context
+        self.lines: List[str] = []
+        self.additions = 0
+        self.deletions = 0
+
+    @property
+    def text(self) -> str:
+        return "\n".join([self.header] + self.lines)
+
+    def added_ranges(self) -> List[Tuple[int, int]]:
+        """New-file line ranges (1-based, inclusive) of consecutive added lines."""
+        ranges: List[Tuple[int, int]] = []
+        line_no = self.new_start
+        run_start = None
+        for line in self.lines:
+            kind = line[:1]
+            if kind == "+":
+                if run_start is None:
+                    run_start = line_no
+                line_no += 1
+                continue
+            if run_start is not None:
+                ranges.append((run_start, line_no - 1))
+                run_start = None
+            if kind != "-" and kind != "\\":
+                line_no += 1
+        if run_start is not None:
+            ranges.append((run_start, line_no - 1))
+        return ranges
+
+
+class FileDiff:
+    __slots__ = ("old_path", "new_path", "status", "language", "hunks", "additions", "deletions")
+
+    def __init__(self, old_path: str, new_path: str):
+        self.old_path = old_path
+        self.new_path = new_path
+        self.status = "modified"
+        self.language = ""
+        self.hunks: List[Hunk] = []
+        self.additions = 0
+        self.deletions = 0
+
+    @property
+    def path(self) -> str:
+        """The path after the change (the old one for deleted files)."""
+        return self.old_path if self.status == "deleted" else self.new_path
+
+    def added_ranges(self) -> List[Tuple[int, int]]:
+        return [r for hunk in self.hunks for r in hunk.added_ranges()]
+
+
+class ParsedDiff:
+    __slots__ = ("files", "total_lines")
+
+    def __init__(self):
+        self.files: List[FileDiff] = []
+        self.total_lines = 0
+
+    @property
+    def additions(self) -> int:
+        return sum(f.additions for f in self.files)
+
+    @property
+    def deletions(self) -> int:
+        return sum(f.deletions for f in self.files)
+
+    def hunks(self) -> List[Tuple[FileDiff, Hunk]]:
+        return [(f, h) for f in self.files for h in f.hunks]
+
+    def files_by_language(self, include_deleted: bool = False) -> Dict[str, List[str]]:
+        """{language: [paths]} for files in a known language."""
+        by_language: Dict[str, List[str]] = {}
+        for f in self.files:
+            if f.language and (include_deleted or f.status != "deleted"):
+                by_language.setdefault(f.language, []).append(f.path)
+        return by_language
+
+
+# ------------------------------
+# Parser
+# ------------------------------
+def _strip_prefix(path: str) -> Optional[str]:
+    path = path.split("\t", 1)[0]
+    if path == "/dev/null":
+        return None
+    return path[2:] if path[:2] in ("a/", "b/") else path
+
+
+def parse_diff_lines(lines: Iterable[str]) -> ParsedDiff:
+    """
+    Single streaming pass over diff lines (e.g. diff_provider.stream_local_diff).
+    Inside a hunk, lines are consumed by the hunk's own line counts, so a removed
+    line that starts with "--" is never mistaken for a file header.
+    """
+    parsed = ParsedDiff()
+    current: Optional[FileDiff] = None
+    hunk: Optional[Hunk] = None
+    old_left = new_left = 0
+    git_format = False  # seen a `diff --git` header: file boundaries come from those
+
+    for raw in lines:
+        line = raw.rstrip("\r\n")
+        parsed.total_lines += 1
+
+        if hunk is not None and (old_left > 0 or new_left > 0):
+            kind = line[:1]
+            if kind == "+":
+                hunk.additions += 1
+                current.additions += 1
+                new_left -= 1
+            elif kind == "-":
+                hunk.deletions += 1
+                current.deletions += 1
+                old_left -= 1
+            elif kind == "\\":
+                pass  # "\ No newline at end of file"
+            else:
+                old_left -= 1
+                new_left -= 1
+            hunk.lines.append(line)
+            continue
+        if hunk is not None and line.startswith("\\"):
+            hunk.lines.append(line)
+            continue
+        hunk = None
+
+        if line.startswith("diff --git "):
+            git_format = True
+            match = _GIT_HEADER.match(line)
+            old_path, new_path = match.groups() if match else (line[11:], line[11:])
+            current = FileDiff(old_path, new_path)
+            parsed.files.append(current)
+        elif line.startswith("@@"):
+            match = _HUNK_HEADER.match(line)
+            if not match:
+                continue
+            if current is None:  # hunk without any header (bare `diff -u` output)
+                current = FileDiff("", "")
+                parsed.files.append(current)
+            old_start, old_len, new_start, new_len, context = match.groups()
+            old_left = int(old_len) if old_len is not None else 1
+            new_left = int(new_len) if new_len is not None else 1
+            hunk = Hunk(line, int(old_start), old_left, int(new_start), new_left, context)
+            current.hunks.append(hunk)
+        elif line.startswith("--- ") and not git_format:
+            # Plain unified diff (no git headers): every `---` line starts the next file
+            old_path = _strip_prefix(line[4:])
+            current = FileDiff(old_path or "", "")
+            if old_path is None:
+                current.status = "added"
+            parsed.files.append(current)
+        elif current is None:
+            continue
+        elif line.startswith("--- "):
+            old_path = _strip_prefix(line[4:])
+            if old_path is None:
+                current.status = "added"
+            else:
+                current.old_path = old_path
+        elif line.startswith("+++ "):
+            new_path = _strip_prefix(line[4:])
+            if new_path is None:
+                current.status = "deleted"
+            else:
+                current.new_path = new_path
+        elif line.startswith("new file mode"):
+            current.status = "added"
+        elif line.startswith("deleted file mode"):
+            current.status = "deleted"
+        elif line.startswith("rename from "):
+            current.old_path, current.status = line[12:], "renamed"
+        elif line.startswith("rename to "):
+            current.new_path, current.status = line[10:], "renamed"
+        elif line.startswith("Binary files ") or line.startswith("GIT binary patch"):
+            current.status = "binary"
+
+    for f in parsed.files:
+        f.language = language_of(f.path)
+    return parsed
+
+
+@lru_cache(maxsize=16)
+def parse_diff(diff_text: str) -> ParsedDiff:
+    """
+    Memoized parse of a whole diff string. Callers get the same (read-only)
+    structure for the same text, so the diff is scanned once per PR.
+    """
+    return parse_diff_lines(diff_text.split("\n") if diff_text else [])
@@ -0,0 +1,140 @@
+# diff_provider.py
+#
+# Responsible for:
+#  - Computing a PR's diff with git from a local clone instead of the GitHub diff API
+#      * merge-base diff (base...head), same as what GitHub shows for the PR
+#      * rename detection and an optional pathspec filter
+#      * streamed line by line from `git diff` (no size limit, no full buffer needed)
+#  - Using the persistent blob-less mirror (repo_manager.py) when no clone was passed in
+#  - Falling back to the API diff when no usable clone is available
+
+import os
+import subprocess
+import sys
+from typing import Iterator, List, Optional
+from config import OWNER, REPO, DIFF_SOURCE, DIFF_REPO_PATH, DIFF_PATHSPECS
+from reviewer import fetch_pr_diff
+from repo_manager import RepoManager, get_repo_manager, shared_repo_lock
+
+
+class LocalDiffError(Exception):
+    """Raised when the local clone cannot produce the PR diff."""
+
+
+def _git(repo_path: str, *args: str) -> str:
+    process = subprocess.run(["git", *args], cwd=repo_path, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise LocalDiffError(f"git {' '.join(args)}: {process.stderr.strip()}")
+    return process.stdout.strip()
+
+
+def _has_commit(repo_path: str, sha: str) -> bool:
+    return subprocess.run(["git", "cat-file", "-e", f"{sha}^{{commit}}"],
+                          cwd=repo_path, capture_output=True).returncode == 0
+
+
+def local_repo_path(owner: str = OWNER, repo: str = REPO) -> Optional[str]:
+    """
+    The clone we already have: DIFF_REPO_PATH, or the shared clone passed as the
+    first CLI argument; otherwise the repo's mirror (created on first use).
+    """
+    candidates = [DIFF_REPO_PATH] + [a for a in sys.argv[1:2] if not a.startswith("-")]
+    for path in candidates:
+        if path and os.path.exists(os.path.join(path, ".git")):
+            return path
+    try:
+        return get_repo_manager(owner, repo).ensure_mirror()
+    except Exception as e:
+        print(f"⚠ Repo mirror unavailable: {e}")
+        return None
+
+
+def _rev_parse_branch(repo_path: str, ref: Optional[str]) -> str:
+    """Remote-tracking branch in a clone, plain branch in the bare mirror."""
+    candidates = [f"origin/{ref}", f"refs/heads/{ref}"] if ref else ["origin/HEAD", "HEAD"]
+    for candidate in candidates[:-1]:
+        try:
+            return _git(repo_path, "rev-parse", "--verify", "--quiet", candidate)
+        except LocalDiffError:
+            continue
+    return _git(repo_path, "rev-parse", candidates[-1])
+
+
+def resolve_pr_commits(repo_path: str, pr_number: int, pr_meta: Optional[dict] = None,
+                       manager: Optional[RepoManager] = None):
+    """
+    Returns (base_sha, head_sha), fetching `pull/{n}/head` and the base branch
+    only when those commits are not in the clone yet. With `manager`,
+    `repo_path` is its mirror and the fetches go through the manager.
+    """
+    base_sha = ((pr_meta or {}).get("base") or {}).get("sha")
+    base_ref = ((pr_meta or {}).get("base") or {}).get("ref")
+    head_sha = ((pr_meta or {}).get("head") or {}).get("sha")
+    head_ref = f"refs/pr/{pr_number}"
+
+    if manager is not None:
+        # Serialized with every other fetch into the mirror (ingest, static analysis)
+        head_sha = manager.fetch_pr(pr_number, head_sha)
+        if base_sha and not manager.has_commit(base_sha):
+            manager.update()
+    else:
+        with shared_repo_lock:  # fetches write refs; keep them off concurrent static-analysis checkouts
+            if not head_sha or not _has_commit(repo_path, head_sha):
+                _git(repo_path, "fetch", "--quiet", "origin", f"+pull/{pr_number}/head:{head_ref}")
+            if base_sha and not _has_commit(repo_path, base_sha) and base_ref:
+                _git(repo_path, "fetch", "--quiet", "origin", base_ref)
+
+    head_sha = head_sha or _git(repo_path, "rev-parse", head_ref)
+    if not base_sha:
+        base_sha = _rev_parse_branch(repo_path, base_ref)
+    if not _has_commit(repo_path, base_sha):
+        raise LocalDiffError(f"base commit {base_sha[:10]} not available locally")
+    return base_sha, head_sha
+
+
+def stream_local_diff(repo_path: str, base_sha: str, head_sha: str,
+                      pathspecs: Optional[List[str]] = None, find_renames: bool = True) -> Iterator[str]:
+    """
+    Yields the merge-base diff (`base...head`) line by line, newline included.
+    Output matches GitHub's .diff format: a/ b/ prefixes, renames as `rename from/to`.
+    """
+    cmd = ["git", "-c", "core.quotepath=off", "diff", "--no-color", "--no-ext-diff", "--src-prefix=a/", "--dst-prefix=b/"]
+    cmd.append("-M" if find_renames else "--no-renames")
+    cmd.append(f"{base_sha}...{head_sha}")
+    if pathspecs:
+        cmd += ["--", *pathspecs]
+
+    process = subprocess.Popen(cmd, cwd=repo_path, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        for raw in process.stdout:
+            yield raw.decode("utf-8", errors="replace")
+    finally:
+        process.stdout.close()
+        stderr = process.stderr.read().decode("utf-8", errors="replace").strip()
+        process.stderr.close()
+        if process.wait() != 0:
+            raise LocalDiffError(f"git diff failed: {stderr}")
+
+
+def get_pr_diff(owner: str, repo: str, pr_number: int, token: str,
+                pr_meta: Optional[dict] = None, pathspecs: Optional[List[str]] = None) -> str:
+    """
+    Drop-in for reviewer.fetch_pr_diff. With DIFF_SOURCE "auto" (default) the
+    diff comes from the local clone when there is one, else from the API;
+    "local" never calls the API, "api" never uses the clone.
+    """
+    pathspecs = pathspecs if pathspecs is not None else DIFF_PATHSPECS
+    repo_path = local_repo_path(owner, repo) if DIFF_SOURCE != "api" else None
+    if repo_path:
+        manager = get_repo_manager(owner, repo)
+        try:
+            mirror = manager if repo_path == manager.mirror_path else None
+            base_sha, head_sha = resolve_pr_commits(repo_path, pr_number, pr_meta, mirror)
+            diff_text = "".join(stream_local_diff(repo_path, base_sha, head_sha, pathspecs))
+            print(f"📄 PR #{pr_number} diff computed locally ({base_sha[:7]}...{head_sha[:7]}, {len(diff_text)} chars)")
+            return diff_text
+        except Exception as e:
+            print(f"⚠ Local diff for PR #{pr_number} failed: {e}")
+    if DIFF_SOURCE == "local":
+        return ""
+    return fetch_pr_diff(owner, repo, pr_number, token)
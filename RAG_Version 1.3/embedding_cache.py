@@ -0,0 +1,143 @@
+# embedding_cache.py
+#
+# Responsible for:
+#  - Persisting chunk/query embeddings in a local SQLite file
+#  - Keying them by (model name, sha256 of the text) so unchanged chunks are never re-embedded
+#  - Size-bounded (least-recently-used) eviction and hit/miss counters
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from config import EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES
+
+# SQLite limits the number of "?" parameters per statement
+_SQL_BATCH = 500
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps any LangChain `Embeddings` object with a persistent, content-addressed cache.
+    Vectors are stored as raw float32 bytes, which keeps the file compact.
+    """
+
+    def __init__(self, underlying: Embeddings, model_name: str,
+                 path: str = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)")
+        self._conn.commit()
+
+    # ------------------------------
+    # Keys and storage
+    # ------------------------------
+    def _key(self, text: str, kind: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{self.model_name}:{kind}:{digest}"
+
+    def _lookup(self, keys: List[str]) -> dict:
+        found = {}
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(keys), _SQL_BATCH):
+                batch = keys[start:start + _SQL_BATCH]
+                marks = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+                if rows:
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE key IN ({marks})", [now] + batch
+                    )
+            self._conn.commit()
+        return found
+
+    def _store(self, keys: List[str], vectors: List[List[float]]):
+        now = time.time()
+        rows = [(k, np.asarray(v, dtype=np.float32).tobytes(), now) for k, v in zip(keys, vectors)]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Drops the least recently used rows once the cache grows past max_entries."""
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (overflow,),
+            )
+
+    # ------------------------------
+    # Embeddings interface
+    # ------------------------------
+    def _embed(self, texts: List[str], kind: str) -> List[List[float]]:
+        keys = [self._key(t, kind) for t in texts]
+        cached = self._lookup(list(set(keys)))
+
+        # Only unique, uncached texts go to the model
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            miss_keys = list(missing.keys())
+            miss_texts = list(missing.values())
+            if kind == "query" and len(miss_texts) == 1:
+                new_vectors = [self.underlying.embed_query(miss_texts[0])]
+            else:
+                new_vectors = self.underlying.embed_documents(miss_texts)
+            self._store(miss_keys, new_vectors)
+            # Round-trip through float32 so fresh and cached results are identical
+            cached.update(zip(miss_keys, [np.asarray(v, dtype=np.float32).tolist() for v in new_vectors]))
+
+        return [cached[k] for k in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self._embed(texts, "doc")
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text], "query")[0]
+
+    # ------------------------------
+    # Stats
+    # ------------------------------
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries,
+        }
@@ -0,0 +1,114 @@
+# embedding_engine.py
+#
+# Responsible for:
+#  - CPU embedding for large ingests, sharding chunk batches across a process pool
+#  - Optional faster MiniLM backends that keep the 384-dim output:
+#      * "torch" - the plain sentence-transformers model (same as HuggingFaceEmbeddings)
+#      * "int8"  - torch dynamic int8 quantization of the Linear layers
+#      * "onnx"  - sentence-transformers ONNX Runtime backend (needs `optimum[onnxruntime]`)
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from config import EMBEDDING_BACKEND, EMBEDDING_WORKERS, EMBEDDING_BATCH_SIZE, EMBEDDING_ONNX_FILE
+
+BACKENDS = ("torch", "int8", "onnx")
+
+# Model loaded once per worker process by the pool initializer
+_worker_model = None
+
+
+def load_model(model_name: str, backend: str = "torch", torch_threads: Optional[int] = None):
+    """Loads a SentenceTransformer on CPU with the requested backend."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    if torch_threads:
+        torch.set_num_threads(torch_threads)
+
+    if backend == "onnx":
+        model_kwargs = {"file_name": EMBEDDING_ONNX_FILE} if EMBEDDING_ONNX_FILE else None
+        try:
+            return SentenceTransformer(model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+        except Exception as e:
+            raise RuntimeError(
+                f"ONNX backend unavailable ({e}). Install with: pip install 'optimum[onnxruntime]'"
+            )
+
+    model = SentenceTransformer(model_name, device="cpu")
+    if backend == "int8":
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+
+def _init_worker(model_name: str, backend: str, torch_threads: int):
+    global _worker_model
+    _worker_model = load_model(model_name, backend, torch_threads)
+
+
+def _encode_batch(texts: List[str]) -> np.ndarray:
+    return _worker_model.encode(texts, batch_size=len(texts), convert_to_numpy=True).astype(np.float32)
+
+
+class EmbeddingEngine(Embeddings):
+    """
+    LangChain `Embeddings` that runs in-process for small inputs and shards
+    large `embed_documents` calls across `workers` processes, one batch of
+    `batch_size` chunks per task. Each worker gets cpu_count // workers
+    torch threads so the pool does not oversubscribe the cores.
+    """
+
+    def __init__(self, model_name: str, backend: str = EMBEDDING_BACKEND,
+                 workers: int = EMBEDDING_WORKERS, batch_size: int = EMBEDDING_BATCH_SIZE):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown embedding backend '{backend}', expected one of {BACKENDS}")
+        self.model_name = model_name
+        self.backend = backend
+        self.workers = max(1, workers)
+        self.batch_size = batch_size
+        self._model = None
+        self._pool = None
+
+    @property
+    def cache_name(self) -> str:
+        """Embedding-cache namespace: quantized/ONNX vectors differ slightly from torch ones."""
+        return self.model_name if self.backend == "torch" else f"{self.model_name}/{self.backend}"
+
+    def _local_model(self):
+        if self._model is None:
+            self._model = load_model(self.model_name, self.backend)
+        return self._model
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            threads = max(1, (os.cpu_count() or 1) // self.workers)
+            # "spawn" avoids forking a process that already holds torch thread pools
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.model_name, self.backend, threads),
+            )
+        return self._pool
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        if self.workers == 1 or len(texts) <= self.batch_size:
+            vectors = self._local_model().encode(texts, batch_size=self.batch_size, convert_to_numpy=True)
+            return vectors.astype(np.float32).tolist()
+
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results = self._get_pool().map(_encode_batch, batches)
+        return np.vstack(list(results)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._local_model().encode([text], convert_to_numpy=True)[0].astype(np.float32).tolist()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
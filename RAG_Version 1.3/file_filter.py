@@ -0,0 +1,216 @@
+# file_filter.py
+#
+# Responsible for:
+#  - Walking the repo once and deciding which files are worth ingesting
+#  - Honoring .gitignore (via `git ls-files`, or a simple matcher without git)
+#  - Skipping vendored paths, oversized files and binaries (by extension or by sniffing the first bytes)
+#  - Reading survivors with a fast UTF-8-first decode
+#  - Counting skips per category and the bytes that were never read
+
+import fnmatch
+import os
+import subprocess
+from typing import Iterable, Iterator, List, Optional
+from config import INGEST_MAX_FILE_BYTES, INGEST_SKIP_DIRS
+
+SNIFF_BYTES = 8192
+
+# Extensions that are never text; skipped without opening the file
+BINARY_EXTENSIONS = {
+    "png", "jpg", "jpeg", "gif", "bmp", "ico", "webp", "svgz", "tif", "tiff",
+    "pdf", "doc", "docx", "xls", "xlsx", "ppt", "pptx",
+    "zip", "gz", "tgz", "bz2", "xz", "7z", "rar", "tar", "jar", "war", "whl", "egg",
+    "exe", "dll", "so", "dylib", "a", "o", "obj", "lib", "bin", "class", "pyc", "pyo",
+    "woff", "woff2", "ttf", "otf", "eot", "mp3", "mp4", "wav", "avi", "mov", "mkv",
+    "sqlite", "db", "npy", "npz", "pkl", "pt", "onnx", "h5", "parquet",
+}
+
+SKIP_CATEGORIES = ["gitignored", "vendored", "too_large", "binary_extension", "binary_content", "unreadable"]
+
+
+# ------------------------------
+# Report
+# ------------------------------
+def new_scan_report() -> dict:
+    return {
+        "kept": 0,
+        "kept_bytes": 0,
+        "skipped": {c: 0 for c in SKIP_CATEGORIES},
+        "skipped_bytes": {c: 0 for c in SKIP_CATEGORIES},
+        "fallback_decodes": 0,
+    }
+
+
+def _skip(report: Optional[dict], category: str, size: int):
+    if report is not None:
+        report["skipped"][category] += 1
+        report["skipped_bytes"][category] += size
+
+
+def print_scan_report(report: dict):
+    saved = sum(report["skipped_bytes"].values())
+    print(f"📊 Pre-scan: kept {report['kept']} files ({report['kept_bytes'] / 1024:.1f} KB), "
+          f"skipped {sum(report['skipped'].values())} files ({saved / 1024:.1f} KB never decoded)")
+    for category in SKIP_CATEGORIES:
+        if report["skipped"][category]:
+            print(f"   - {category}: {report['skipped'][category]} files, "
+                  f"{report['skipped_bytes'][category] / 1024:.1f} KB")
+    if report["fallback_decodes"]:
+        print(f"   - non-UTF-8 files decoded with fallback: {report['fallback_decodes']}")
+
+
+# ------------------------------
+# Candidate listing (.gitignore)
+# ------------------------------
+def _git_ls_files(repo_path: str, *args: str) -> Optional[List[str]]:
+    try:
+        out = subprocess.run(
+            ["git", "ls-files", "-z", *args],
+            cwd=repo_path, capture_output=True, check=True,
+        ).stdout.decode("utf-8", errors="replace")
+    except Exception:
+        return None
+    return [p for p in out.split("\0") if p]
+
+
+def _read_gitignore(repo_path: str) -> List[str]:
+    path = os.path.join(repo_path, ".gitignore")
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def _is_ignored(rel_path: str, patterns: List[str]) -> bool:
+    """Minimal .gitignore matching for trees that are not git checkouts."""
+    parts = rel_path.split("/")
+    for pattern in patterns:
+        if pattern.startswith("!"):
+            continue
+        anchored = pattern.startswith("/")
+        pattern = pattern.strip("/")
+        if anchored or "/" in pattern:
+            if fnmatch.fnmatch(rel_path, pattern) or rel_path.startswith(pattern + "/"):
+                return True
+        elif any(fnmatch.fnmatch(part, pattern) for part in parts):
+            return True
+    return False
+
+
+def list_candidate_files(repo_path: str, report: Optional[dict] = None) -> List[str]:
+    """
+    Returns repo-relative paths of all non-ignored files.
+    Uses git's own ignore logic when the tree is a checkout (nested
+    .gitignore files, global excludes), else walks the tree.
+    """
+    if os.path.isdir(os.path.join(repo_path, ".git")) or os.path.isfile(os.path.join(repo_path, ".git")):
+        files = _git_ls_files(repo_path, "--cached", "--others", "--exclude-standard")
+        if files is not None:
+            for rel_path in _git_ls_files(repo_path, "--others", "--ignored", "--exclude-standard") or []:
+                _skip(report, "gitignored", _size(os.path.join(repo_path, rel_path)))
+            return sorted(set(files))
+
+    patterns = _read_gitignore(repo_path)
+    files = []
+    for root, dirs, names in os.walk(repo_path):
+        dirs[:] = sorted(d for d in dirs if d != ".git")
+        for name in sorted(names):
+            rel_path = os.path.relpath(os.path.join(root, name), repo_path).replace(os.sep, "/")
+            if _is_ignored(rel_path, patterns):
+                _skip(report, "gitignored", _size(os.path.join(root, name)))
+            else:
+                files.append(rel_path)
+    return files
+
+
+# ------------------------------
+# Per-file checks
+# ------------------------------
+def _size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _looks_binary(head: bytes) -> bool:
+    """NUL bytes, or a high share of control characters, mean binary."""
+    if not head:
+        return False
+    if b"\0" in head:
+        return True
+    control = sum(1 for b in head if b < 32 and b not in (9, 10, 12, 13, 27))
+    return control / len(head) > 0.3
+
+
+def classify_file(repo_path: str, rel_path: str, max_bytes: int = INGEST_MAX_FILE_BYTES,
+                  skip_dirs: Iterable[str] = INGEST_SKIP_DIRS) -> Optional[str]:
+    """Returns the skip category for a file, or None if it should be ingested."""
+    parts = rel_path.split("/")
+    if any(part in skip_dirs for part in parts[:-1]):
+        return "vendored"
+
+    ext = parts[-1].rsplit(".", 1)[-1].lower() if "." in parts[-1] else ""
+    if ext in BINARY_EXTENSIONS:
+        return "binary_extension"
+
+    full_path = os.path.join(repo_path, rel_path)
+    if _size(full_path) > max_bytes:
+        return "too_large"
+    try:
+        with open(full_path, "rb") as f:
+            if _looks_binary(f.read(SNIFF_BYTES)):
+                return "binary_content"
+    except OSError:
+        return "unreadable"
+    return None
+
+
+def scan_files(repo_path: str, paths: Optional[Iterable[str]] = None,
+               report: Optional[dict] = None) -> Iterator[str]:
+    """
+    Yields the repo-relative paths that survive every filter.
+    `paths` restricts the scan to given files (incremental mode); None scans the whole tree.
+    """
+    if paths is None:
+        paths = list_candidate_files(repo_path, report)
+    for rel_path in paths:
+        full_path = os.path.join(repo_path, rel_path)
+        if not os.path.isfile(full_path):
+            continue
+        category = classify_file(repo_path, rel_path)
+        if category:
+            _skip(report, category, _size(full_path))
+            continue
+        yield rel_path
+
+
+# ------------------------------
+# Fast decode
+# ------------------------------
+def read_text(full_path: str, report: Optional[dict] = None) -> Optional[str]:
+    """
+    UTF-8 first (covers almost every source file); falls back to cp1252/latin-1
+    instead of running charset detection on every file.
+    """
+    try:
+        with open(full_path, "rb") as f:
+            raw = f.read()
+    except OSError:
+        _skip(report, "unreadable", 0)
+        return None
+
+    try:
+        text = raw.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        try:
+            text = raw.decode("cp1252")
+        except UnicodeDecodeError:
+            text = raw.decode("latin-1")
+        if report is not None:
+            report["fallback_decodes"] += 1
+
+    if report is not None:
+        report["kept"] += 1
+        report["kept_bytes"] += len(raw)
+    return text
@@ -0,0 +1,201 @@
+# github_client.py
+#
+# Responsible for:
+#  - One pooled `requests.Session` for every GitHub API call (keep-alive, retries with backoff)
+#  - An on-disk response cache: repeat GETs are sent with If-None-Match / If-Modified-Since,
+#    and a 304 (which does not count against the rate limit) is answered from the cache
+#  - Tracking X-RateLimit-* headers and sleeping until the reset before the quota runs out
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+from config import GITHUB_TOKEN, GITHUB_CACHE_PATH, GITHUB_MAX_RETRIES, GITHUB_RATE_LIMIT_RESERVE
+
+API_ROOT = "https://api.github.com"
+POOL_SIZE = 16
+
+# Response headers kept with a cached body
+_CACHED_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Link")
+
+
+class GitHubClient:
+    """
+    Thin wrapper over a shared Session. `get` is cached and conditional;
+    `post`/`patch` are not cached. Every call passes through the rate-limit throttle.
+    """
+
+    def __init__(self, token: Optional[str] = GITHUB_TOKEN, cache_path: str = GITHUB_CACHE_PATH,
+                 max_retries: int = GITHUB_MAX_RETRIES, rate_limit_reserve: int = GITHUB_RATE_LIMIT_RESERVE):
+        self.rate_limit_reserve = rate_limit_reserve
+        self.requests_sent = 0
+        self.not_modified = 0
+        self.rate_limit_remaining: Optional[int] = None
+        self.rate_limit_reset: Optional[float] = None
+        self._lock = threading.Lock()
+
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=0.5,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=("GET", "PATCH"),  # never replay a POST (would duplicate comments)
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"User-Agent": "rag-pr-reviewer"})
+        if token:
+            self.session.headers["Authorization"] = f"token {token}"
+        # Cached bodies are per token: different tokens may see different repos
+        self._token_key = hashlib.sha256((token or "").encode("utf-8")).hexdigest()[:16]
+
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, url TEXT NOT NULL, headers TEXT NOT NULL,"
+            " body BLOB NOT NULL, fetched REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    # ------------------------------
+    # Rate limit
+    # ------------------------------
+    def _track_rate_limit(self, response: requests.Response):
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        reset = response.headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None:
+            return
+        with self._lock:
+            self.rate_limit_remaining = int(remaining)
+            self.rate_limit_reset = float(reset)
+
+    def _throttle(self):
+        """Sleeps until the window resets once fewer than `rate_limit_reserve` calls are left."""
+        with self._lock:
+            remaining, reset = self.rate_limit_remaining, self.rate_limit_reset
+        if remaining is None or remaining > self.rate_limit_reserve:
+            return
+        wait = reset - time.time() + 1
+        if wait > 0:
+            print(f"⏳ GitHub rate limit nearly exhausted ({remaining} left), sleeping {wait:.0f}s until reset...")
+            time.sleep(wait)
+        with self._lock:
+            self.rate_limit_remaining = None
+
+    def _is_rate_limited(self, response: requests.Response) -> bool:
+        return response.status_code in (403, 429) and (
+            response.headers.get("X-RateLimit-Remaining") == "0" or "Retry-After" in response.headers
+        )
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Throttled request; a rate-limited 403/429 is retried once after the advertised wait."""
+        if url.startswith("/"):
+            url = API_ROOT + url
+        kwargs.setdefault("timeout", 30)
+        for attempt in range(2):
+            self._throttle()
+            response = self.session.request(method, url, **kwargs)
+            with self._lock:
+                self.requests_sent += 1
+            self._track_rate_limit(response)
+            if attempt == 0 and self._is_rate_limited(response):
+                wait = float(response.headers.get("Retry-After") or
+                             max(0.0, float(response.headers.get("X-RateLimit-Reset", time.time())) - time.time()) + 1)
+                print(f"⏳ GitHub rate limited ({response.status_code}), retrying in {wait:.0f}s...")
+                time.sleep(wait)
+                continue
+            return response
+
+    # ------------------------------
+    # Conditional, cached GET
+    # ------------------------------
+    def _cache_key(self, url: str, accept: str) -> str:
+        return hashlib.sha256(f"{self._token_key}\0{accept}\0{url}".encode("utf-8")).hexdigest()
+
+    def get(self, url: str, accept: str = "application/vnd.github+json", params: Optional[dict] = None) -> requests.Response:
+        """
+        GET with the cache in front. Successful responses are stored; the next
+        GET of the same URL + Accept sends the stored validators, and a 304 is
+        turned back into a 200 carrying the cached body.
+        """
+        if url.startswith("/"):
+            url = API_ROOT + url
+        if params:
+            url = requests.Request("GET", url, params=params).prepare().url
+        key = self._cache_key(url, accept)
+        with self._lock:
+            row = self._conn.execute("SELECT headers, body FROM responses WHERE key = ?", (key,)).fetchone()
+
+        headers = {"Accept": accept}
+        if row:
+            cached_headers = json.loads(row[0])
+            if cached_headers.get("ETag"):
+                headers["If-None-Match"] = cached_headers["ETag"]
+            if cached_headers.get("Last-Modified"):
+                headers["If-Modified-Since"] = cached_headers["Last-Modified"]
+
+        response = self.request("GET", url, headers=headers)
+
+        if response.status_code == 304 and row:
+            with self._lock:
+                self.not_modified += 1
+            return self._from_cache(url, json.loads(row[0]), row[1])
+
+        if response.status_code == 200 and (response.headers.get("ETag") or response.headers.get("Last-Modified")):
+            kept = {h: response.headers[h] for h in _CACHED_HEADERS if h in response.headers}
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                    (key, url, json.dumps(kept), response.content, time.time()),
+                )
+                self._conn.commit()
+        return response
+
+    @staticmethod
+    def _from_cache(url: str, headers: dict, body: bytes) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.headers = CaseInsensitiveDict(headers)
+        response._content = body
+        response.encoding = "utf-8"
+        response.reason = "OK (cached)"
+        return response
+
+    # ------------------------------
+    # Writes
+    # ------------------------------
+    def post(self, url: str, json_body: dict, accept: str = "application/vnd.github+json") -> requests.Response:
+        return self.request("POST", url, headers={"Accept": accept}, json=json_body)
+
+    def patch(self, url: str, json_body: dict, accept: str = "application/vnd.github+json") -> requests.Response:
+        return self.request("PATCH", url, headers={"Accept": accept}, json=json_body)
+
+    def stats(self) -> dict:
+        return {
+            "requests_sent": self.requests_sent,
+            "not_modified": self.not_modified,
+            "rate_limit_remaining": self.rate_limit_remaining,
+        }
+
+
+# --- Cached Globals ---
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(token: Optional[str] = GITHUB_TOKEN) -> GitHubClient:
+    """Shared client per token, so every caller reuses the same connection pool and cache."""
+    with _clients_lock:
+        if token not in _clients:
+            _clients[token] = GitHubClient(token)
+        return _clients[token]
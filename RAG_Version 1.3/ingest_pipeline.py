@@ -0,0 +1,341 @@
+# ingest_pipeline.py
+#
+# Responsible for:
+#  - Streaming pre-filtered files out of the repo one at a time (no full in-memory document list)
+#  - Splitting each file as it arrives
+#  - Embedding chunks in fixed-size batches and upserting batch by batch
+#  - Capping memory with a bounded number of in-flight chunks while
+#    embedding (CPU) and uploading (network) overlap
+#  - The whole ingest run shared by ingest.py and corrected_ingest_V_1.3.py:
+#    state -> diff -> stream upsert -> stale delete -> reconcile -> save
+
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, ContextManager, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from git import Repo
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from pinecone import Pinecone, ServerlessSpec
+from config import (
+    PINECONE_API_KEY, PINECONE_INDEX_NAME, REPO, INGEST_PURGE_LEGACY_IDS, VECTOR_BACKEND, LOCAL_INDEX_DIR,
+    INGEST_BATCH_SIZE, INGEST_MAX_IN_FLIGHT, INGEST_UPLOAD_WORKERS, INGEST_STATE_FILE, LEXICAL_INDEX_PATH,
+)
+from code_splitter import CodeAwareSplitter
+from embedding_cache import CachedEmbeddings
+from embedding_engine import EmbeddingEngine
+from file_filter import scan_files, read_text, new_scan_report, print_scan_report
+from ingest_state import (
+    relative_source, index_identity, load_ingest_state, save_ingest_state, diff_since, delete_vectors,
+    reconcile_index, write_index_version,
+)
+from lexical_index import LexicalIndex
+from local_vector_store import LocalVectorStore
+
+# Metadata key PineconeVectorStore reads the chunk text from
+TEXT_KEY = "text"
+
+# Records per upsert request (keeps requests under Pinecone's 2 MB limit)
+UPSERT_REQUEST_SIZE = 100
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBEDDING_DIMENSION = 384  # Dimension for 'all-MiniLM-L6-v2'
+
+
+# ------------------------------
+# Stage 1: stream documents
+# ------------------------------
+def iter_documents(repo_path: str, paths: Optional[Iterable[str]] = None,
+                   report: Optional[dict] = None) -> Iterator[Document]:
+    """
+    Loads files lazily, one Document at a time, after the pre-scan filter
+    (gitignore, vendored paths, size limit, binary sniffing) has run.
+    `paths` limits loading to the given repo-relative paths (incremental mode);
+    None streams the whole tree. Skip counts are collected into `report`.
+    """
+    for rel_path in scan_files(repo_path, paths, report):
+        full_path = os.path.join(repo_path, rel_path)
+        text = read_text(full_path, report)
+        if text is not None:
+            yield Document(page_content=text, metadata={"source": full_path})
+
+
+# ------------------------------
+# Stage 2: split per file
+# ------------------------------
+def iter_chunks(documents: Iterable[Document], splitter) -> Iterator[Document]:
+    """Splits each document as soon as it is loaded."""
+    for doc in documents:
+        yield from splitter.split_documents([doc])
+
+
+def id_prefix(repo_name: str) -> str:
+    """Common prefix of every vector ID produced for this repo (used by reconciliation)."""
+    return f"{repo_name}#"
+
+
+def chunk_id(repo_name: str, path: str, chunk_index: int, text: str) -> str:
+    """
+    Stable vector ID: the same chunk of the same file always maps to the same
+    ID, so re-ingesting it overwrites the record instead of adding a copy.
+    The path is hashed to stay well under Pinecone's 512-byte ID limit.
+    """
+    path_hash = hashlib.sha256(path.encode("utf-8")).hexdigest()[:16]
+    content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+    return f"{id_prefix(repo_name)}{path_hash}#{chunk_index}#{content_hash}"
+
+
+def assign_ids(chunks: Iterable[Document], repo_path: str, repo_name: str,
+               manifest: Dict[str, List[str]],
+               known_ids: Optional[Set[str]] = None) -> Iterator[Tuple[str, Document]]:
+    """
+    Gives every chunk its deterministic vector ID and records it in the
+    per-file manifest. Chunks whose ID is in `known_ids` are already in the
+    index with identical content, so they are recorded but not re-uploaded.
+    """
+    known_ids = known_ids or set()
+    counters: Dict[str, int] = {}
+    for chunk in chunks:
+        path = relative_source(chunk, repo_path)
+        index = counters.get(path, 0)
+        counters[path] = index + 1
+
+        vid = chunk_id(repo_name, path, index, chunk.page_content)
+        chunk.metadata["path"] = path
+        # Stored with the chunk, so vector and lexical hits of it are recognized as the same chunk
+        chunk.metadata["chunk_id"] = vid
+        manifest.setdefault(path, []).append(vid)
+        if vid not in known_ids:
+            yield vid, chunk
+
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    """Groups an iterator into lists of at most `size` items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ------------------------------
+# Stage 3+4: embed and upsert
+# ------------------------------
+def _to_records(batch: List[Tuple[str, Document]], vectors: List[List[float]]) -> List[dict]:
+    records = []
+    for (chunk_id, chunk), values in zip(batch, vectors):
+        metadata = dict(chunk.metadata)
+        metadata[TEXT_KEY] = chunk.page_content
+        records.append({"id": chunk_id, "values": values, "metadata": metadata})
+    return records
+
+
+def stream_upsert(items: Iterable[Tuple[str, Document]], embeddings: Embeddings, index,
+                  batch_size: int = INGEST_BATCH_SIZE,
+                  max_in_flight: int = INGEST_MAX_IN_FLIGHT,
+                  upload_workers: int = INGEST_UPLOAD_WORKERS,
+                  lexical_index=None) -> dict:
+    """
+    Embeds (id, chunk) pairs in batches on the calling thread and hands each
+    batch to an upload thread pool, so the next batch is embedded while the
+    previous one is uploading. At most `max_in_flight` chunks are held
+    (being embedded or waiting for upload) at any time.
+
+    `index` is anything with Pinecone's `upsert(vectors=[...])` signature.
+    `lexical_index` (optional, same signature, thread-safe) receives a batch
+    only after its vector upload succeeded, so a failed run never leaves
+    lexical hits for chunks the vector index does not have.
+    Returns counts of files, chunks and batches processed.
+    """
+    max_pending_batches = max(1, max_in_flight // batch_size - 1)
+    print(f"  Batches of {batch_size} chunks, up to {max_pending_batches} waiting for upload")
+    slots = threading.BoundedSemaphore(max_pending_batches)
+    errors: List[Exception] = []
+    futures = []
+    stats = {"chunks": 0, "batches": 0, "files": 0}
+    seen_files = set()
+
+    def upload(records):
+        try:
+            for start in range(0, len(records), UPSERT_REQUEST_SIZE):
+                index.upsert(vectors=records[start:start + UPSERT_REQUEST_SIZE])
+            if lexical_index is not None:
+                lexical_index.upsert(vectors=records)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=upload_workers) as pool:
+        for batch in batched(items, batch_size):
+            if errors:
+                break
+            vectors = embeddings.embed_documents([chunk.page_content for _, chunk in batch])
+            records = _to_records(batch, vectors)
+
+            slots.acquire()  # backpressure: wait for an upload slot
+            futures.append(pool.submit(upload, records))
+
+            stats["chunks"] += len(batch)
+            stats["batches"] += 1
+            seen_files.update(chunk.metadata.get("source") for _, chunk in batch)
+            print(f"  ↳ batch {stats['batches']}: {stats['chunks']} chunks embedded")
+
+        for future in futures:
+            future.result()
+
+    if errors:
+        raise RuntimeError(f"Upsert failed after {stats['batches']} batches: {errors[0]}")
+
+    stats["files"] = len(seen_files)
+    return stats
+
+
+# ------------------------------
+# The whole run
+# ------------------------------
+def open_vector_index():
+    """Opens the configured vector index: the local store, or Pinecone (created if missing)."""
+    if VECTOR_BACKEND == "local":
+        print(f"🗂 Opening local vector store: {LOCAL_INDEX_DIR}")
+        return LocalVectorStore(LOCAL_INDEX_DIR)
+
+    print("🌲 Initializing Pinecone client…")
+    pc = Pinecone(api_key=PINECONE_API_KEY)
+    if PINECONE_INDEX_NAME not in pc.list_indexes().names():
+        print(f"📌 Creating Pinecone index: {PINECONE_INDEX_NAME}")
+        pc.create_index(
+            name=PINECONE_INDEX_NAME,
+            dimension=EMBEDDING_DIMENSION,
+            metric="cosine",
+            spec=ServerlessSpec(cloud="aws", region="us-east-1"),
+        )
+    else:
+        print(f"✔ Pinecone index '{PINECONE_INDEX_NAME}' already exists.")
+    return pc.Index(PINECONE_INDEX_NAME)
+
+
+def run_ingest(repo: Repo, head_commit: str, checkout: Callable[[], ContextManager[str]],
+               full_rebuild: bool = False, index=None, embeddings: Optional[Embeddings] = None,
+               repo_name: str = REPO, state_path: str = INGEST_STATE_FILE,
+               lexical_path: str = LEXICAL_INDEX_PATH) -> str:
+    """
+    Brings the index up to date with `head_commit`: only the files changed
+    since the last ingested commit are re-embedded (everything on a full
+    rebuild), then vectors of deleted/rewritten files are removed and the
+    new commit is recorded.
+
+    `checkout()` returns a context manager yielding a directory with
+    `head_commit` checked out; it is only entered when there is work to do.
+    `index` and `embeddings` default to the configured vector index and the
+    cached embedding engine.
+    Returns what happened: "up_to_date", "no_changes", "incremental",
+    "full" or "failed".
+    """
+    # --- 1. Incremental or full rebuild? ---
+    identity = index_identity()
+    state = load_ingest_state(identity, repo_name, state_path)
+    manifest = dict(state["files"])
+    # BM25 index over the same chunks (hybrid retrieval); must cover everything the vector index has
+    lexical = LexicalIndex(lexical_path, identity=f"{identity}/{repo_name}")
+    if not full_rebuild and state["commit"] and len(lexical) == 0:
+        print("⚠ Lexical index is empty, doing a full rebuild to populate it.")
+        full_rebuild = True
+    changes = None
+    if not full_rebuild and state["commit"]:
+        if state["commit"] == head_commit:
+            print(f"✔ Index already up to date with {head_commit[:10]}, nothing to ingest.")
+            return "up_to_date"
+        changes = diff_since(repo, state["commit"], head_commit)
+        if changes is None:
+            print("⚠ Falling back to a full rebuild.")
+
+    # --- 2. Pick the files to stream (all of them, or only the changed ones) ---
+    if changes is None:
+        print(f"\n📄 Full rebuild: streaming all files at {head_commit[:10]}")
+        lexical.clear()
+        # Every previously recorded ID is a candidate for removal
+        candidate_ids = [vid for ids in manifest.values() for vid in ids]
+        manifest = {}
+        paths = None  # whole tree
+        known_ids = set()
+    else:
+        to_embed, to_remove = changes
+        print(f"\n🔁 Incremental: {state['commit'][:10]}..{head_commit[:10]} "
+              f"({len(to_embed)} to embed, {len(to_remove)} to remove)")
+        candidate_ids = [vid for path in to_remove for vid in manifest.pop(path, [])]
+        paths = to_embed
+        # Unchanged chunks of modified files keep their ID and need no upload
+        known_ids = set(candidate_ids)
+
+        if not to_embed and not candidate_ids:
+            print("✔ Nothing to upload or remove.")
+            save_ingest_state(identity, repo_name, head_commit, manifest, state_path)
+            return "no_changes"
+
+    # --- 3. Embeddings and vector index ---
+    engine = None
+    if embeddings is None:
+        print(f"\n🔢 Loading embedding model: {EMBEDDING_MODEL}")
+        engine = EmbeddingEngine(EMBEDDING_MODEL)
+        embeddings = CachedEmbeddings(engine, engine.cache_name)
+        # Give every worker process a full batch per pipeline step
+        batch_size = max(INGEST_BATCH_SIZE, engine.workers * engine.batch_size)
+    else:
+        batch_size = INGEST_BATCH_SIZE
+    if index is None:
+        index = open_vector_index()
+
+    # --- 4. Stream: load -> split -> embed -> upload (batch by batch) ---
+    print("\n📤 Streaming files through split/embed/upload…")
+    # Code -> function/class units; everything else -> generic 1000/100 split
+    splitter = CodeAwareSplitter(
+        chunk_size=1000,
+        chunk_overlap=100,
+        code_chunk_size=1500,
+    )
+    scan_report = new_scan_report()
+    try:
+        with checkout() as tree_path:
+            documents = iter_documents(tree_path, paths, scan_report)
+            chunks = iter_chunks(documents, splitter)
+            id_chunks = assign_ids(chunks, tree_path, repo_name, manifest, known_ids)
+            stats = stream_upsert(id_chunks, embeddings, index, batch_size=batch_size,
+                                  max_in_flight=max(INGEST_MAX_IN_FLIGHT, 2 * batch_size),
+                                  lexical_index=lexical)
+    except Exception as e:
+        print(f"❌ Streaming ingest failed: {e}")
+        return "failed"
+    finally:
+        if engine is not None:
+            engine.close()
+
+    print(f"📄 Uploaded {stats['chunks']} chunks from {stats['files']} files ({stats['batches']} batches).")
+    print_scan_report(scan_report)
+    local = isinstance(index, LocalVectorStore)
+    if local:
+        index.persist()
+
+    # --- 5. Remove vectors that no longer exist (after the upsert, so there is no gap) ---
+    live_ids = {vid for ids in manifest.values() for vid in ids}
+    stale_ids = [vid for vid in candidate_ids if vid not in live_ids]
+    if stale_ids:
+        print(f"\n🗑 Removing {len(stale_ids)} stale vectors…")
+        delete_vectors(index, stale_ids)
+        delete_vectors(lexical, stale_ids)
+    if changes is None:
+        reconcile_index(index, id_prefix(repo_name), live_ids, INGEST_PURGE_LEGACY_IDS)
+    if local:
+        index.persist()
+    lexical.persist()
+    write_index_version(index, repo_name, head_commit, EMBEDDING_DIMENSION)
+
+    # --- 6. Record the ingested commit ---
+    save_ingest_state(identity, repo_name, head_commit, manifest, state_path)
+    if isinstance(embeddings, CachedEmbeddings):
+        print(f"🗃 Embedding cache: {embeddings.stats()}")
+    return "full" if changes is None else "incremental"
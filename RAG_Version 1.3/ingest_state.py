@@ -0,0 +1,227 @@
+# ingest_state.py
+#
+# Responsible for:
+#  - Remembering the last ingested commit and the vector IDs each file produced
+#  - Working out which files changed since then (git diff --name-status)
+#  - Removing stale vectors of deleted/rewritten files
+#  - Reconciling the index against the IDs that should exist
+#  - A version record stored with the index itself, so readers on other machines
+#    (the review job) can tell which contents they are querying
+
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+from git import Repo
+from langchain_core.documents import Document
+from config import INGEST_STATE_FILE, PINECONE_INDEX_NAME, VECTOR_BACKEND, LOCAL_INDEX_DIR
+
+# Pinecone accepts at most 1000 IDs per delete request
+DELETE_BATCH_SIZE = 1000
+# Bumped when the stored chunk records change shape (2: "chunk_id" in the metadata);
+# state from another version forces a full rebuild, so every record is rewritten
+STATE_VERSION = 2
+# The version record lives outside the chunk namespace (Pinecone) / next to the vectors (local)
+VERSION_NAMESPACE = "__ingest_meta__"
+LOCAL_VERSION_FILE = "index_version.json"
+
+
+# ------------------------------
+# State file
+# ------------------------------
+def index_identity() -> str:
+    """Names the vector index the state belongs to (Pinecone index or local directory)."""
+    if VECTOR_BACKEND == "local":
+        return f"local:{os.path.abspath(LOCAL_INDEX_DIR)}"
+    return PINECONE_INDEX_NAME
+
+
+def load_ingest_state(index_name: str, repo_name: str, path: str = INGEST_STATE_FILE) -> dict:
+    """
+    Returns the saved state for this index/repo pair, or an empty state if
+    there is none (or it belongs to a different index).
+    """
+    empty = {"commit": None, "files": {}}
+    if not os.path.exists(path):
+        return empty
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except Exception as e:
+        print(f"⚠ Could not read ingest state {path}: {e}")
+        return empty
+
+    if state.get("index_name") != index_name or state.get("repo") != repo_name:
+        print("⚠ Ingest state belongs to a different index/repo, ignoring it.")
+        return empty
+    if state.get("version") != STATE_VERSION:
+        print(f"⚠ Ingest state has format {state.get('version', 1)}, expected {STATE_VERSION}; doing a full rebuild.")
+        # Keep the manifest: its IDs are still the candidates for removal
+        return {"commit": None, "files": state.get("files", {})}
+    state.setdefault("files", {})
+    return state
+
+
+def save_ingest_state(index_name: str, repo_name: str, commit: str,
+                      files: Dict[str, List[str]], path: str = INGEST_STATE_FILE):
+    """Persists the ingested commit SHA and the per-file vector ID manifest."""
+    state = {
+        "version": STATE_VERSION,
+        "index_name": index_name,
+        "repo": repo_name,
+        "commit": commit,
+        "files": files,
+        "timestamp": datetime.now().isoformat(),
+    }
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+        print(f"💾 Ingest state saved ({commit[:10]}, {len(files)} files).")
+    except Exception as e:
+        print(f"❌ Error saving ingest state {path}: {e}")
+
+
+# ------------------------------
+# Index version record
+# ------------------------------
+def _version_record_id(repo_name: str) -> str:
+    return f"{repo_name}#__version__"
+
+
+def write_index_version(index, repo_name: str, commit: str, dimension: int):
+    """Records the ingested commit in the index (call after the upload and cleanup succeeded)."""
+    record = {"commit": commit, "ingested_at": datetime.now().isoformat()}
+    try:
+        if VECTOR_BACKEND == "local":
+            path = os.path.join(LOCAL_INDEX_DIR, LOCAL_VERSION_FILE)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"repo": repo_name, **record}, f)
+        else:
+            # Pinecone rejects all-zero dense vectors; the values are never searched
+            index.upsert(vectors=[{"id": _version_record_id(repo_name), "values": [1.0] + [0.0] * (dimension - 1),
+                                   "metadata": record}], namespace=VERSION_NAMESPACE)
+        print(f"🏷️ Index version recorded ({commit[:10]}).")
+    except Exception as e:
+        print(f"⚠ Could not record the index version: {e}")
+
+
+def read_index_version(index, repo_name: str) -> Optional[str]:
+    """
+    `<index>@<commit>@<ingested_at>` from the record written by ingest;
+    None if there is none (never ingested, or ingested before records existed).
+    """
+    try:
+        if VECTOR_BACKEND == "local":
+            path = os.path.join(LOCAL_INDEX_DIR, LOCAL_VERSION_FILE)
+            if not os.path.exists(path):
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+            if record.get("repo") != repo_name:
+                return None
+        else:
+            record_id = _version_record_id(repo_name)
+            response = index.fetch(ids=[record_id], namespace=VERSION_NAMESPACE)
+            vectors = getattr(response, "vectors", None)
+            if vectors is None:
+                vectors = response.get("vectors", {})
+            vector = vectors.get(record_id)
+            if vector is None:
+                return None
+            record = getattr(vector, "metadata", None)
+            if record is None:
+                record = vector.get("metadata") or {}
+    except Exception as e:
+        print(f"⚠ Could not read the index version: {e}")
+        return None
+    if not record.get("commit"):
+        return None
+    return f"{index_identity()}@{record['commit']}@{record.get('ingested_at', '')}"
+
+
+# ------------------------------
+# Change detection
+# ------------------------------
+def diff_since(repo: Repo, old_commit: str, new_commit: str = "HEAD") -> Optional[Tuple[List[str], List[str]]]:
+    """
+    Compares two commits with `git diff --name-status`.
+    Returns (paths_to_embed, paths_to_remove), or None if the diff cannot be
+    computed (e.g. the old commit is not in this clone) and a full rebuild is needed.
+
+    Modified and renamed files appear in both lists: their old vectors are
+    removed and the new content is embedded again.
+    """
+    try:
+        raw = repo.git.diff("--name-status", "-z", "-M", old_commit, new_commit)
+    except Exception as e:
+        print(f"⚠ git diff {old_commit[:10]}..{new_commit} failed: {e}")
+        return None
+
+    to_embed: List[str] = []
+    to_remove: List[str] = []
+    tokens = [t for t in raw.split("\0") if t]
+    i = 0
+    while i < len(tokens):
+        status = tokens[i][0]
+        if status in ("R", "C"):
+            old_path, new_path = tokens[i + 1], tokens[i + 2]
+            if status == "R":
+                to_remove.append(old_path)
+            to_embed.append(new_path)
+            i += 3
+            continue
+
+        path = tokens[i + 1]
+        if status == "D":
+            to_remove.append(path)
+        elif status == "A":
+            to_embed.append(path)
+        else:  # M (modified), T (type change), etc.
+            to_remove.append(path)
+            to_embed.append(path)
+        i += 2
+
+    return to_embed, to_remove
+
+
+# ------------------------------
+# Manifest and cleanup helpers
+# ------------------------------
+def relative_source(doc: Document, repo_path: str) -> str:
+    """Repo-relative, forward-slash path of a loaded document (matches git output)."""
+    return os.path.relpath(doc.metadata["source"], repo_path).replace(os.sep, "/")
+
+
+def delete_vectors(vector_store, ids: List[str]):
+    """Deletes vector IDs (from a vector store or raw Pinecone index) in Pinecone-sized batches."""
+    for start in range(0, len(ids), DELETE_BATCH_SIZE):
+        vector_store.delete(ids=ids[start:start + DELETE_BATCH_SIZE])
+
+
+def reconcile_index(index, prefix: str, live_ids: Set[str], purge_legacy: bool = False) -> int:
+    """
+    Deletes every vector under `prefix` that is not in `live_ids`
+    (e.g. left behind by a crashed run or an old manifest).
+    With `purge_legacy`, IDs not in the deterministic format at all (random
+    IDs from older ingests) are deleted too - only use this on an index
+    dedicated to this repo.
+    Returns the number of deleted IDs; 0 if the index does not support listing.
+    """
+    orphans: List[str] = []
+    try:
+        for page in index.list(prefix=None if purge_legacy else prefix):
+            for vid in page:
+                if vid.startswith(prefix):
+                    if vid not in live_ids:
+                        orphans.append(vid)
+                elif purge_legacy and "#" not in vid:
+                    orphans.append(vid)
+    except Exception as e:
+        print(f"⚠ Index listing not supported, skipping reconciliation: {e}")
+        return 0
+
+    if orphans:
+        print(f"🧹 Reconciliation: deleting {len(orphans)} orphaned vectors...")
+        delete_vectors(index, orphans)
+    return len(orphans)
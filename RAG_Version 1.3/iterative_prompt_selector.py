@@ -6,18 +6,56 @@ import time
 import numpy as np
 import os
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from sklearn.linear_model import SGDRegressor
 from sklearn.preprocessing import StandardScaler
-from reviewer import fetch_pr_diff, save_text_to_file, llm, parser, post_review_comment, fetch_pr_metadata
+from reviewer import save_text_to_file, llm_for, stream_for, parser, post_review_comment, fetch_pr_metadata
 from config import OWNER, REPO, GITHUB_TOKEN, PR_NUMBER
 from prompts import get_prompts
-from accuracy_checker import heuristic_metrics, meta_evaluate
+from accuracy_checker import heuristic_metrics, meta_evaluate, heuristic_score, weighted_meta_score, is_llm_evaluation
 
 # NEW IMPORTS
 from static_analysis import run_static_analysis
-from rag_core import get_retriever
+from diff_provider import get_pr_diff
+from diff_parser import parse_diff
+from llm_cache import get_llm_cache
+from llm_guard import get_latency_tracker, format_latency
+from rag_core import get_retriever, get_query_cache, retrieve_for_diff
+from lexical_index import doc_key
+from config import QUERY_CACHE_ENABLED, REVIEW_WORKERS, PR_NUMBERS, REVIEW_TOKEN_BUDGET, REVIEW_STREAMING, SELECTOR_POLICY, RESULTS_DIR
 from utils import safe_truncate
+from context_packer import diff_items, text_items, section, pack_sections, format_usage
+from local_evaluator import LocalEvaluator
+from comment_stream import StreamingComment, review_comment_body
+from bandit import PromptBandit
+
+# Extra chunks a follow-up retrieval on Semgrep findings may add to the diff-based context
+STATIC_FOLLOWUP_DOCS = 2
+
+# Content flags for extract_pr_features (run over changed lines only)
+_COMMENT = re.compile(r'#|//|/\*')
+_FUNCTION = re.compile(r'def\s+\w+|\bfunction\b|\bfunc\b', re.IGNORECASE)
+_IMPORT = re.compile(r'^\s*(?:import\s|from\s|#include)', re.MULTILINE)
+_TEST = re.compile(r'test|spec|unittest', re.IGNORECASE)
+_DOCS = re.compile(r'readme|doc|comment|documentation', re.IGNORECASE)
+CONFIG_EXTENSIONS = {"json", "yml", "yaml", "xml", "conf"}
+
+# Version of what extract_pr_features computes, saved with the selector state and every stored
+# result. 2: counts from the structured parse, language flags from real file extensions.
+# History saved under another version is not comparable and is not learned from.
+FEATURE_SCHEMA_VERSION = 2
+
+
+def _timed(timings, stage, fn, *args, **kwargs):
+    """Runs one stage of generate_review and records its wall time in `timings`."""
+    start = time.time()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        timings[stage] = round(time.time() - start, 3)
+
 
 class IterativePromptSelector:
     def __init__(self):
@@ -29,6 +67,9 @@ class IterativePromptSelector:
         self.retriever = get_retriever()
         print("✅ Retriever ready.")
         # ---------------------------------
+
+        # Tiered evaluation: local scorer first, LLM meta-evaluator only when it is unsure
+        self.evaluator = LocalEvaluator(self.prompt_names, feature_schema=FEATURE_SCHEMA_VERSION)
         
         # Online learning components
         self.model = SGDRegressor(
@@ -43,6 +84,10 @@ class IterativePromptSelector:
         self.scaler = StandardScaler()
         self.is_scaler_fitted = False
         self.sample_count = 0
+        # Per-prompt contextual bandit (SELECTOR_POLICY=sgd keeps the single regressor above)
+        self.bandit = PromptBandit(self.prompt_names) if SELECTOR_POLICY != "sgd" else None
+        # Guards model/scaler between concurrent prompt selection and the single writer
+        self._model_lock = threading.Lock()
         
         # For persistence and stats
         self.feature_history = []
@@ -51,22 +96,31 @@ class IterativePromptSelector:
         
     # ... (extract_pr_features and features_to_vector methods are unchanged) ...
     def extract_pr_features(self, diff_text):
-        """Extract features from PR diff for model prediction"""
+        """
+        Extract features from PR diff for model prediction.
+        Counts and file types come from the shared single-pass parse (diff_parser);
+        the content flags scan only the changed lines, once per pattern.
+        """
+        parsed = parse_diff(diff_text)
+        paths = "\n".join(f.path for f in parsed.files)
+        changed = "\n".join(line[1:] for _, hunk in parsed.hunks() for line in hunk.lines if line[:1] in "+-")
+        extensions = {f.path.rsplit(".", 1)[-1].lower() for f in parsed.files if "." in f.path.rsplit("/", 1)[-1]}
+
         features = {}
-        features['num_lines'] = len(diff_text.split('\n'))
-        features['num_files'] = len(re.findall(r'^diff --git', diff_text, re.MULTILINE))
-        features['additions'] = len(re.findall(r'^\+', diff_text, re.MULTILINE))
-        features['deletions'] = len(re.findall(r'^-', diff_text, re.MULTILINE))
+        features['num_lines'] = parsed.total_lines
+        features['num_files'] = len(parsed.files)
+        features['additions'] = parsed.additions
+        features['deletions'] = parsed.deletions
         features['net_changes'] = features['additions'] - features['deletions']
-        features['has_comments'] = int(bool(re.search(r'#.*|//.*|/\*.*?\*/', diff_text, re.DOTALL)))
-        features['has_functions'] = int(bool(re.search(r'def\s+\w+|\bfunction\b|\bfunc\b', diff_text, re.IGNORECASE)))
-        features['has_imports'] = int(bool(re.search(r'^import\s|^from\s|^#include', diff_text, re.MULTILINE)))
-        features['has_test'] = int(bool(re.search(r'test|spec|unittest', diff_text, re.IGNORECASE)))
-        features['has_docs'] = int(bool(re.search(r'readme|doc|comment|documentation', diff_text, re.IGNORECASE)))
-        features['has_config'] = int(bool(re.search(r'\.json$|\.yml$|\.yaml$|\.xml$|\.conf', diff_text, re.IGNORECASE)))
-        features['is_python'] = int(bool(re.search(r'\.py$', diff_text, re.IGNORECASE)))
-        features['is_js'] = int(bool(re.search(r'\.js$|\.ts$', diff_text, re.IGNORECASE)))
-        features['is_java'] = int(bool(re.search(r'\.java$', diff_text, re.IGNORECASE)))
+        features['has_comments'] = int(bool(_COMMENT.search(changed)))
+        features['has_functions'] = int(bool(_FUNCTION.search(changed)))
+        features['has_imports'] = int(bool(_IMPORT.search(changed)))
+        features['has_test'] = int(bool(_TEST.search(paths) or _TEST.search(changed)))
+        features['has_docs'] = int(bool(_DOCS.search(paths) or _DOCS.search(changed)))
+        features['has_config'] = int(bool(extensions & CONFIG_EXTENSIONS))
+        features['is_python'] = int("py" in extensions)
+        features['is_js'] = int(bool(extensions & {"js", "ts"}))
+        features['is_java'] = int("java" in extensions)
         return features
     
     def features_to_vector(self, features):
@@ -81,6 +135,9 @@ class IterativePromptSelector:
     # ... (select_best_prompt and update_model methods are unchanged) ...
     def select_best_prompt(self, features_vector):
         """Select the best prompt using online model prediction"""
+        if self.bandit is not None:
+            return self.bandit.select(features_vector)
+
         if self.sample_count < 2:
             return self.prompt_names[self.sample_count % len(self.prompt_names)]
         
@@ -125,6 +182,11 @@ class IterativePromptSelector:
         self.prompt_history.append(prompt_index)
         self.score_history.append(score)
         self.sample_count += 1
+
+        if self.bandit is not None:
+            # O(d²) rank-one update of this prompt's arm only
+            self.bandit.update(features_vector, prompt_name, score)
+            return
         
         if not self.is_scaler_fitted and len(self.feature_history) >= 2:
             self.scaler.fit(self.feature_history)
@@ -167,62 +229,114 @@ class IterativePromptSelector:
                 self.model.partial_fit(all_X, all_y)
 
     #  MODIFIED: generate_review now runs RAG and Static Analysis ---
-    def generate_review(self, diff_text, selected_prompt):
-        """Generate review using RAG, static analysis, and the selected prompt"""
-        chain = self.prompts[selected_prompt] | llm | parser
+    def _static_followup(self, static_output):
+        """Cheap extra retrieval keyed on static analysis findings (skipped when there are none)."""
+        if "Static Analysis Issues Found" not in static_output:
+            return []
+        return self.retriever.invoke(f"Static Analysis: {safe_truncate(static_output, 1000)}")
+
+    def generate_review(self, diff_text, selected_prompt, owner=OWNER, repo=REPO, pr_number=PR_NUMBER, comment=None,
+                        head_sha=None):
+        """
+        Generate review using RAG, static analysis, and the selected prompt.
+        With a StreamingComment, the LLM output is streamed into it as it arrives.
+
+        Stage graph (retrieval no longer waits for Semgrep):
+            static_analysis ──> static_retrieval ─┐
+            retrieval (diff hunks) ───────────────┼──> llm
+            diff_preprocess ──────────────────────┘
+        Returns the review artifacts plus per-stage wall times; `generate_total` is
+        bounded by the slowest branch rather than the sum of all stages.
+        """
+        chain = self.prompts[selected_prompt] | llm_for(selected_prompt) | parser
         start = time.time()
+        timings = {}
 
-        # 1. Run Static Analysis
-        print("  Running static analysis...")
-        # Pass the owner, repo, and PR number to the fixed function
-        static_output = run_static_analysis(diff_text, OWNER, REPO, PR_NUMBER)
-        
-        # 2. Run RAG
-        print("  Running RAG retrieval...")
-        retrieval_query = f"How to review this code? Diff: {safe_truncate(diff_text, 1000)}\nStatic Analysis: {safe_truncate(static_output, 1000)}"
-        retrieved_docs = self.retriever.invoke(retrieval_query)
-        retrieved_context = "\n---\n".join([doc.page_content for doc in retrieved_docs])
-        
-        # 3. Truncate inputs
-        truncated_diff = safe_truncate(diff_text, 4000)
-        truncated_static = safe_truncate(static_output, 2000)
-        truncated_context = safe_truncate(retrieved_context, 2000)
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            # 1. Static analysis and diff-based retrieval start together
+            print("  Running static analysis and RAG retrieval concurrently...")
+            # Pass the owner, repo, and PR number to the fixed function (head sha: no fetch if the mirror has it)
+            static_future = pool.submit(_timed, timings, "static_analysis",
+                                        run_static_analysis, diff_text, owner, repo, pr_number, head_sha)
+            retrieval_future = pool.submit(_timed, timings, "retrieval", retrieve_for_diff, diff_text)
+            hunk_items = _timed(timings, "diff_preprocess", diff_items, diff_text)
+
+            # 2. Follow-up retrieval on the static findings, once they are in
+            static_output = static_future.result()
+            followup_future = pool.submit(_timed, timings, "static_retrieval", self._static_followup, static_output)
+            retrieved_docs = retrieval_future.result()
+            followup_docs = followup_future.result()
+
+        seen = {doc_key(doc) for doc in retrieved_docs}
+        extra = [doc for doc in followup_docs if doc_key(doc) not in seen][:STATIC_FOLLOWUP_DOCS]
+        context_docs = [doc.page_content for doc in retrieved_docs + extra]
+        retrieved_context = "\n---\n".join(context_docs)
+
+        # 3. Pack inputs into the token budget (diff hunks first, then findings, then context)
+        packed, usage = pack_sections([
+            section("diff", hunk_items, 0.5),
+            section("static", text_items(static_output), 0.2, "\n\n"),
+            section("context", context_docs, 0.3, "\n---\n"),
+        ], REVIEW_TOKEN_BUDGET)
+        print(f"  Prompt budget: {format_usage(usage, REVIEW_TOKEN_BUDGET)}")
 
         # 4. Invoke LLM with all context
         print("  Generating review...")
-        review_text = chain.invoke({
-            "diff": truncated_diff,
-            "static": truncated_static,
-            "context": truncated_context
-        })
+        inputs = {
+            "diff": packed["diff"],
+            "static": packed["static"],
+            "context": packed["context"]
+        }
+        if comment is None:
+            review_text = _timed(timings, "llm", chain.invoke, inputs)
+        else:
+            review_text = _timed(timings, "llm", self._stream_review, selected_prompt, inputs, comment, timings)
         elapsed = time.time() - start
+        timings["generate_total"] = round(elapsed, 3)
+        print("  Stage timings: " + ", ".join(f"{stage}={secs:.2f}s" for stage, secs in timings.items()))
         
         # Return all generated artifacts
-        return review_text, elapsed, static_output, retrieved_context
+        return review_text, elapsed, static_output, retrieved_context, timings
+
+    def _stream_review(self, selected_prompt, inputs, comment, timings):
+        """Streams the review into `comment`; records when the first chunk arrived."""
+        start = time.time()
+        parts = []
+        for chunk in stream_for(selected_prompt, self.prompts[selected_prompt].invoke(inputs)):
+            if not parts:
+                timings["llm_first_chunk"] = round(time.time() - start, 3)
+            parts.append(chunk)
+            comment.append(chunk)
+        return "".join(parts)
 
     #  MODIFIED: evaluate_review now accepts static/context ---
-    def evaluate_review(self, diff_text, review_text, static_output, context):
-        """Evaluate the generated review"""
+    def evaluate_review(self, diff_text, review_text, static_output, context, features=None, prompt_name=None):
+        """
+        Evaluate the generated review. The local scorer answers when it is
+        confident; otherwise (or for an audit sample) the LLM meta-evaluator runs.
+        """
         heur = heuristic_metrics(review_text)
-        
+        heur_score = heuristic_score(heur)
+
+        route = self.evaluator.route(features, heur, prompt_name, static_output)
+        if not route["use_llm"]:
+            print(f"  Local evaluation: {route['prediction']:.2f} (±{route['std']:.2f}), LLM judge skipped")
+            meta_parsed = {
+                "evaluator": "local",
+                "predicted_meta_score": round(route["prediction"], 3),
+                "std": round(route["std"], 3),
+            }
+            return round(0.7 * route["prediction"] + 0.3 * heur_score, 2), heur, meta_parsed
+
         # Pass all context to the meta-evaluator
+        print(f"  LLM evaluation ({route['reason']})")
         meta_parsed, meta_raw = meta_evaluate(diff_text, review_text, static_output, context)
         
-        if isinstance(meta_parsed, dict) and "error" not in meta_parsed:
-            weights = {"clarity": 0.18, "usefulness": 0.28, "depth": 0.2, 
-                       "actionability": 0.24, "positivity": 0.1}
-            meta_score = sum(meta_parsed.get(k, 5) * w for k, w in weights.items())
-            
-            sections = heur.get("sections_presence", {})
-            sec_frac = sum(sections.values()) / max(1, len(sections))
-            bullets_score = min(heur.get("bullet_points", 0), 10) / 10.0
-            words = heur.get("length_words", 0)
-            length_score = 1.0 if 80 <= words <= 800 else max(0.0, min(words/80, 1.0 - (words-800)/2000))
-            
-            heur_score = (0.45 * sec_frac + 0.25 * bullets_score + 0.25 * length_score + 
-                          0.05 * heur.get("mentions_bug", False) + 0.05 * heur.get("mentions_suggest", False)) * 10
-            
-            overall_score = round(0.7 * meta_score + 0.3 * heur_score, 2)
+        if is_llm_evaluation(meta_parsed):
+            meta_parsed["evaluator"] = route["reason"]
+            if route["reason"] == "llm_audit":
+                meta_parsed["local_prediction"] = round(route["prediction"], 3)
+            overall_score = round(0.7 * weighted_meta_score(meta_parsed) + 0.3 * heur_score, 2)
         else:
             overall_score = 5.0 # Default score if meta-eval fails
         
@@ -237,11 +351,13 @@ class IterativePromptSelector:
                 "prompt_history": self.prompt_history,
                 "score_history": self.score_history,
                 "sample_count": self.sample_count,
+                "feature_schema": FEATURE_SCHEMA_VERSION,
                 "is_scaler_fitted": self.is_scaler_fitted,
                 "model_coef": self.model.coef_.tolist() if hasattr(self.model, 'coef_') else None,
                 "model_intercept": self.model.intercept_.tolist() if hasattr(self.model, 'intercept_') else None,
                 "scaler_mean": self.scaler.mean_.tolist() if self.is_scaler_fitted else None,
                 "scaler_scale": self.scaler.scale_.tolist() if self.is_scaler_fitted else None,
+                "bandit": self.bandit.to_state() if self.bandit is not None else None,
                 "timestamp": datetime.now().isoformat()
             }
             
@@ -255,17 +371,31 @@ class IterativePromptSelector:
             print(f"Error saving state: {e}")
             return False
     
+    def _restore_bandit(self, bandit_state=None):
+        """Loads the saved arms; without usable ones, replays whatever history is in memory."""
+        if self.bandit is None or self.bandit.from_state(bandit_state):
+            return
+        replayed = self.bandit.replay(self.feature_history, self.prompt_history, self.score_history)
+        print(f"Bandit rebuilt from {replayed} stored samples")
+
     def load_state(self, filename="selector_state.json"):
         """FIXED: Load state and COMBINE with current data instead of overwriting"""
         try:
             if not os.path.exists(filename):
                 print("No saved state file found.")
+                self._restore_bandit()
                 return False
                 
             with open(filename, 'r', encoding='utf-8') as f:
                 saved_state = json.load(f)
             
             print(f"Found saved state with {saved_state.get('sample_count', 0)} samples")
+            if saved_state.get("feature_schema", 1) != FEATURE_SCHEMA_VERSION:
+                # The diffs are not stored, so old vectors cannot be re-extracted; start over instead
+                print(f"Saved state uses feature schema {saved_state.get('feature_schema', 1)}, "
+                      f"current is {FEATURE_SCHEMA_VERSION}: dropping its history and model weights.")
+                self._restore_bandit()
+                return False
             
             saved_features = [np.array(f) for f in saved_state.get("feature_history", [])]
             saved_prompts = saved_state.get("prompt_history", [])
@@ -282,6 +412,9 @@ class IterativePromptSelector:
                     self.sample_count += 1
             
             print(f"Combined state: now have {self.sample_count} total samples")
+
+            # First run with the bandit (or its state is unusable): the merged history is replayed
+            self._restore_bandit(saved_state.get("bandit"))
             
             if saved_state.get("is_scaler_fitted", False):
                 if "scaler_mean" in saved_state and saved_state["scaler_mean"]:
@@ -306,78 +439,170 @@ class IterativePromptSelector:
             
         except Exception as e:
             print(f"Error loading state: {e}. Continuing with current data.")
+            self._restore_bandit()
             return False
 
     #  MODIFIED: process_pr now handles the full RAG/static pipeline ---
     def process_pr(self, pr_number, owner=OWNER, repo=REPO, token=GITHUB_TOKEN, post_to_github: bool = True):
         """Process a single PR using iterative prompt selection"""
+        outcome = self.review_pr(pr_number, owner, repo, token, stream=post_to_github and REVIEW_STREAMING)
+        return self.commit_review(outcome, owner, repo, token, post_to_github)
+
+    def review_pr(self, pr_number, owner=OWNER, repo=REPO, token=GITHUB_TOKEN, stream: bool = False):
+        """
+        Read-only half of process_pr: fetch, select, generate, evaluate.
+        Safe to run for several PRs at once; nothing here mutates the model.
+        With `stream`, a placeholder comment goes up first and fills in as the review is written;
+        commit_review then writes the scored final version into it.
+        """
         print(f"Processing PR #{pr_number}...")
+        start = time.time()
+        timings = {}
         
-        pr_meta = fetch_pr_metadata(owner, repo, pr_number, token)
+        pr_meta = _timed(timings, "fetch_metadata", fetch_pr_metadata, owner, repo, pr_number, token)
 
         # If metadata not found → TRUE 404 → EXIT IMMEDIATELY
         if pr_meta is None or ("message" in pr_meta and pr_meta["message"] == "Not Found"):
             print(f"⚠️ Skipping PR #{pr_number}: PR not found or inaccessible.\n")
+            return {"pr_number": pr_number, "skipped": True, "stage_timings": timings}
+
+        comment = None
+        if stream:
+            comment = StreamingComment(owner, repo, pr_number, token)
+            if comment.start():
+                timings["first_feedback"] = round(time.time() - start, 3)
+            else:
+                comment = None
+        try:
+            outcome = self._review(pr_number, pr_meta, owner, repo, token, timings, comment)
+        except Exception as e:
+            if comment is not None:
+                comment.fail(e)
+            raise
+        outcome["comment"] = comment
+        return outcome
+
+    def _review(self, pr_number, pr_meta, owner, repo, token, timings, comment):
+        """Body of review_pr once the PR is known to exist."""
+        # Local merge-base diff from the clone when there is one (no API call, no size limit)
+        diff_text = _timed(timings, "fetch_diff", get_pr_diff, owner, repo, pr_number, token, pr_meta)
+        
+        features = self.extract_pr_features(diff_text)
+        features_vector = self.features_to_vector(features)
+        print(f"PR #{pr_number} features: {features}")
+        
+        with self._model_lock:
+            selected_prompt = self.select_best_prompt(features_vector)
+        print(f"PR #{pr_number} selected prompt: {selected_prompt}")
+        if comment is not None:
+            comment.set_prompt(selected_prompt)
+        
+        # Generate review (now returns 5 items, incl. per-stage timings)
+        review_text, elapsed, static_output, context, stage_timings = self.generate_review(
+            diff_text, selected_prompt, owner, repo, pr_number, comment,
+            head_sha=(pr_meta.get("head") or {}).get("sha"),
+        )
+        timings.update(stage_timings)
+        print(f"PR #{pr_number} review generated in {elapsed:.2f}s")
+        
+        # Evaluate review (score, heuristics, parsed meta-evaluation)
+        score, heur, meta_parsed = _timed(timings, "evaluate", self.evaluate_review,
+                                          diff_text, review_text, static_output, context,
+                                          features, selected_prompt)
+        print(f"PR #{pr_number} review score: {score}/10")
+
+        return {
+            "pr_number": pr_number,
+            "skipped": False,
+            "features": features,
+            "features_vector": features_vector,
+            "selected_prompt": selected_prompt,
+            "review": review_text,
+            "score": score,
+            "heuristics": heur,
+            "meta_evaluation": meta_parsed,
+            "static_output": static_output,
+            "context": context,
+            "generation_time": elapsed,
+            "stage_timings": timings,
+        }
+
+    def commit_review(self, outcome, owner=OWNER, repo=REPO, token=GITHUB_TOKEN, post_to_github: bool = True):
+        """
+        Writing half of process_pr: model update, result files, state file, GitHub post.
+        In batch mode only the single writer thread calls this, so updates stay ordered.
+        """
+        pr_number = outcome["pr_number"]
+        if outcome["skipped"]:
             return {
                 "pr_number": pr_number,
                 "selected_prompt": None,
                 "review": None,
                 "score": None,
                 "features": None,
-                "generation_time": 0
+                "generation_time": 0,
+                "stage_timings": outcome["stage_timings"]
             }
-        
-        diff_text = fetch_pr_diff(owner, repo, pr_number, token)
-        
-        features = self.extract_pr_features(diff_text)
-        features_vector = self.features_to_vector(features)
-        print(f"PR features: {features}")
-        
-        selected_prompt = self.select_best_prompt(features_vector)
-        print(f"Selected prompt: {selected_prompt}")
-        
-        # Generate review (now returns 4 items)
-        review_text, elapsed, static_output, context = self.generate_review(diff_text, selected_prompt)
-        print(f"Review generated in {elapsed:.2f}s")
-        
-        # Evaluate review (now takes 4 items)
-        score, heur, meta_parsed = self.evaluate_review(diff_text, review_text, static_output, context)
-        print(f"Review score: {score}/10")
-        
-        self.update_model(features_vector, selected_prompt, score)
-        
-        # Save results (now takes 8 items)
-        self.save_results(pr_number, features, selected_prompt, review_text, score, heur, meta_parsed, static_output, context)
-        
-        if self.sample_count % 3 == 0:
-            self.save_state()
-        if post_to_github:
+
+        selected_prompt, score, review_text = outcome["selected_prompt"], outcome["score"], outcome["review"]
+        comment = outcome.get("comment")
+        try:
+            meta_parsed = outcome["meta_evaluation"]
+            if isinstance(meta_parsed, dict) and meta_parsed.get("evaluator") == "local":
+                # A local score is the evaluator's own estimate (prompt prior included), not evidence:
+                # training on it would let the bandit grow confident from its own predictions
+                print(f"PR #{pr_number}: score came from the local evaluator, selector not updated")
+            else:
+                with self._model_lock:
+                    self.update_model(outcome["features_vector"], selected_prompt, score)
+            # Every LLM judgement also trains the local evaluator (audits measure its error)
+            self.evaluator.learn(outcome["features"], outcome["heuristics"], selected_prompt, outcome["static_output"],
+                                 meta_parsed, meta_parsed.get("local_prediction") if isinstance(meta_parsed, dict) else None)
+            
+            # Save results (review, scores, static output, context and stage timings)
+            self.save_results(pr_number, outcome["features"], selected_prompt, review_text, score,
+                              outcome["heuristics"], outcome["meta_evaluation"],
+                              outcome["static_output"], outcome["context"], outcome["stage_timings"])
+            
+            if self.sample_count % 3 == 0:
+                self.save_state()
+        except Exception as e:
+            # The streamed placeholder must not keep saying "in progress"
+            if comment is not None:
+                comment.fail(e)
+            raise
+        # A streamed comment already exists, so it gets its final version even when posting is off
+        if post_to_github or comment is not None:
             print(f"Posting review to GitHub PR #{pr_number}...")
             try:
                 # Format a nice message for GitHub
-                github_body = (
-                    f"🤖 **AI-Powered Review** 🤖\n\n"
-                    f"*(Prompt: `{selected_prompt}` | Score: **{score}/10**)*\n\n"
-                    f"---\n\n"
-                    f"{review_text}"
-                )
+                github_body = review_comment_body(selected_prompt, review_text, score)
                 
-                # Call the function from reviewer.py
-                post_review_comment(owner, repo, pr_number, token, github_body)
-                print("✅ Successfully posted comment to GitHub.")
+                if comment is not None:
+                    # Streaming mode: the comment is already there, write the scored final version
+                    comment.finish(github_body)
+                    print(f"✅ Successfully updated streamed comment ({comment.edits} in-progress edits).")
+                else:
+                    # Call the function from reviewer.py
+                    post_review_comment(owner, repo, pr_number, token, github_body)
+                    print("✅ Successfully posted comment to GitHub.")
             except Exception as e:
                 print(f"❌ FAILED to post comment to GitHub: {e}")
+                if comment is not None:
+                    comment.fail(e)
         return {
             "pr_number": pr_number,
             "selected_prompt": selected_prompt,
             "review": review_text,
             "score": score,
-            "features": features,
-            "generation_time": elapsed
+            "features": outcome["features"],
+            "generation_time": outcome["generation_time"],
+            "stage_timings": outcome["stage_timings"]
         }
     
     #  MODIFIED: save_results now saves the static/context ---
-    def save_results(self, pr_number, features, prompt, review, score, heur, meta_parsed, static_output, context):
+    def save_results(self, pr_number, features, prompt, review, score, heur, meta_parsed, static_output, context,
+                     stage_timings=None):
         """Save all results, including static analysis and RAG context"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
@@ -388,14 +613,18 @@ class IterativePromptSelector:
             "selected_prompt": prompt,
             "review_score": score,
             "features": features,
+            "feature_schema": FEATURE_SCHEMA_VERSION,
             "heuristics": heur,
             "meta_evaluation": meta_parsed,
             "training_samples": self.sample_count,
             "static_output": static_output, # NEW
-            "retrieved_context": context    # NEW
+            "retrieved_context": context,   # NEW
+            "stage_timings": stage_timings or {}
         }
         
-        json_filename = f"iterative_results_pr{pr_number}_{timestamp}.json"
+        # The local evaluator trains on these files, so they go where CI persists them
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        json_filename = os.path.join(RESULTS_DIR, f"iterative_results_pr{pr_number}_{timestamp}.json")
         save_text_to_file(json_filename, json.dumps(result, indent=2))
         
         # Save review text as a markdown file
@@ -434,20 +663,45 @@ class IterativePromptSelector:
             "average_score": np.mean(self.score_history) if self.score_history else 0,
             "prompt_distribution": prompt_distribution,
             "unique_prompts_used": len(set(self.prompt_history)),
-            "is_scaler_fitted": self.is_scaler_fitted
+            "is_scaler_fitted": self.is_scaler_fitted,
+            "selector_policy": self.bandit.policy if self.bandit is not None else "sgd"
         }
 
 
-def run_iterative_selector(pr_numbers, load_previous=True, save_frequency=2,post_to_github: bool = True):
-    """Run the iterative prompt selector on multiple PRs"""
-    selector = IterativePromptSelector()
-    
-    if load_previous:
-        print("Attempting to load previous state...")
-        selector.load_state()
-    
+def _percentile(values, q):
+    return round(float(np.percentile(values, q)), 3) if values else 0.0
+
+
+def summarize_throughput(results, wall_time, workers, filename="batch_summary.json", evaluation=None):
+    """PRs/min plus per-stage p50/p95 over the reviewed PRs; printed and written to `filename`."""
+    reviewed = [r for r in results if r.get("review") is not None]
+    stages = {}
+    for result in results:
+        for stage, secs in (result.get("stage_timings") or {}).items():
+            stages.setdefault(stage, []).append(secs)
+
+    summary = {
+        "workers": workers,
+        "prs_total": len(results),
+        "prs_reviewed": len(reviewed),
+        "wall_time_sec": round(wall_time, 2),
+        "prs_per_min": round(len(reviewed) / wall_time * 60, 2) if wall_time > 0 else 0.0,
+        "stages": {
+            stage: {"p50": _percentile(values, 50), "p95": _percentile(values, 95), "count": len(values)}
+            for stage, values in stages.items()
+        },
+        "evaluation": evaluation or {},
+    }
+    print(f"\nThroughput: {summary['prs_reviewed']}/{summary['prs_total']} PRs in {summary['wall_time_sec']}s "
+          f"({summary['prs_per_min']} PRs/min, {workers} workers)")
+    for stage, pct in summary["stages"].items():
+        print(f"  {stage:<18} p50={pct['p50']:.2f}s  p95={pct['p95']:.2f}s  (n={pct['count']})")
+    save_text_to_file(filename, json.dumps(summary, indent=2))
+    return summary
+
+
+def _run_sequential(selector, pr_numbers, save_frequency, post_to_github):
     results = []
-    
     for i, pr_number in enumerate(pr_numbers):
         try:
             print(f"\n{'='*50}")
@@ -471,6 +725,58 @@ def run_iterative_selector(pr_numbers, load_previous=True, save_frequency=2,post
             import traceback
             traceback.print_exc()
             continue
+    return results
+
+
+def _run_batch(selector, pr_numbers, save_frequency, post_to_github, workers):
+    """
+    Reviews up to `workers` PRs at once. Workers only run the read-only
+    review_pr half; this (calling) thread is the single writer that applies
+    model updates, result files, state saves and GitHub posts as reviews finish.
+    A failing PR is logged and skipped without affecting the others.
+    """
+    results = []
+    print(f"\n🚀 Batch mode: {len(pr_numbers)} PRs with {workers} workers")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(selector.review_pr, pr_number, stream=post_to_github and REVIEW_STREAMING): pr_number
+                   for pr_number in pr_numbers}
+        for done, future in enumerate(as_completed(futures), start=1):
+            pr_number = futures[future]
+            try:
+                result = selector.commit_review(future.result(), post_to_github=post_to_github)
+                results.append(result)
+                print(f"[{done}/{len(pr_numbers)}] PR #{pr_number}: {result['selected_prompt']} -> Score: {result['score']}")
+            except Exception as e:
+                print(f"Failed to process PR #{pr_number}: {e}")
+                import traceback
+                traceback.print_exc()
+                continue
+
+            if done % save_frequency == 0:
+                print("Periodic state save...")
+                selector.save_state()
+    return results
+
+
+def run_iterative_selector(pr_numbers, load_previous=True, save_frequency=2, post_to_github: bool = True,
+                           workers: int = REVIEW_WORKERS):
+    """
+    Run the iterative prompt selector on multiple PRs.
+    `workers` > 1 switches to the concurrent batch mode (see _run_batch).
+    """
+    selector = IterativePromptSelector()
+    
+    if load_previous:
+        print("Attempting to load previous state...")
+        selector.load_state()
+    
+    start = time.time()
+    if workers > 1 and len(pr_numbers) > 1:
+        results = _run_batch(selector, pr_numbers, save_frequency, post_to_github, workers)
+    else:
+        workers = 1
+        results = _run_sequential(selector, pr_numbers, save_frequency, post_to_github)
+    wall_time = time.time() - start
     
     print("\nFinal state save...")
     selector.save_state()
@@ -484,13 +790,32 @@ def run_iterative_selector(pr_numbers, load_previous=True, save_frequency=2,post
     
     final_stats = selector.get_stats()
     print(f"\nFinal statistics: {final_stats}")
+    evaluation = selector.evaluator.stats()
+    print(f"Evaluations: {evaluation['local']}/{evaluation['evaluations']} served locally "
+          f"(local share {evaluation['local_share']:.0%}, audit MAE {evaluation['audit_mae']})")
+    summarize_throughput(results, wall_time, workers, evaluation=evaluation)
+
+    query_cache = get_query_cache() if QUERY_CACHE_ENABLED else None
+    if query_cache is not None:
+        print(f"Retrieval query cache: {query_cache.stats()}")
+        query_cache.export_stats()
+    if get_llm_cache() is not None:
+        print(f"LLM response cache: {get_llm_cache().stats()}")
+    latency = get_latency_tracker().export()
+    if latency:
+        print("LLM call latency (per prompt):")
+        print("\n".join(format_latency(latency)))
     
     return results, selector
 
 
 if __name__ == "__main__":
+    if PR_NUMBERS:
+        # Backfill: PR_NUMBERS=12,15,18 with REVIEW_WORKERS=N reviews them N at a time
+        print(f"🚀 Starting agent to process {len(PR_NUMBERS)} PRs from .env file...")
+        results, selector = run_iterative_selector(PR_NUMBERS)
     # Check if the PR_NUMBER from config (via .env) is valid
-    if PR_NUMBER <= 0:
+    elif PR_NUMBER <= 0:
         print("Error: PR_NUMBER is not set or is invalid in your .env file.")
         print("Please set PR_NUMBER in .env to the PR you want to review.")
     else:
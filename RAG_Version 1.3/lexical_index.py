@@ -0,0 +1,234 @@
+# lexical_index.py
+#
+# Responsible for:
+#  - A BM25 inverted index over the same chunks that go into the vector index
+#      * code-aware tokens: whole identifiers plus their camelCase / snake_case parts
+#      * persisted in one SQLite file (term frequencies and chunk payloads zlib-compressed)
+#      * postings rebuilt in memory on first query, so lookups never leave the process
+#  - Pinecone-style upsert / delete / list so ingest can write to it like an index
+#  - Reciprocal-rank fusion and a hybrid (lexical + vector) retriever
+
+import hashlib
+import heapq
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from config import LEXICAL_INDEX_PATH
+
+TEXT_KEY = "text"
+LIST_PAGE_SIZE = 100
+
+# BM25 parameters (Robertson defaults) and the usual RRF constant
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+_CAMEL_PART = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+_STOPWORDS = {
+    "the", "and", "for", "if", "in", "is", "it", "of", "or", "to", "a", "an", "as", "at", "be",
+    "by", "on", "self", "this", "return", "def", "var", "let", "const", "import", "from",
+}
+
+ScoredDocs = List[Tuple[Document, float]]
+
+
+def tokenize(text: str) -> List[str]:
+    """`getUserName` -> getusername, get, user, name; `MAX_FILE_BYTES` -> max_file_bytes, max, file, bytes."""
+    tokens = []
+    for ident in _IDENTIFIER.findall(text):
+        lowered = ident.lower()
+        if len(lowered) > 1 and lowered not in _STOPWORDS:
+            tokens.append(lowered)
+        parts = [p.lower() for piece in ident.split("_") for p in _CAMEL_PART.findall(piece)]
+        if len(parts) > 1:
+            tokens.extend(p for p in parts if len(p) > 1 and p not in _STOPWORDS)
+    return tokens
+
+
+def _pack(obj) -> bytes:
+    return zlib.compress(json.dumps(obj, separators=(",", ":")).encode("utf-8"))
+
+
+def _unpack(blob: bytes):
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+class LexicalIndex:
+    """
+    BM25 over chunk text. Writes go straight to SQLite (committed by
+    `persist()`); the in-memory postings are rebuilt lazily after a write.
+    `identity` ties the file to one vector index + repo: a mismatch empties it
+    (writers pass it; readers leave it empty and compare `stored_identity()`).
+    """
+
+    def __init__(self, path: str = LEXICAL_INDEX_PATH, identity: str = ""):
+        self.path = path
+        self._lock = threading.Lock()
+        self._postings: Optional[Dict[str, List[Tuple[str, int]]]] = None
+        self._lengths: Dict[str, int] = {}
+        self._avg_length = 1.0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " id TEXT PRIMARY KEY, length INTEGER NOT NULL, terms BLOB NOT NULL, payload BLOB NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'identity'").fetchone()
+        if identity and (row is None or row[0] != identity):
+            if row is not None:
+                print(f"⚠ Lexical index belonged to '{row[0]}', clearing it for '{identity}'.")
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('identity', ?)", (identity,))
+        self._conn.commit()
+
+    def stored_identity(self) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'identity'").fetchone()
+        return row[0] if row else None
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    # ------------------------------
+    # Pinecone-style write API (used by ingest)
+    # ------------------------------
+    def upsert(self, vectors: List[dict], **kwargs):
+        """Indexes records of the form {"id", "metadata": {"text", ...}}; "values" are ignored."""
+        rows = []
+        for record in vectors:
+            metadata = dict(record.get("metadata") or {})
+            text = metadata.pop(TEXT_KEY, "")
+            counts = Counter(tokenize(text))
+            rows.append((record["id"], sum(counts.values()), _pack(counts), _pack([text, metadata])))
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?)", rows)
+            self._postings = None
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs):
+        with self._lock:
+            self._conn.executemany("DELETE FROM chunks WHERE id = ?", [(vid,) for vid in ids or []])
+            self._postings = None
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks")
+            self._postings = None
+
+    def list(self, prefix: Optional[str] = None, **kwargs) -> Iterator[List[str]]:
+        """Yields pages of chunk IDs starting with `prefix`."""
+        ids = [vid for (vid,) in self._conn.execute("SELECT id FROM chunks ORDER BY id")
+               if not prefix or vid.startswith(prefix)]
+        for start in range(0, len(ids), LIST_PAGE_SIZE):
+            yield ids[start:start + LIST_PAGE_SIZE]
+
+    def persist(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+
+    # ------------------------------
+    # Search
+    # ------------------------------
+    def _load_postings(self):
+        postings: Dict[str, List[Tuple[str, int]]] = {}
+        lengths: Dict[str, int] = {}
+        for vid, length, terms in self._conn.execute("SELECT id, length, terms FROM chunks"):
+            lengths[vid] = length
+            for term, tf in _unpack(terms).items():
+                postings.setdefault(term, []).append((vid, tf))
+        self._lengths = lengths
+        self._avg_length = (sum(lengths.values()) / len(lengths) if lengths else 0.0) or 1.0
+        self._postings = postings
+
+    def search_ids(self, query: str, k: int = 4) -> List[Tuple[str, float]]:
+        """Top-k (chunk_id, bm25_score) for the distinct terms of `query`."""
+        with self._lock:
+            if self._postings is None:
+                self._load_postings()
+            postings, lengths, avg_length = self._postings, self._lengths, self._avg_length
+
+        n = len(lengths)
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            plist = postings.get(term)
+            if not plist:
+                continue
+            idf = math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            for vid, tf in plist:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[vid] / avg_length)
+                scores[vid] = scores.get(vid, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def get_documents(self, ids: Sequence[str]) -> Dict[str, Document]:
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, payload FROM chunks WHERE id IN ({placeholders})", list(ids)
+            ).fetchall()
+        docs = {}
+        for vid, payload in rows:
+            text, metadata = _unpack(payload)
+            docs[vid] = Document(id=vid, page_content=text, metadata=metadata)
+        return docs
+
+    def search(self, query: str, k: int = 4) -> ScoredDocs:
+        hits = self.search_ids(query, k)
+        docs = self.get_documents([vid for vid, _ in hits])
+        return [(docs[vid], score) for vid, score in hits if vid in docs]
+
+
+# ------------------------------
+# Fusion
+# ------------------------------
+def doc_key(doc: Document) -> str:
+    """The chunk ID stored at ingest; vector stores do not always hand back `Document.id`."""
+    return doc.metadata.get("chunk_id") or doc.id or hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+
+
+def reciprocal_rank_fusion(ranked_lists: Iterable[ScoredDocs], rrf_k: int = RRF_K) -> ScoredDocs:
+    """Fuses ranked lists by sum of 1 / (rrf_k + rank); raw scores are ignored, so BM25 and cosine mix safely."""
+    fused: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    for results in ranked_lists:
+        for rank, (doc, _) in enumerate(results, start=1):
+            key = doc_key(doc)
+            docs.setdefault(key, doc)
+            fused[key] = fused.get(key, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(((docs[key], score) for key, score in fused.items()), key=lambda ds: ds[1], reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Runs the vector retriever and the BM25 index side by side and fuses
+    their rankings with RRF. `vector_search` is a callable (query, k) -> [(Document, score)].
+    """
+
+    vector_search: Any
+    lexical: Any
+    k: int = 4
+    candidates: int = 10
+
+    def search(self, query: str, k: Optional[int] = None) -> ScoredDocs:
+        k = k or self.k
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            vector = pool.submit(self.vector_search, query, self.candidates)
+            lexical = pool.submit(self.lexical.search, query, self.candidates)
+            fused = reciprocal_rank_fusion([vector.result(), lexical.result()])
+        return fused[:k]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return [doc for doc, _ in self.search(query)]
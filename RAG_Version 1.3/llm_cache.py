@@ -0,0 +1,188 @@
+# llm_cache.py
+#
+# Responsible for:
+#  - Persisting LLM responses in a local SQLite file, so identical calls are answered instantly
+#  - Keying them by (model name, temperature, prompt template name, sha256 of the rendered messages)
+#  - Size-bounded (least-recently-used) eviction, hit/miss counters and a bypass flag
+#  - A streaming view of the same cache (a hit is replayed as one chunk)
+#  - An optional per-caller check, so answers the caller cannot parse are neither stored nor replayed
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Iterator, List, Optional, Tuple
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.prompt_values import PromptValue
+from langchain_core.runnables import RunnableLambda
+from config import LLM_CACHE_ENABLED, LLM_CACHE_BYPASS, LLM_CACHE_PATH, LLM_CACHE_MAX_ENTRIES
+
+
+def _messages(prompt_input) -> List[Tuple[str, str]]:
+    """(role, content) pairs of whatever a prompt template handed to the LLM."""
+    if isinstance(prompt_input, PromptValue):
+        prompt_input = prompt_input.to_messages()
+    if isinstance(prompt_input, str):
+        return [("human", prompt_input)]
+    return [(m.type, m.content) if isinstance(m, BaseMessage) else (str(m[0]), str(m[1])) for m in prompt_input]
+
+
+def _model_id(llm) -> Tuple[str, object]:
+    """(model name, temperature) as used in the cache key."""
+    model = getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+    return model, getattr(llm, "temperature", None)
+
+
+def _text(message) -> str:
+    return message.content if isinstance(message, BaseMessage) else str(message)
+
+
+class LLMResponseCache:
+    """Response text by call key; only the text is kept (that is all the parsers downstream read)."""
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " prompt_name TEXT NOT NULL,"
+            " response TEXT NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON responses(last_used)")
+        self._conn.commit()
+
+    # ------------------------------
+    # Keys and storage
+    # ------------------------------
+    @staticmethod
+    def key(model: str, temperature, prompt_name: str, messages: List[Tuple[str, str]]) -> str:
+        digest = hashlib.sha256(json.dumps(messages, ensure_ascii=False).encode("utf-8")).hexdigest()
+        return f"{model}:{temperature}:{prompt_name}:{digest}"
+
+    def get(self, key: str, valid: Optional[Callable[[str], bool]] = None) -> Optional[str]:
+        """The stored text; an entry `valid` rejects is dropped and counts as a miss."""
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and valid is not None and not valid(row[0]):
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, prompt_name: str, response: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                               (key, prompt_name, response, time.time()))
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Drops the least recently used rows once the cache grows past max_entries."""
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY last_used ASC LIMIT ?)",
+                (overflow,),
+            )
+
+    # ------------------------------
+    # Stats
+    # ------------------------------
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries,
+        }
+
+
+def cached_llm(llm, prompt_name: str, cache: Optional[LLMResponseCache], bypass: bool = LLM_CACHE_BYPASS,
+               valid: Optional[Callable[[str], bool]] = None):
+    """
+    Runnable that sits where `llm` sat in a `prompt | llm | parser` chain.
+    A hit returns the stored text as an AIMessage without calling the model;
+    with `bypass` the model is always called and the fresh answer replaces the entry.
+    `valid(text)` (optional) gates storing and replay: an answer the caller cannot use is re-asked.
+    """
+    if cache is None:
+        return llm
+    model, temperature = _model_id(llm)
+
+    def invoke(prompt_input):
+        key = cache.key(model, temperature, prompt_name, _messages(prompt_input))
+        if not bypass:
+            cached = cache.get(key, valid)
+            if cached is not None:
+                return AIMessage(content=cached)
+        message = llm.invoke(prompt_input)
+        text = _text(message)
+        if valid is None or valid(text):
+            cache.put(key, prompt_name, text)
+        return message
+
+    return RunnableLambda(invoke, name=f"cached_llm[{prompt_name}]")
+
+
+def cached_stream(llm, prompt_name: str, prompt_input, cache: Optional[LLMResponseCache],
+                  bypass: bool = LLM_CACHE_BYPASS, valid: Optional[Callable[[str], bool]] = None) -> Iterator[str]:
+    """
+    Streaming counterpart of cached_llm: yields text chunks from `llm.stream`.
+    A hit yields the stored text as a single chunk; a completed stream is stored.
+    """
+    if cache is None:
+        for chunk in llm.stream(prompt_input):
+            yield _text(chunk)
+        return
+    model, temperature = _model_id(llm)
+    key = cache.key(model, temperature, prompt_name, _messages(prompt_input))
+    if not bypass:
+        cached = cache.get(key, valid)
+        if cached is not None:
+            yield cached
+            return
+    parts = []
+    for chunk in llm.stream(prompt_input):
+        parts.append(_text(chunk))
+        yield parts[-1]
+    text = "".join(parts)
+    if valid is None or valid(text):
+        cache.put(key, prompt_name, text)
+
+
+# --- Cached Globals ---
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """Shared on-disk response cache, or None when LLM_CACHE_ENABLED is off."""
+    global _cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMResponseCache()
+    return _cache
@@ -0,0 +1,298 @@
+# llm_guard.py
+#
+# Responsible for:
+#  - A call policy around the shared ChatGroq `llm` (reviewer.py), per prompt template:
+#      * a per-request timeout and a total deadline per call (retries and backoff included)
+#      * retrying transient errors (timeouts, 429, 5xx, dropped connections) with full-jitter backoff
+#      * optional hedging: once a request outlives the prompt's observed p95 latency,
+#        a duplicate is sent and whichever answers first is used
+#      * a streaming variant (no hedging; retries only until the first chunk has arrived)
+#  - Latency histograms per prompt name (printed by the batch run, exported to LLM_LATENCY_PATH)
+
+import json
+import queue
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional
+import numpy as np
+from langchain_core.runnables import Runnable
+from config import (
+    LLM_CALL_TIMEOUT, LLM_CALL_DEADLINE, LLM_MAX_RETRIES, LLM_BACKOFF_BASE, LLM_BACKOFF_MAX,
+    LLM_HEDGE_ENABLED, LLM_HEDGE_MIN_SAMPLES, LLM_LATENCY_PATH,
+)
+
+# Histogram bucket upper bounds, in seconds (plus a final +Inf bucket)
+BUCKETS = [0.5, 1, 2, 4, 8, 16, 32, 64, 128]
+# Recent latencies kept per prompt for the percentiles (and the hedge threshold)
+WINDOW = 200
+# Requests in flight across all threads (primaries, hedges and abandoned timed-out requests)
+MAX_IN_FLIGHT = 32
+
+_RETRY_STATUS = {408, 409, 429}
+_RETRY_ERRORS = {"APITimeoutError", "APIConnectionError", "RateLimitError", "InternalServerError",
+                 "ConnectionError", "ConnectTimeout", "ReadTimeout", "Timeout"}
+
+
+class LLMDeadlineExceeded(TimeoutError):
+    """Raised when an LLM call (retries included) does not answer within its deadline."""
+
+
+def is_transient(error: Exception) -> bool:
+    """Timeouts, rate limits, server errors and connection drops are worth retrying; bad requests are not."""
+    if isinstance(error, TimeoutError):
+        return True
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status in _RETRY_STATUS or status >= 500
+    return type(error).__name__ in _RETRY_ERRORS
+
+
+# ------------------------------
+# Latency tracking
+# ------------------------------
+class LatencyTracker:
+    """
+    Per prompt name: a bucketed histogram of call latencies (what the caller waited,
+    retries included), a window of recent successful request latencies (hedge threshold),
+    and counters for retries, timeouts and hedges.
+    """
+
+    def __init__(self, hedge_min_samples: int = LLM_HEDGE_MIN_SAMPLES):
+        self.hedge_min_samples = hedge_min_samples
+        self._lock = threading.Lock()
+        self._prompts: Dict[str, dict] = {}
+
+    def _entry(self, prompt_name: str) -> dict:
+        if prompt_name not in self._prompts:
+            self._prompts[prompt_name] = {
+                "buckets": [0] * (len(BUCKETS) + 1),
+                "calls": deque(maxlen=WINDOW),
+                "requests": deque(maxlen=WINDOW),
+                "ok": 0, "failed": 0, "retries": 0, "timeouts": 0, "hedges": 0, "hedge_wins": 0,
+                "max": 0.0,
+            }
+        return self._prompts[prompt_name]
+
+    def observe_request(self, prompt_name: str, secs: float):
+        with self._lock:
+            self._entry(prompt_name)["requests"].append(secs)
+
+    def observe_call(self, prompt_name: str, secs: float, ok: bool):
+        with self._lock:
+            entry = self._entry(prompt_name)
+            entry["buckets"][next((i for i, bound in enumerate(BUCKETS) if secs <= bound), len(BUCKETS))] += 1
+            entry["calls"].append(secs)
+            entry["ok" if ok else "failed"] += 1
+            entry["max"] = max(entry["max"], secs)
+
+    def count(self, prompt_name: str, event: str):
+        with self._lock:
+            self._entry(prompt_name)[event] += 1
+
+    def hedge_delay(self, prompt_name: str) -> Optional[float]:
+        """p95 of recent request latencies, or None until enough have been observed."""
+        with self._lock:
+            requests = list(self._entry(prompt_name)["requests"])
+        if len(requests) < self.hedge_min_samples:
+            return None
+        return float(np.percentile(requests, 95))
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            stats = {}
+            for name, entry in self._prompts.items():
+                calls = list(entry["calls"])
+                stats[name] = {
+                    "calls": entry["ok"] + entry["failed"],
+                    **{k: entry[k] for k in ("ok", "failed", "retries", "timeouts", "hedges", "hedge_wins")},
+                    **{f"p{q}": round(float(np.percentile(calls, q)), 3) if calls else 0.0 for q in (50, 95, 99)},
+                    "max": round(entry["max"], 3),
+                    "histogram": {
+                        **{f"le_{bound}": n for bound, n in zip(BUCKETS, entry["buckets"])},
+                        "le_inf": entry["buckets"][-1],
+                    },
+                }
+            return stats
+
+    def export(self, path: str = LLM_LATENCY_PATH) -> Dict[str, dict]:
+        stats = self.snapshot()
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(stats, f, indent=2)
+        except Exception as e:
+            print(f"❌ Error saving LLM latency stats {path}: {e}")
+        return stats
+
+
+# ------------------------------
+# Guarded calls
+# ------------------------------
+class GuardedLLM(Runnable):
+    """
+    Runnable that sits where `llm` sat in a `prompt | llm | parser` chain (and under
+    llm_cache.cached_llm, so cache hits never reach it). `invoke` applies the call policy.
+    """
+
+    def __init__(self, llm, prompt_name: str, tracker: LatencyTracker, executor: ThreadPoolExecutor,
+                 timeout: float = LLM_CALL_TIMEOUT, deadline: float = LLM_CALL_DEADLINE,
+                 max_retries: int = LLM_MAX_RETRIES, hedge: bool = LLM_HEDGE_ENABLED):
+        self.llm = llm
+        self.prompt_name = prompt_name
+        self.tracker = tracker
+        self.executor = executor
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.hedge = hedge
+        # Read by cached_llm for its cache key
+        self.model_name = getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+        self.temperature = getattr(llm, "temperature", None)
+
+    def _request(self, prompt_input, config):
+        started = time.monotonic()
+        result = self.llm.invoke(prompt_input, config)
+        self.tracker.observe_request(self.prompt_name, time.monotonic() - started)
+        return result
+
+    def _attempt(self, prompt_input, config, timeout: float):
+        """One attempt: the primary request, plus a hedge if it outlives the p95. First success wins."""
+        ends = time.monotonic() + timeout
+        primary = self.executor.submit(self._request, prompt_input, config)
+        futures = [primary]
+        hedge_after = self.tracker.hedge_delay(self.prompt_name) if self.hedge else None
+        if hedge_after is not None and hedge_after < timeout:
+            done, _ = wait(futures, timeout=hedge_after)
+            if not done:
+                self.tracker.count(self.prompt_name, "hedges")
+                futures.append(self.executor.submit(self._request, prompt_input, config))
+
+        error = None
+        while futures:
+            done, _ = wait(futures, timeout=max(0.0, ends - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                # The requests keep running in the background (bounded by the client timeout); nobody waits for them
+                self.tracker.count(self.prompt_name, "timeouts")
+                raise LLMDeadlineExceeded(f"no answer within {timeout:.1f}s")
+            for future in done:
+                futures.remove(future)
+                if future.exception() is None:
+                    if future is not primary:
+                        self.tracker.count(self.prompt_name, "hedge_wins")
+                    for other in futures:
+                        other.cancel()
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def invoke(self, input, config=None, **kwargs):
+        started = time.monotonic()
+        deadline = started + self.deadline
+        attempt = 0
+        while True:
+            try:
+                result = self._attempt(input, config, min(self.timeout, deadline - time.monotonic()))
+                self.tracker.observe_call(self.prompt_name, time.monotonic() - started, ok=True)
+                return result
+            except Exception as e:
+                # Full jitter: spreads retries from parallel workers instead of stampeding the API together
+                delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+                if not is_transient(e) or attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                    self.tracker.observe_call(self.prompt_name, time.monotonic() - started, ok=False)
+                    raise
+                attempt += 1
+                self.tracker.count(self.prompt_name, "retries")
+                print(f"⚠️ LLM call '{self.prompt_name}' failed ({type(e).__name__}: {e}); "
+                      f"retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _produce(self, prompt_input, config, chunks: queue.Queue, stop: threading.Event):
+        started = time.monotonic()
+        try:
+            for chunk in self.llm.stream(prompt_input, config):
+                if stop.is_set():
+                    return
+                chunks.put(("chunk", chunk))
+            self.tracker.observe_request(self.prompt_name, time.monotonic() - started)
+            chunks.put(("done", None))
+        except Exception as e:
+            chunks.put(("error", e))
+
+    def stream(self, input, config=None, **kwargs) -> Iterator:
+        """
+        Chunks as they arrive. LLM_CALL_TIMEOUT bounds the wait for each chunk and the
+        deadline bounds the whole stream. Once a chunk has been handed out the answer
+        is partly consumed, so only failures before the first chunk are retried.
+        """
+        started = time.monotonic()
+        deadline = started + self.deadline
+        attempt = 0
+        while True:
+            chunks, stop = queue.Queue(), threading.Event()
+            self.executor.submit(self._produce, input, config, chunks, stop)
+            received = False
+            try:
+                while True:
+                    wait_for = min(self.timeout, deadline - time.monotonic())
+                    try:
+                        kind, value = chunks.get(timeout=max(0.0, wait_for))
+                    except queue.Empty:
+                        self.tracker.count(self.prompt_name, "timeouts")
+                        raise LLMDeadlineExceeded(f"no chunk within {wait_for:.1f}s")
+                    if kind == "error":
+                        raise value
+                    if kind == "done":
+                        self.tracker.observe_call(self.prompt_name, time.monotonic() - started, ok=True)
+                        return
+                    received = True
+                    yield value
+            except Exception as e:
+                stop.set()
+                delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+                if (received or not is_transient(e) or attempt >= self.max_retries
+                        or time.monotonic() + delay >= deadline):
+                    self.tracker.observe_call(self.prompt_name, time.monotonic() - started, ok=False)
+                    raise
+                attempt += 1
+                self.tracker.count(self.prompt_name, "retries")
+                print(f"⚠️ LLM stream '{self.prompt_name}' failed ({type(e).__name__}: {e}); "
+                      f"retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+            finally:
+                stop.set()
+
+
+# --- Cached Globals ---
+_tracker = None
+_executor = None
+_globals_lock = threading.Lock()
+
+
+def get_latency_tracker() -> LatencyTracker:
+    global _tracker
+    with _globals_lock:
+        if _tracker is None:
+            _tracker = LatencyTracker()
+    return _tracker
+
+
+def guarded_llm(llm, prompt_name: str) -> GuardedLLM:
+    """`llm` behind the call policy, with latencies recorded under `prompt_name`."""
+    global _executor
+    tracker = get_latency_tracker()
+    with _globals_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_IN_FLIGHT, thread_name_prefix="llm")
+    return GuardedLLM(llm, prompt_name, tracker, _executor)
+
+
+def format_latency(stats: Dict[str, dict]) -> List[str]:
+    """One line per prompt name, for the batch report."""
+    return [
+        f"  {name:<28} p50={s['p50']:.2f}s  p95={s['p95']:.2f}s  p99={s['p99']:.2f}s  max={s['max']:.2f}s  "
+        f"(n={s['calls']}, failed={s['failed']}, retries={s['retries']}, timeouts={s['timeouts']}, "
+        f"hedges={s['hedges']}/{s['hedge_wins']} won)"
+        for name, s in stats.items()
+    ]
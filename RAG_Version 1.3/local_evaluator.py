@@ -0,0 +1,181 @@
+# local_evaluator.py
+#
+# Responsible for:
+#  - A fast local stand-in for the LLM meta-evaluator (accuracy_checker.meta_evaluate)
+#      * Bayesian ridge regression trained on stored review results (RESULTS_DIR/iterative_results_pr*.json):
+#        heuristics + PR features + prompt + static findings -> the LLM judge's weighted score
+#      * its own (epistemic) uncertainty says how far the local estimate can be trusted; the
+#        judge's noise is left out, since no amount of training data can remove that part
+#  - Routing each evaluation: local when confident, LLM judge when the model is unsure or
+#    still untrained, plus a random audit sample of confident cases to measure local error
+#  - Learning from every LLM judgement, and reporting the share served locally
+
+import glob
+import json
+import random
+import re
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+from sklearn.linear_model import BayesianRidge
+from sklearn.preprocessing import StandardScaler
+from accuracy_checker import is_llm_evaluation, weighted_meta_score
+from config import EVAL_MODE, EVAL_HISTORY_GLOBS, EVAL_LOCAL_MIN_SAMPLES, EVAL_LOCAL_MAX_STD, EVAL_AUDIT_RATE
+
+SECTIONS = ["summary", "bugs", "errors", "code quality", "suggestions", "improvements", "tests", "positive", "final review"]
+PR_COUNTS = ["num_lines", "num_files", "additions", "deletions"]
+PR_FLAGS = ["has_comments", "has_functions", "has_imports", "has_test", "has_docs",
+            "has_config", "is_python", "is_js", "is_java"]
+
+_SEVERITY_TAG = re.compile(r"\[(ERROR|WARNING|INFO)\]")
+
+
+def evaluation_features(features: dict, heur: dict, prompt_name: str, static_output: str,
+                        prompt_names: List[str]) -> np.ndarray:
+    """Everything the stored results keep about a review, as one numeric vector."""
+    sections = heur.get("sections_presence", {})
+    severities = _SEVERITY_TAG.findall(static_output or "")
+    row = [
+        np.log1p(heur.get("length_words", 0)),
+        min(heur.get("bullet_points", 0), 30) / 10.0,
+        float(heur.get("mentions_bug", False)),
+        float(heur.get("mentions_suggest", False)),
+        *[float(sections.get(s, False)) for s in SECTIONS],
+        *[np.log1p(max(0, (features or {}).get(k, 0))) for k in PR_COUNTS],
+        *[float((features or {}).get(k, 0)) for k in PR_FLAGS],
+        *[float(prompt_name == name) for name in prompt_names],
+        float("Issues Found" in (static_output or "")),
+        np.log1p(severities.count("ERROR")),
+        np.log1p(severities.count("WARNING") + severities.count("INFO")),
+    ]
+    return np.array(row, dtype=float)
+
+
+class LocalEvaluator:
+    """
+    route() decides local vs LLM for one review (thread-safe, read-mostly);
+    learn() adds an LLM judgement and refits (called by the single writer).
+    """
+
+    def __init__(self, prompt_names: List[str], mode: str = EVAL_MODE, min_samples: int = EVAL_LOCAL_MIN_SAMPLES,
+                 max_std: float = EVAL_LOCAL_MAX_STD, audit_rate: float = EVAL_AUDIT_RATE,
+                 history_globs: Optional[List[str]] = None, feature_schema: Optional[int] = None):
+        self.prompt_names = prompt_names
+        # Stored results with another PR feature schema are not comparable and are skipped
+        self.feature_schema = feature_schema
+        self.mode = mode
+        self.min_samples = min_samples
+        self.max_std = max_std
+        self.audit_rate = audit_rate
+        self._lock = threading.Lock()
+        self._rng = random.Random()
+        self._X: List[np.ndarray] = []
+        self._y: List[float] = []
+        self._model = None
+        self._scaler = None
+        self.counts = {"local": 0, "llm_untrained": 0, "llm_uncertain": 0, "llm_audit": 0, "llm_forced": 0}
+        self.audit_errors: List[float] = []
+        self.load_history(history_globs if history_globs is not None else EVAL_HISTORY_GLOBS)
+
+    # ------------------------------
+    # Training
+    # ------------------------------
+    def load_history(self, patterns: List[str]) -> int:
+        """Trains on every stored result that carries a real LLM judgement."""
+        seen = set()
+        skipped = 0
+        for pattern in patterns:
+            for path in sorted(glob.glob(pattern)):
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        result = json.load(f)
+                except Exception:
+                    continue
+                key = (result.get("pr_number"), result.get("timestamp"))
+                meta = result.get("meta_evaluation")
+                if key in seen or not is_llm_evaluation(meta) or result.get("selected_prompt") not in self.prompt_names:
+                    continue
+                if self.feature_schema is not None and result.get("feature_schema", 1) != self.feature_schema:
+                    skipped += 1
+                    continue
+                seen.add(key)
+                self._X.append(evaluation_features(result.get("features"), result.get("heuristics", {}),
+                                                   result["selected_prompt"], result.get("static_output", ""),
+                                                   self.prompt_names))
+                self._y.append(weighted_meta_score(meta))
+        with self._lock:
+            self._fit()
+        print(f"🧮 Local evaluator: {len(self._y)} stored LLM evaluations"
+              f"{'' if self._model is not None else f' (needs {self.min_samples} to serve)'}"
+              f"{f', {skipped} skipped (older feature schema)' if skipped else ''}")
+        return len(self._y)
+
+    def _fit(self):
+        if len(self._y) < self.min_samples:
+            return
+        X = np.vstack(self._X)
+        scaler = StandardScaler().fit(X)
+        model = BayesianRidge().fit(scaler.transform(X), np.array(self._y))
+        self._scaler, self._model = scaler, model
+
+    def learn(self, features: dict, heur: dict, prompt_name: str, static_output: str,
+              meta_parsed: dict, local_prediction: Optional[float] = None):
+        """Adds one LLM judgement; `local_prediction` (audits only) feeds the audit error."""
+        if not is_llm_evaluation(meta_parsed) or prompt_name not in self.prompt_names:
+            return
+        target = weighted_meta_score(meta_parsed)
+        with self._lock:
+            self._X.append(evaluation_features(features, heur, prompt_name, static_output, self.prompt_names))
+            self._y.append(target)
+            if local_prediction is not None:
+                self.audit_errors.append(abs(local_prediction - target))
+            self._fit()
+
+    # ------------------------------
+    # Routing
+    # ------------------------------
+    def predict(self, features: dict, heur: dict, prompt_name: str, static_output: str):
+        """
+        (mean, std) of the predicted weighted meta score, or (None, None) while untrained.
+        `std` is the model's own uncertainty: BayesianRidge's predictive std minus its
+        noise term 1/alpha_ (the judge's scatter, which would keep it high forever).
+        """
+        x = evaluation_features(features, heur, prompt_name, static_output, self.prompt_names)
+        with self._lock:
+            model, scaler = self._model, self._scaler
+        if model is None:
+            return None, None
+        mean, std = model.predict(scaler.transform([x]), return_std=True)
+        model_std = np.sqrt(max(float(std[0]) ** 2 - 1.0 / model.alpha_, 0.0))
+        return float(np.clip(mean[0], 1.0, 10.0)), float(model_std)
+
+    def route(self, features: dict, heur: dict, prompt_name: str, static_output: str) -> Dict:
+        """
+        {"use_llm", "reason", "prediction", "std"}. reason is one of
+        local / llm_untrained / llm_uncertain / llm_audit / llm_forced.
+        """
+        prediction, std = self.predict(features, heur, prompt_name, static_output)
+        if self.mode != "tiered":
+            reason = "llm_forced"
+        elif prediction is None:
+            reason = "llm_untrained"
+        elif std > self.max_std:
+            reason = "llm_uncertain"
+        else:
+            with self._lock:
+                audit = self._rng.random() < self.audit_rate
+            reason = "llm_audit" if audit else "local"
+        with self._lock:
+            self.counts[reason] += 1
+        return {"use_llm": reason != "local", "reason": reason, "prediction": prediction, "std": std}
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = sum(self.counts.values())
+            return {
+                **self.counts,
+                "evaluations": total,
+                "local_share": round(self.counts["local"] / total, 4) if total else 0.0,
+                "training_samples": len(self._y),
+                "audit_mae": round(float(np.mean(self.audit_errors)), 3) if self.audit_errors else None,
+            }
@@ -0,0 +1,221 @@
+# local_vector_store.py
+#
+# Responsible for:
+#  - A local, file-backed alternative to the Pinecone index
+#  - Normalized float32 embeddings in a memory-mapped .npy matrix (loads in milliseconds)
+#  - A SQLite sidecar table with the ID, text and metadata of every row
+#  - Top-k cosine search with a single vectorized NumPy matrix product
+#
+# It speaks both dialects the rest of the code needs:
+#  - Pinecone's Index API (upsert / delete / list) so the ingest pipeline can write to it
+#  - LangChain's VectorStore API so rag_core can call `.as_retriever()` on it
+
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+VECTORS_FILE = "vectors.npy"
+META_FILE = "meta.sqlite"
+TEXT_KEY = "text"
+LIST_PAGE_SIZE = 100
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Writes are buffered in memory and applied by `persist()`, which rewrites
+    the matrix and metadata table atomically (compacting deleted rows).
+    Reads always go against the last persisted snapshot.
+    """
+
+    def __init__(self, directory: str, embedding: Optional[Embeddings] = None):
+        self.directory = directory
+        self._embedding = embedding
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Tuple[np.ndarray, dict]] = {}
+        self._deleted: set = set()
+
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(directory, META_FILE), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rows ("
+            " row INTEGER PRIMARY KEY,"
+            " id TEXT UNIQUE NOT NULL,"
+            " metadata TEXT NOT NULL)"
+        )
+        self._conn.commit()
+        self._load_vectors()
+
+    def _load_vectors(self):
+        path = os.path.join(self.directory, VECTORS_FILE)
+        if os.path.exists(path):
+            # mmap: nothing is read until a query touches the pages
+            self._vectors = np.load(path, mmap_mode="r")
+        else:
+            self._vectors = np.zeros((0, 0), dtype=np.float32)
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self._embedding
+
+    def __len__(self) -> int:
+        return self._vectors.shape[0]
+
+    # ------------------------------
+    # Pinecone-style write API (used by ingest_pipeline)
+    # ------------------------------
+    def upsert(self, vectors: List[dict], **kwargs):
+        """Buffers records of the form {"id", "values", "metadata"}."""
+        with self._lock:
+            for record in vectors:
+                self._deleted.discard(record["id"])
+                self._pending[record["id"]] = (
+                    np.asarray(record["values"], dtype=np.float32),
+                    dict(record.get("metadata") or {}),
+                )
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs) -> Optional[bool]:
+        with self._lock:
+            for vid in ids or []:
+                self._pending.pop(vid, None)
+                self._deleted.add(vid)
+        return True
+
+    def list(self, prefix: Optional[str] = None, **kwargs) -> Iterator[List[str]]:
+        """Yields pages of persisted IDs, optionally filtered by prefix."""
+        with self._lock:
+            if prefix:
+                rows = self._conn.execute(
+                    "SELECT id FROM rows WHERE substr(id, 1, ?) = ? ORDER BY row",
+                    (len(prefix), prefix),
+                ).fetchall()
+            else:
+                rows = self._conn.execute("SELECT id FROM rows ORDER BY row").fetchall()
+        ids = [r[0] for r in rows]
+        for start in range(0, len(ids), LIST_PAGE_SIZE):
+            yield ids[start:start + LIST_PAGE_SIZE]
+
+    def persist(self):
+        """Applies buffered upserts/deletes and rewrites the on-disk snapshot."""
+        with self._lock:
+            if not self._pending and not self._deleted:
+                return
+            existing = self._conn.execute("SELECT row, id, metadata FROM rows ORDER BY row").fetchall()
+            keep = [(row, vid, meta) for row, vid, meta in existing
+                    if vid not in self._deleted and vid not in self._pending]
+
+            dim = self._vectors.shape[1] if len(self._vectors) else None
+            if dim is None and self._pending:
+                dim = len(next(iter(self._pending.values()))[0])
+            total = len(keep) + len(self._pending)
+
+            tmp_path = os.path.join(self.directory, VECTORS_FILE + ".tmp")
+            out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(total, dim or 0))
+            new_rows = []
+            if keep:
+                out[:len(keep)] = self._vectors[[row for row, _, _ in keep]]
+                new_rows.extend((i, vid, meta) for i, (_, vid, meta) in enumerate(keep))
+            if self._pending:
+                pending_ids = list(self._pending.keys())
+                matrix = np.vstack([self._pending[vid][0] for vid in pending_ids])
+                out[len(keep):] = _normalize(matrix)
+                new_rows.extend(
+                    (len(keep) + i, vid, json.dumps(self._pending[vid][1]))
+                    for i, vid in enumerate(pending_ids)
+                )
+            out.flush()
+            del out
+
+            # Swap the snapshot: release the old mmap, replace the file, rewrite the table
+            self._vectors = np.zeros((0, 0), dtype=np.float32)
+            os.replace(tmp_path, os.path.join(self.directory, VECTORS_FILE))
+            with self._conn:
+                self._conn.execute("DELETE FROM rows")
+                self._conn.executemany("INSERT INTO rows VALUES (?, ?, ?)", new_rows)
+
+            self._pending.clear()
+            self._deleted.clear()
+            self._load_vectors()
+        print(f"💾 Local vector store persisted: {total} vectors in {self.directory}")
+
+    # ------------------------------
+    # Search
+    # ------------------------------
+    def _top_k(self, embedding: List[float], k: int) -> List[Tuple[int, float]]:
+        if not len(self._vectors):
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= (np.linalg.norm(query) or 1.0)
+        scores = self._vectors @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def _rows_to_documents(self, hits: List[Tuple[int, float]]) -> List[Tuple[Document, float]]:
+        if not hits:
+            return []
+        marks = ",".join("?" * len(hits))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT row, id, metadata FROM rows WHERE row IN ({marks})", [r for r, _ in hits]
+            ).fetchall()
+        by_row = {row: (vid, json.loads(meta)) for row, vid, meta in rows}
+        results = []
+        for row, score in hits:
+            vid, metadata = by_row[row]
+            text = metadata.pop(TEXT_KEY, "")
+            results.append((Document(id=vid, page_content=text, metadata=metadata), score))
+        return results
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self._rows_to_documents(self._top_k(embedding, k))
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self):
+        # Scores are already cosine similarities
+        return lambda score: score
+
+    # ------------------------------
+    # LangChain write API
+    # ------------------------------
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        vectors = self._embedding.embed_documents(texts)
+        self.upsert([
+            {"id": vid, "values": vec, "metadata": {**meta, TEXT_KEY: text}}
+            for vid, vec, meta, text in zip(ids, vectors, metadatas, texts)
+        ])
+        self.persist()
+        return ids
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   ids: Optional[List[str]] = None, directory: str = "local_index", **kwargs: Any):
+        store = cls(directory, embedding)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
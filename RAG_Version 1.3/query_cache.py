@@ -0,0 +1,211 @@
+# query_cache.py
+#
+# Responsible for:
+#  - Caching retrieval results so reruns don't pay for another vector search
+#      * exact tier: sha256 of (query, k)
+#      * semantic tier: reuse results when a new query embedding is within a cosine threshold of a cached one
+#  - LRU + TTL eviction, persisted in SQLite so reruns in new processes still hit
+#  - Invalidating everything when the index version (last ingested commit) changes
+#  - Hit-rate counters that can be exported to JSON
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from config import (
+    QUERY_CACHE_PATH, QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_TTL_SECONDS, QUERY_CACHE_SIMILARITY,
+)
+
+ScoredDocs = List[Tuple[Document, float]]
+
+
+def _serialize(results: ScoredDocs) -> str:
+    return json.dumps([
+        {"id": doc.id, "page_content": doc.page_content, "metadata": doc.metadata, "score": score}
+        for doc, score in results
+    ])
+
+
+def _deserialize(raw: str) -> ScoredDocs:
+    return [
+        (Document(id=d.get("id"), page_content=d["page_content"], metadata=d["metadata"]), d["score"])
+        for d in json.loads(raw)
+    ]
+
+
+class QueryCache:
+    """Two-tier (exact + semantic) retrieval cache for one index version."""
+
+    def __init__(self, index_version: str, path: str = QUERY_CACHE_PATH,
+                 max_entries: int = QUERY_CACHE_MAX_ENTRIES, ttl_seconds: float = QUERY_CACHE_TTL_SECONDS,
+                 similarity_threshold: float = QUERY_CACHE_SIMILARITY):
+        self.index_version = index_version
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        # key -> (embedding or None, serialized results, created_at); order = LRU
+        self._entries: "OrderedDict[str, Tuple[Optional[np.ndarray], str, float]]" = OrderedDict()
+        self._matrix = None  # stacked embeddings for the semantic tier (rebuilt lazily)
+        self._matrix_keys: List[str] = []
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS queries ("
+            " key TEXT PRIMARY KEY, version TEXT NOT NULL, embedding BLOB,"
+            " results TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        # Index version changed -> everything cached is stale
+        self._conn.execute("DELETE FROM queries WHERE version != ?", (index_version,))
+        self._conn.execute("DELETE FROM queries WHERE created < ?", (time.time() - ttl_seconds,))
+        self._conn.commit()
+        for key, blob, results, created in self._conn.execute(
+            "SELECT key, embedding, results, created FROM queries ORDER BY last_used ASC"
+        ):
+            embedding = np.frombuffer(blob, dtype=np.float32) if blob else None
+            self._entries[key] = (embedding, results, created)
+
+    # ------------------------------
+    # Keys
+    # ------------------------------
+    @staticmethod
+    def query_key(query: str, k: int) -> str:
+        return hashlib.sha256(f"{k}\0{query}".encode("utf-8")).hexdigest()
+
+    # ------------------------------
+    # Lookup
+    # ------------------------------
+    def _alive(self, created: float) -> bool:
+        return time.time() - created <= self.ttl_seconds
+
+    def _touch(self, key: str):
+        self._entries.move_to_end(key)
+        self._conn.execute("UPDATE queries SET last_used = ? WHERE key = ?", (time.time(), key))
+        self._conn.commit()
+
+    def get_exact(self, query: str, k: int) -> Optional[ScoredDocs]:
+        key = self.query_key(query, k)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and self._alive(entry[2]):
+                self._touch(key)
+                self.exact_hits += 1
+                return _deserialize(entry[1])
+        return None
+
+    def get_semantic(self, embedding: List[float], k: int) -> Optional[ScoredDocs]:
+        """Nearest cached query by cosine similarity, if above the threshold (and same k)."""
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        with self._lock:
+            if self._matrix is None:
+                self._matrix_keys = [key for key, (emb, _, _) in self._entries.items() if emb is not None]
+                self._matrix = (np.vstack([self._entries[key][0] for key in self._matrix_keys])
+                                if self._matrix_keys else np.zeros((0, len(vector)), dtype=np.float32))
+            if len(self._matrix_keys):
+                scores = self._matrix @ vector
+                for i in np.argsort(-scores):
+                    if scores[i] < self.similarity_threshold:
+                        break
+                    key = self._matrix_keys[i]
+                    entry = self._entries.get(key)
+                    if entry and self._alive(entry[2]):
+                        results = _deserialize(entry[1])
+                        if len(results) >= k:
+                            self._touch(key)
+                            self.semantic_hits += 1
+                            return results[:k]
+            self.misses += 1
+        return None
+
+    # ------------------------------
+    # Store / evict
+    # ------------------------------
+    def put(self, query: str, k: int, embedding: Optional[List[float]], results: ScoredDocs):
+        key = self.query_key(query, k)
+        vector = None
+        if embedding is not None:
+            vector = np.asarray(embedding, dtype=np.float32)
+            vector = vector / (np.linalg.norm(vector) or 1.0)
+        serialized = _serialize(results)
+        now = time.time()
+        with self._lock:
+            self._entries[key] = (vector, serialized, now)
+            self._entries.move_to_end(key)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO queries VALUES (?, ?, ?, ?, ?, ?)",
+                (key, self.index_version, vector.tobytes() if vector is not None else None, serialized, now, now),
+            )
+            while len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                self._conn.execute("DELETE FROM queries WHERE key = ?", (old_key,))
+            self._conn.commit()
+            self._matrix = None
+
+    # ------------------------------
+    # Stats
+    # ------------------------------
+    def stats(self) -> dict:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "index_version": self.index_version,
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.exact_hits + self.semantic_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+    def export_stats(self, path: str = "query_cache_stats.json"):
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.stats(), f, indent=2)
+        except Exception as e:
+            print(f"❌ Error saving query cache stats {path}: {e}")
+
+
+class CachedRetriever(BaseRetriever):
+    """
+    Same interface as `vector_store.as_retriever()`, with the QueryCache in front.
+    Exact hits skip the query embedding too; semantic hits skip the vector search.
+    """
+
+    vector_store: VectorStore
+    embeddings: Embeddings
+    cache: Any
+    k: int = 4
+
+    def search(self, query: str, k: Optional[int] = None) -> ScoredDocs:
+        k = k or self.k
+        results = self.cache.get_exact(query, k)
+        if results is not None:
+            return results
+        embedding = self.embeddings.embed_query(query)
+        return self.search_by_vector(query, embedding, k)
+
+    def search_by_vector(self, query: str, embedding: List[float], k: Optional[int] = None) -> ScoredDocs:
+        """Cached search for callers that already hold the query embedding."""
+        k = k or self.k
+        results = self.cache.get_semantic(embedding, k)
+        if results is None:
+            results = self.vector_store.similarity_search_by_vector_with_score(embedding, k=k)
+            self.cache.put(query, k, embedding, results)
+        return results
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return [doc for doc, _ in self.search(query)]
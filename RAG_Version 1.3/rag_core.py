@@ -1,30 +1,59 @@
 # rag_core.py
 
 import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_pinecone import PineconeVectorStore
 from langchain_core.retrievers import BaseRetriever
-from config import PINECONE_API_KEY, PINECONE_INDEX_NAME # Make sure to add these to config.py
+from embedding_cache import CachedEmbeddings
+from local_vector_store import LocalVectorStore
+from ingest_state import index_identity, read_index_version
+from query_cache import QueryCache, CachedRetriever
+from lexical_index import LexicalIndex, HybridRetriever, reciprocal_rank_fusion, doc_key
+from config import (
+    PINECONE_API_KEY, PINECONE_INDEX_NAME, VECTOR_BACKEND, LOCAL_INDEX_DIR, REPO, QUERY_CACHE_ENABLED,
+    RETRIEVAL_MODE, LEXICAL_INDEX_PATH,
+)
+from utils import safe_truncate
+from diff_parser import parse_diff
 
 # --- Configuration ---
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
 
+# Per-hunk retrieval
+MAX_HUNK_QUERIES = 24      # largest hunks first; the rest are dropped
+HUNK_QUERY_CHARS = 1000    # each hunk query is truncated to this
+K_PER_QUERY = 4
+MAX_PER_SOURCE = 2         # at most this many chunks from the same file
+MMR_LAMBDA = 0.7           # 1.0 = pure relevance, 0.0 = pure diversity
+SEARCH_WORKERS = 8
+
 # --- Cached Globals ---
 _embeddings = None
 _vector_store = None
 _retriever = None
+_vector_retriever = None
+_query_cache = None
+_query_cache_checked = False
+_lexical_index = None
 
 def _get_embeddings():
-    """Loads and caches the embedding model."""
+    """Loads the embedding model, wrapped in the on-disk embedding cache."""
     global _embeddings
     if _embeddings is None:
         print("Loading embedding model...")
-        _embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+        _embeddings = CachedEmbeddings(HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL), EMBEDDING_MODEL)
     return _embeddings
 
 def _get_vector_store():
-    """Loads and caches the Pinecone vector store."""
+    """Loads and caches the vector store (Pinecone, or the local mmap store)."""
     global _vector_store
+    if _vector_store is None and VECTOR_BACKEND == "local":
+        print(f"Opening local vector store: '{LOCAL_INDEX_DIR}'...")
+        _vector_store = LocalVectorStore(LOCAL_INDEX_DIR, _get_embeddings())
     if _vector_store is None:
         # This requires PINECONE_API_KEY to be set as an environment variable
         # or for the config to be imported correctly
@@ -43,13 +72,156 @@ def _get_vector_store():
         )
     return _vector_store
 
+def get_index_version() -> Optional[str]:
+    """
+    Identifies the current contents of the index from the version record ingest
+    writes into the index itself (the local ingest state may be from another machine).
+    None if the index carries no record.
+    """
+    store = _get_vector_store()
+    return read_index_version(store if VECTOR_BACKEND == "local" else store.index, REPO)
+
+def get_query_cache() -> Optional[QueryCache]:
+    """Loads the retrieval query cache for the current index version; None if the version is unknown."""
+    global _query_cache, _query_cache_checked
+    if not _query_cache_checked:
+        _query_cache_checked = True
+        version = get_index_version()
+        if version is None:
+            # Without a version, cached results could outlive the contents they came from
+            print("⚠ Index version unknown (no version record; re-run ingest). Query cache disabled.")
+        else:
+            _query_cache = QueryCache(version)
+            print(f"Query cache ready for {version} ({_query_cache.stats()['entries']} entries).")
+    return _query_cache
+
+def get_lexical_index() -> Optional[LexicalIndex]:
+    """Opens the BM25 index written by ingest; None if hybrid mode is off or the index is missing/foreign."""
+    global _lexical_index
+    if _lexical_index is None and RETRIEVAL_MODE == "hybrid" and os.path.exists(LEXICAL_INDEX_PATH):
+        lexical = LexicalIndex(LEXICAL_INDEX_PATH)
+        expected = f"{index_identity()}/{REPO}"
+        if lexical.stored_identity() != expected:
+            print(f"⚠ Lexical index was built for '{lexical.stored_identity()}', not '{expected}'. Using vector search only.")
+        elif len(lexical) == 0:
+            print("⚠ Lexical index is empty. Using vector search only.")
+        else:
+            _lexical_index = lexical
+    return _lexical_index
+
+def _get_vector_retriever(k_value: int = 4) -> BaseRetriever:
+    """Vector retriever, wrapped in the exact + semantic query cache (unless it is off or the index version is unknown)."""
+    global _vector_retriever
+    if _vector_retriever is None:
+        vector_store = _get_vector_store()
+        cache = get_query_cache() if QUERY_CACHE_ENABLED else None
+        if cache is not None:
+            _vector_retriever = CachedRetriever(
+                vector_store=vector_store, embeddings=_get_embeddings(),
+                cache=cache, k=k_value,
+            )
+        else:
+            _vector_retriever = vector_store.as_retriever(search_kwargs={"k": k_value})
+    return _vector_retriever
+
+def _vector_search(query: str, k: int) -> List[Tuple[Document, float]]:
+    retriever = _get_vector_retriever()
+    if isinstance(retriever, CachedRetriever):
+        return retriever.search(query, k)
+    return _get_vector_store().similarity_search_with_score(query, k=k)
+
 def get_retriever(k_value: int = 4) -> BaseRetriever:
     """
-    Initializes and returns a cached vector store retriever.
+    Initializes and returns a cached retriever: the (query-cached) vector
+    retriever, fused with BM25 when RETRIEVAL_MODE is "hybrid" and a lexical index exists.
     """
     global _retriever
     if _retriever is None:
-        vector_store = _get_vector_store()
-        _retriever = vector_store.as_retriever(search_kwargs={"k": k_value})
-        print("Retriever initialized from Pinecone.")
-    return _retriever
\ No newline at end of file
+        lexical = get_lexical_index()
+        if lexical is not None:
+            _retriever = HybridRetriever(vector_search=_vector_search, lexical=lexical, k=k_value)
+            print(f"Hybrid retriever initialized (BM25 + {VECTOR_BACKEND}).")
+        else:
+            _retriever = _get_vector_retriever(k_value)
+            print(f"Retriever initialized from {VECTOR_BACKEND}.")
+    return _retriever
+
+
+# ------------------------------
+# Per-hunk retrieval
+# ------------------------------
+def _search_by_vector(query: str, embedding: List[float], k: int) -> List[Tuple[Document, float]]:
+    retriever = _get_vector_retriever()
+    if isinstance(retriever, CachedRetriever):
+        return retriever.search_by_vector(query, embedding, k)
+    return _get_vector_store().similarity_search_by_vector_with_score(embedding, k=k)
+
+def _mmr_select(candidates: List[Tuple[Document, float]], k: int) -> List[Tuple[Document, float]]:
+    """Maximal-marginal-relevance cut: trade relevance against similarity to already picked chunks."""
+    if len(candidates) <= k:
+        return candidates
+    vectors = np.asarray(_get_embeddings().embed_documents([d.page_content for d, _ in candidates]), dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    relevance = np.array([score for _, score in candidates], dtype=np.float32)
+    relevance /= max(float(relevance.max()), 1e-12)  # RRF scores are tiny; put them on the cosine scale
+
+    picked = [int(np.argmax(relevance))]
+    while len(picked) < k:
+        redundancy = (vectors @ vectors[picked].T).max(axis=1)
+        mmr = MMR_LAMBDA * relevance - (1 - MMR_LAMBDA) * redundancy
+        mmr[picked] = -np.inf
+        picked.append(int(np.argmax(mmr)))
+    return [candidates[i] for i in picked]
+
+def retrieve_for_diff(diff_text: str, extra_queries: Optional[List[str]] = None,
+                      k: int = 6) -> List[Document]:
+    """
+    Retrieves context for a whole diff instead of its first kilobyte:
+      1. one query per hunk (plus any `extra_queries`, e.g. static findings)
+      2. all queries embedded in a single batched call
+      3. vector searches run concurrently (through the query cache), alongside
+         BM25 lookups of the same queries in hybrid mode
+      4. results merged (best score, or reciprocal-rank fusion in hybrid mode),
+         de-duplicated, capped per source file
+      5. MMR-style diversity cut down to `k` chunks
+    """
+    hunks = [(f.path, hunk.text) for f, hunk in parse_diff(diff_text).hunks()]
+    hunks.sort(key=lambda h: len(h[1]), reverse=True)
+    queries = [f"File: {path}\n{safe_truncate(hunk, HUNK_QUERY_CHARS)}" for path, hunk in hunks[:MAX_HUNK_QUERIES]]
+    queries += [q for q in (extra_queries or []) if q]
+    if not queries:
+        queries = [f"How to review this code? Diff: {safe_truncate(diff_text, HUNK_QUERY_CHARS)}"]
+
+    lexical = get_lexical_index()
+    with ThreadPoolExecutor(max_workers=min(SEARCH_WORKERS, len(queries) + 1)) as pool:
+        # BM25 needs no embeddings, so it starts while the queries are being embedded
+        lexical_futures = [pool.submit(lexical.search, q, K_PER_QUERY) for q in queries] if lexical else []
+        embeddings = _get_embeddings().embed_documents(queries)
+        result_lists = list(pool.map(lambda qe: _search_by_vector(qe[0], qe[1], K_PER_QUERY),
+                                     zip(queries, embeddings)))
+        lexical_lists = [f.result() for f in lexical_futures]
+
+    # Merge: RRF across vector + lexical rankings, or best cosine score per unique chunk
+    best: Dict[str, Tuple[Document, float]] = {}
+    if lexical_lists:
+        best = {doc_key(doc): (doc, score) for doc, score in reciprocal_rank_fusion(result_lists + lexical_lists)}
+    for results in ([] if lexical_lists else result_lists):
+        for doc, score in results:
+            key = doc_key(doc)
+            if key not in best or score > best[key][1]:
+                best[key] = (doc, score)
+
+    # Per-source de-duplication
+    per_source: Dict[str, int] = {}
+    candidates = []
+    for doc, score in sorted(best.values(), key=lambda ds: ds[1], reverse=True):
+        source = doc.metadata.get("path") or doc.metadata.get("source", "")
+        if per_source.get(source, 0) >= MAX_PER_SOURCE:
+            continue
+        per_source[source] = per_source.get(source, 0) + 1
+        candidates.append((doc, score))
+
+    print(f"  Retrieval ({'hybrid' if lexical_lists else 'vector'}): {len(queries)} queries -> {len(best)} unique chunks -> "
+          f"{len(candidates)} after per-source cap -> top {min(k, len(candidates))}")
+    return [doc for doc, _ in _mmr_select(candidates, k)]
+
@@ -0,0 +1,159 @@
+# repo_manager.py
+#
+# Responsible for:
+#  - Keeping ONE persistent bare mirror per repository under REPO_CACHE_DIR
+#      * partial clone (--filter=blob:none): commits and trees only, file contents
+#        are fetched lazily for what is actually checked out or diffed
+#      * later runs only `git fetch` the new objects (branches, or a single PR ref)
+#  - Handing out `git worktree` checkouts from a reusable pool
+#      * a reused worktree is switched with `git checkout`, so only changed files are rewritten
+#      * optional sparse checkout (just the PR's changed files, e.g. for Semgrep)
+#  - The lock for the shared clone passed on the command line (not managed here)
+
+import os
+import subprocess
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+from config import OWNER, REPO, REPO_CACHE_DIR, WORKTREE_POOL_SIZE
+
+
+class RepoManagerError(Exception):
+    """Raised when a git command on the mirror or a worktree fails."""
+
+
+def _git(cwd: str, *args: str) -> str:
+    process = subprocess.run(["git", *args], cwd=cwd, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RepoManagerError(f"git {' '.join(args)}: {process.stderr.strip()}")
+    return process.stdout.strip()
+
+
+class RepoManager:
+    """
+    Bare mirror + worktree pool for one repository. Thread-safe within a process;
+    fetches are serialized, and each worktree is used by one caller at a time.
+    """
+
+    def __init__(self, owner: str = OWNER, repo: str = REPO, root: str = REPO_CACHE_DIR,
+                 pool_size: int = WORKTREE_POOL_SIZE, url: Optional[str] = None):
+        self.url = url or f"https://github.com/{owner}/{repo}.git"
+        self.root = os.path.abspath(root)
+        self.mirror_path = os.path.join(self.root, f"{owner}__{repo}.git")
+        self.worktree_dir = os.path.join(self.root, f"{owner}__{repo}.worktrees")
+        self.pool_size = max(1, pool_size)
+        self._fetch_lock = threading.Lock()
+        self._pool = threading.Condition()
+        self._idle: List[str] = []
+        self._created = 0
+
+    # ------------------------------
+    # Mirror
+    # ------------------------------
+    def ensure_mirror(self) -> str:
+        """Creates the blob-less bare mirror on first use. Returns its path."""
+        with self._fetch_lock:
+            if not os.path.isdir(self.mirror_path):
+                os.makedirs(self.root, exist_ok=True)
+                print(f"📥 Creating blob-less mirror of {self.url} in {self.mirror_path}")
+                _git(self.root, "clone", "--bare", "--filter=blob:none", "--quiet", self.url, self.mirror_path)
+                # A plain bare clone has no fetch refspec: keep the branches updatable by `git fetch`
+                _git(self.mirror_path, "config", "remote.origin.fetch", "+refs/heads/*:refs/heads/*")
+        return self.mirror_path
+
+    def has_commit(self, sha: str) -> bool:
+        return subprocess.run(["git", "cat-file", "-e", f"{sha}^{{commit}}"],
+                              cwd=self.mirror_path, capture_output=True).returncode == 0
+
+    def update(self, branch: Optional[str] = None) -> str:
+        """Fetches new commits for all branches; returns the sha of `branch` (default: the remote HEAD)."""
+        self.ensure_mirror()
+        with self._fetch_lock:
+            _git(self.mirror_path, "fetch", "--quiet", "--prune", "origin")
+        return _git(self.mirror_path, "rev-parse", branch or "HEAD")
+
+    def fetch_pr(self, pr_number: int, head_sha: Optional[str] = None) -> str:
+        """Fetches only `pull/{n}/head` (skipped if `head_sha` is already here); returns the head sha."""
+        self.ensure_mirror()
+        if head_sha and self.has_commit(head_sha):
+            return head_sha
+        with self._fetch_lock:
+            _git(self.mirror_path, "fetch", "--quiet", "origin", f"+pull/{pr_number}/head:refs/pr/{pr_number}")
+        return _git(self.mirror_path, "rev-parse", f"refs/pr/{pr_number}")
+
+    # ------------------------------
+    # Worktree pool
+    # ------------------------------
+    def _acquire(self) -> str:
+        with self._pool:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._created < self.pool_size:
+                    self._created += 1
+                    slot = self._created - 1
+                    break
+                self._pool.wait()
+        path = os.path.join(self.worktree_dir, f"wt-{slot}")
+        try:
+            if os.path.exists(os.path.join(path, ".git")):
+                # Left over from an earlier run; re-link it in case the cache directory moved
+                _git(self.mirror_path, "worktree", "repair", path)
+            else:
+                _git(self.mirror_path, "worktree", "prune")
+                os.makedirs(self.worktree_dir, exist_ok=True)
+                _git(self.mirror_path, "worktree", "add", "--detach", "--no-checkout", "--force", path, "HEAD")
+        except Exception:
+            with self._pool:
+                self._created -= 1
+                self._pool.notify()
+            raise
+        return path
+
+    def _release(self, path: str):
+        with self._pool:
+            self._idle.append(path)
+            self._pool.notify()
+
+    @staticmethod
+    def _switch(path: str, rev: str, paths: Optional[List[str]]):
+        """Points a worktree at `rev`; with `paths`, only those files are materialized."""
+        if paths:
+            # Narrow first, so the checkout never writes (or fetches) files outside `paths`
+            _git(path, "sparse-checkout", "set", "--no-cone", "--", *["/" + p.lstrip("/") for p in paths])
+            _git(path, "checkout", "--quiet", "--force", "--detach", rev)
+        else:
+            _git(path, "checkout", "--quiet", "--force", "--detach", rev)
+            _git(path, "sparse-checkout", "disable")
+        _git(path, "clean", "-ffdq")
+
+    @contextmanager
+    def worktree(self, rev: str, paths: Optional[List[str]] = None) -> Iterator[str]:
+        """
+        Checkout of `rev` from the pool (blocks while all pool_size worktrees are busy).
+        The directory stays on disk for reuse; do not delete it.
+        """
+        self.ensure_mirror()
+        path = self._acquire()
+        try:
+            self._switch(path, rev, paths)
+            yield path
+        finally:
+            self._release(path)
+
+
+# --- Cached Globals ---
+_managers = {}
+_managers_lock = threading.Lock()
+
+# The shared clone passed on the CLI has one working tree and no manager: its
+# fetches and PR checkouts must not interleave (batch mode runs reviews in threads)
+shared_repo_lock = threading.Lock()
+
+
+def get_repo_manager(owner: str = OWNER, repo: str = REPO) -> RepoManager:
+    """Shared manager per repository, so every caller uses the same mirror and worktree pool."""
+    with _managers_lock:
+        if (owner, repo) not in _managers:
+            _managers[(owner, repo)] = RepoManager(owner, repo)
+        return _managers[(owner, repo)]
@@ -1,15 +1,18 @@
 # reviewer.py
 #
 # Responsible for:
-#  - Fetching PR diff from GitHub
-#  - Posting review comments (if permitted)
-#  - LLM initialization
+#  - Fetching PR diff from GitHub (through the pooled, caching client in github_client.py)
+#  - Posting review comments (if permitted), and editing them in place (streaming mode)
+#  - LLM initialization (and the response-cached, deadline-bounded view of it used by the chains)
 
 import requests
 from langchain_core.output_parsers import StrOutputParser
 from langchain_groq import ChatGroq
-from config import GITHUB_TOKEN, OWNER, REPO, GROQ_API_KEY
-from typing import Optional
+from config import GITHUB_TOKEN, OWNER, REPO, GROQ_API_KEY, LLM_CALL_TIMEOUT
+from github_client import get_client
+from llm_cache import cached_llm, cached_stream, get_llm_cache
+from llm_guard import guarded_llm
+from typing import Iterator, Optional
 
 # ------------------------------
 # GitHub helpers
@@ -17,11 +20,9 @@ from typing import Optional
 def fetch_pr_diff(owner: str, repo: str, pr_number: int, token: str) -> str:
     url = f"https://api.github.com/repos/{owner}/{repo}/pulls/{pr_number}"
     
-    # Use the token from config.py
-    headers = {"Authorization": f"token {token}", "Accept": "application/vnd.github.v3.diff"}
-    
     try:
-        response = requests.get(url, headers=headers)
+        # Conditional GET: an unchanged diff comes back as a free 304 from the cache
+        response = get_client(token).get(url, accept="application/vnd.github.v3.diff")
         response.raise_for_status() # Raise an exception for bad status codes
         return response.text
     except requests.exceptions.HTTPError as e:
@@ -37,13 +38,19 @@ def fetch_pr_diff(owner: str, repo: str, pr_number: int, token: str) -> str:
 
 def post_review_comment(owner: str, repo: str, pr_number: int, token: str, review_body: str) -> dict:
     url = f"https://api.github.com/repos/{owner}/{repo}/issues/{pr_number}/comments"
-    headers = {"Authorization": f"token {token}", "Accept": "application/vnd.github+json"}
     payload = {"body": review_body}
-    response = requests.post(url, headers=headers, json=payload)
+    response = get_client(token).post(url, payload)
     if response.status_code not in (200, 201):
         raise Exception(f"❌ Failed to post comment: {response.json()}")
     return response.json()
 
+def update_review_comment(owner: str, repo: str, comment_id: int, token: str, review_body: str) -> dict:
+    url = f"https://api.github.com/repos/{owner}/{repo}/issues/comments/{comment_id}"
+    response = get_client(token).patch(url, {"body": review_body})
+    if response.status_code != 200:
+        raise Exception(f"❌ Failed to update comment {comment_id}: {response.status_code} {response.text}")
+    return response.json()
+
 # ------------------------------
 # LLM initialization
 # ------------------------------
@@ -51,8 +58,21 @@ llm = ChatGroq(
     model="llama-3.3-70b-versatile", # <--- THIS IS THE NEW MODEL
     temperature=0.25,
     api_key=GROQ_API_KEY,
+    timeout=LLM_CALL_TIMEOUT,
+    max_retries=0,  # retries, deadlines and hedging are handled by llm_guard
 )
 
+def llm_for(prompt_name: str, valid=None):
+    """
+    The shared `llm`, behind the call policy and the on-disk response cache, for the named prompt template.
+    `valid(text)` keeps answers the caller cannot parse out of the cache.
+    """
+    return cached_llm(guarded_llm(llm, prompt_name), prompt_name, get_llm_cache(), valid=valid)
+
+def stream_for(prompt_name: str, prompt_input) -> Iterator[str]:
+    """Streaming version of `llm_for(prompt_name).invoke(prompt_input)`: yields text chunks."""
+    return cached_stream(guarded_llm(llm, prompt_name), prompt_name, prompt_input, get_llm_cache())
+
 # simple parser that returns string output
 parser = StrOutputParser()
 
@@ -75,13 +95,8 @@ def fetch_pr_metadata(owner: str, repo: str, pr_number: int, token: str):
     """
     url = f"https://api.github.com/repos/{owner}/{repo}/pulls/{pr_number}"
 
-    headers = {
-        "Authorization": f"token {token}",
-        "Accept": "application/vnd.github+json"
-    }
-
     try:
-        response = requests.get(url, headers=headers)
+        response = get_client(token).get(url)
 
         # Handle missing PR
         if response.status_code == 404:
@@ -0,0 +1,156 @@
+# semgrep_cache.py
+#
+# Responsible for:
+#  - Caching Semgrep findings per file content: key = (git blob SHA, ruleset digest, Semgrep version)
+#      * the blob SHA comes from `git ls-tree`, so hits need no checkout at all
+#      * a local rule pack (SEMGREP_CONFIG=path/to/rules) is digested by content;
+#        registry configs ("auto", "p/python", ...) are keyed by name and rotate daily
+#  - The same findings cache (and blob lookup) also serves the other analyzers in static_analyzers.py
+#  - Running Semgrep (--json) on the files that missed the cache
+
+import hashlib
+import json
+import os
+import sqlite3
+import subprocess
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from config import SEMGREP_CONFIG, SEMGREP_CACHE_PATH, SEMGREP_TIMEOUT
+
+
+# ------------------------------
+# Key parts
+# ------------------------------
+@lru_cache(maxsize=1)
+def semgrep_version() -> str:
+    try:
+        return subprocess.run(["semgrep", "--version"], capture_output=True, text=True,
+                              timeout=60).stdout.strip() or "unknown"
+    except Exception:
+        return "unknown"
+
+
+def is_local_config(config: str) -> bool:
+    return os.path.exists(config)
+
+
+def ruleset_digest(config: str = SEMGREP_CONFIG) -> str:
+    """Content hash of a local rule pack; registry configs can change any time, so they rotate daily."""
+    if not is_local_config(config):
+        return f"registry:{config}:{time.strftime('%Y-%m-%d')}"
+    digest = hashlib.sha256()
+    files = [config] if os.path.isfile(config) else sorted(
+        os.path.join(root, name) for root, _, names in os.walk(config) for name in names
+        if name.endswith((".yml", ".yaml", ".json"))
+    )
+    for path in files:
+        digest.update(os.path.relpath(path, config).encode("utf-8"))
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return f"local:{digest.hexdigest()[:16]}"
+
+
+def blob_shas(repo_path: str, rev: str, paths: List[str]) -> Dict[str, str]:
+    """{path: blob SHA} at `rev`, read from the object database (no checkout needed)."""
+    if not paths:
+        return {}
+    out = subprocess.run(["git", "ls-tree", "-r", "-z", rev, "--", *paths],
+                         cwd=repo_path, capture_output=True, check=True).stdout.decode("utf-8", errors="replace")
+    shas = {}
+    for entry in filter(None, out.split("\0")):
+        meta, path = entry.split("\t", 1)
+        _, kind, sha = meta.split()
+        if kind == "blob":
+            shas[path] = sha
+    return shas
+
+
+# ------------------------------
+# Cache
+# ------------------------------
+class FindingsCache:
+    """Findings per (blob, ruleset, tool version); an empty list is a cached clean result."""
+
+    def __init__(self, path: str = SEMGREP_CACHE_PATH):
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS findings ("
+            " key TEXT PRIMARY KEY, results TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def key(blob_sha: str, digest: str, version: str) -> str:
+        return f"{blob_sha}:{digest}:{version}"
+
+    def get_many(self, keys: List[str]) -> Dict[str, str]:
+        if not keys:
+            return {}
+        marks = ",".join("?" * len(keys))
+        with self._lock:
+            rows = self._conn.execute(f"SELECT key, results FROM findings WHERE key IN ({marks})", keys).fetchall()
+        return dict(rows)
+
+    def put_many(self, rows: List[Tuple[str, str]]):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO findings VALUES (?, ?, ?)",
+                                   [(key, results, now) for key, results in rows])
+            self._conn.commit()
+
+
+def to_cached(results: List[dict]) -> str:
+    # The same blob can live at several paths, so the path is not part of the stored findings
+    return json.dumps([{k: v for k, v in r.items() if k != "path"} for r in results])
+
+
+def from_cached(raw: str, path: str) -> List[dict]:
+    return [{"path": path, **r} for r in json.loads(raw)]
+
+
+# ------------------------------
+# Running Semgrep
+# ------------------------------
+def run_semgrep(repo_path: str, paths: List[str], config: str = SEMGREP_CONFIG,
+                timeout: int = SEMGREP_TIMEOUT, jobs: Optional[int] = None) -> Tuple[Dict[str, List[dict]], set, str]:
+    """
+    Runs `semgrep --json` on `paths`. Returns (results by path, paths Semgrep
+    reports as scanned, error text). Only scanned paths are safe to cache.
+    """
+    cmd = ["semgrep", "--config", config, "--json", "--quiet"]
+    if jobs:
+        cmd += ["--jobs", str(jobs)]
+    if is_local_config(config):
+        cmd.append("--metrics=off")  # local rule pack: no registry or network needed
+    process = subprocess.run(cmd + paths, cwd=repo_path, capture_output=True, text=True,
+                             check=False, timeout=timeout)
+    try:
+        report = json.loads(process.stdout)
+    except (json.JSONDecodeError, TypeError):
+        return {}, set(), (process.stderr.strip() or process.stdout.strip() or f"exit code {process.returncode}")
+
+    by_path: Dict[str, List[dict]] = {}
+    for result in report.get("results", []):
+        by_path.setdefault(result.get("path", ""), []).append(result)
+    scanned = set(report.get("paths", {}).get("scanned", paths))
+    errors = report.get("errors", [])
+    failed = {e.get("path") for e in errors if e.get("path")}
+    error_text = "\n".join(e.get("message", str(e)).strip() for e in errors)
+    return by_path, scanned - failed, error_text
+
+
+# --- Cached Globals ---
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_findings_cache() -> FindingsCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = FindingsCache()
+    return _cache
@@ -141,57 +141,42 @@
 
 # change in code
 import os
-import re
-import subprocess
-import tempfile
-import shutil
-import stat
+from contextlib import contextmanager
 from git import Repo
-from typing import Dict, List
+from typing import Dict, List, Optional
 import sys   # >>> ADDED (for shared repo clone path)
+from diff_parser import FILE_LANG_MAP, parse_diff
+from static_analyzers import analyze, format_findings, severity_counts
+from repo_manager import get_repo_manager, shared_repo_lock
 
 # =====================================================
 # 1. Configuration & Helpers
 # =====================================================
 
-FILE_LANG_MAP = {
-    "py": "python",
-    "js": "javascript", "jsx": "javascript", "ts": "javascript", "tsx": "javascript",
-    "java": "java",
-    "cpp": "cpp", "cc": "cpp", "cxx": "cpp", "h": "cpp", "hpp": "cpp",
-    "go": "go",
-    "kt": "kotlin",
-    "rs": "rust",
-    "rb": "ruby",
-    "php": "php"
-}
-
-def on_rm_error(func, path, exc_info):
-    if not os.access(path, os.W_OK):
-        os.chmod(path, stat.S_IWRITE)
-        func(path)
-    else:
-        raise
+# FILE_LANG_MAP now lives in diff_parser (re-exported here for existing imports)
 
 def get_changed_files_and_languages(diff_text: str) -> Dict[str, List[str]]:
-    file_paths = re.findall(r'\+\+\+ b/(.*)', diff_text)
-    changed_files: Dict[str, List[str]] = {}
-    
-    for path in file_paths:
-        ext = path.split('.')[-1].lower()
-        lang = FILE_LANG_MAP.get(ext)
-        if lang:
-            changed_files.setdefault(lang, []).append(path)
-    return changed_files
+    # Deleted files are skipped: there is nothing left to scan
+    return parse_diff(diff_text).files_by_language()
 
 # =====================================================
-# 2. Main Updated Logic: No Clone → Reuse repo
+# 2. Main Updated Logic: shared clone, or mirror + worktree pool
 # =====================================================
 
-def run_static_analysis(diff_text: str, owner: str, repo_name: str, pr_number: int) -> str:
+@contextmanager
+def _shared_checkout(repo: Repo, rev: str):
+    # Caller holds shared_repo_lock: the shared clone has a single working tree
+    repo.git.checkout(rev)
+    yield repo.working_tree_dir
+
+
+def run_static_analysis(diff_text: str, owner: str, repo_name: str, pr_number: int,
+                        head_sha: Optional[str] = None) -> str:
     """
     UPDATED: If repo path is passed via CLI → use it.
-    Only clone when NOT provided.
+    Otherwise use the persistent blob-less mirror (repo_manager.py):
+    only the PR ref is fetched (not even that when `head_sha` is already
+    in the mirror) and only the changed files are checked out.
     """
 
     # >>> ADDED: try reading repo path from argument if provided
@@ -200,7 +185,7 @@ def run_static_analysis(diff_text: str, owner: str, repo_name: str, pr_number: i
         repo_override_path = sys.argv[1]  # shared clone path
         print(f"🔄 Using pre-cloned repository: {repo_override_path}")
     else:
-        print("⚠ No repo path passed. Falling back to cloning inside static analyser.")
+        print("📦 No repo path passed. Using the cached mirror + worktree pool.")
 
     changed_files_map = get_changed_files_and_languages(diff_text)
     
@@ -209,78 +194,61 @@ def run_static_analysis(diff_text: str, owner: str, repo_name: str, pr_number: i
 
     all_changed_files = [f for files in changed_files_map.values() for f in files]
 
-    # =====================================================
-    # CLONE / REUSE REPO
-    # =====================================================
-
-    if repo_override_path and os.path.exists(repo_override_path):
-        temp_dir = repo_override_path
-        print(f"👉 Reusing existing repo: {temp_dir}")
-        remove_after = False   # do not delete
-    else:
-        # >>> COMMENTED ORIGINAL
-        # temp_dir = tempfile.mkdtemp()
-
-        # >>> ADDED
-        temp_dir = tempfile.mkdtemp()
-        print(f"📥 Cloning {owner}/{repo_name} into temp: {temp_dir}")
-        remove_after = True
-
-        repo_url = f"https://github.com/{owner}/{repo_name}.git"
-        try:
-            repo = Repo.clone_from(repo_url, temp_dir)
-        except Exception as e:
-            return f"❌ FAILED to clone repo: {e}"
-
     results: List[str] = []
-    results.append(f"=== 🔍 Targeted Static Analysis using Semgrep ({len(all_changed_files)} files) ===")
+    results.append(f"=== 🔍 Targeted Static Analysis ({len(all_changed_files)} files) ===")
 
+    use_shared = bool(repo_override_path and os.path.exists(repo_override_path))
+    if use_shared:
+        print(f"👉 Reusing existing repo: {repo_override_path}")
+        shared_repo_lock.acquire()
     try:
-        repo = Repo(temp_dir)
-
-        # >>> COMMENTED ORIGINAL
-        # repo.remotes.origin.fetch(f"pull/{pr_number}/head:{pr_branch_name}")
-
-        # >>> ADDED
         print("Fetching PR branch...")
-        pr_branch_name = f"pr-{pr_number}"
-        try:
-            repo.remotes.origin.fetch(f"pull/{pr_number}/head:{pr_branch_name}")
-        except Exception as e:
-            return f"❌ Unable to fetch PR branch: {e}"
-
-        repo.git.checkout(pr_branch_name)
-
-        print("Running Semgrep...")
-
-        cmd = ["semgrep", "--config", "auto"] + all_changed_files
-
-        process = subprocess.run(
-            cmd,
-            cwd=temp_dir,
-            capture_output=True,
-            text=True,
-            check=False,
-            timeout=120
-        )
-
-        output = process.stdout.strip()
-        error_output = process.stderr.strip()
-
-        if output:
-            results.append(f"| 🧠 Semgrep Issues Found:\n\n{output}\n")
-        elif process.returncode == 0 and not error_output:
-            results.append("| 🧠 Semgrep: No issues found.")
+        if use_shared:
+            repo = Repo(repo_override_path)
+            pr_branch_name = f"pr-{pr_number}"
+            try:
+                repo.remotes.origin.fetch(f"pull/{pr_number}/head:{pr_branch_name}")
+            except Exception as e:
+                return f"❌ Unable to fetch PR branch: {e}"
+            repo_path, rev = repo_override_path, pr_branch_name
+            checkout = lambda _paths: _shared_checkout(repo, pr_branch_name)
         else:
-            results.append(f"| 🧠 Semgrep Output/Error:\n{output if output else error_output}")
+            manager = get_repo_manager(owner, repo_name)
+            try:
+                rev = manager.fetch_pr(pr_number, head_sha)
+            except Exception as e:
+                return f"❌ Unable to fetch PR branch: {e}"
+            # Sparse worktree: only the files Semgrep still has to scan are written (and their blobs fetched)
+            repo_path = manager.mirror_path
+            checkout = lambda paths: manager.worktree(rev, paths=paths)
+
+        # Findings are cached per file blob: the checkout (and the analyzers) only happen for cache misses.
+        # Misses run as parallel shards; a shard that times out only loses its own files.
+        print("Running static analyzers...")
+        report = analyze(repo_path, rev, all_changed_files, checkout=checkout)
+        for tool, stats in report["stats"].items():
+            print(f"🧠 {tool}: {stats['cached']}/{stats['files']} files cached, {stats['scanned']} scanned "
+                  f"in {stats['shards']} shards ({stats['failed_shards']} failed)")
+
+        findings = report["findings"]
+        if findings:
+            counts = ", ".join(f"{n} {severity}" for severity, n in severity_counts(findings).items() if n)
+            tools = ", ".join(report["stats"])
+            # Ranked most severe first, one finding per block
+            results.append(f"| 🧠 Static Analysis Issues Found ({tools}: {counts}):")
+            results.append(format_findings(findings))
+        elif report["stats"]:
+            results.append("| 🧠 Static analysis: No issues found.")
+        for error in report["errors"]:
+            results.append(f"| ⚠ {error}")
+        if not report["stats"]:
+            results.append("| ❌ Error: no static analyzer available. Please run: pip install semgrep ruff")
 
     except Exception as e:
         results.append(f"❌ Unexpected Error: {e}")
 
     finally:
-        # Only delete if we cloned it internally
-        if remove_after:
-            print(f"🧹 Cleaning up: {temp_dir}")
-            shutil.rmtree(temp_dir, onerror=on_rm_error)
+        if use_shared:
+            shared_repo_lock.release()
 
     return "\n\n".join(results)
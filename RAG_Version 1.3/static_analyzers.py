@@ -0,0 +1,352 @@
+# static_analyzers.py
+#
+# Responsible for:
+#  - Running the static analyzers over a PR's changed files: Semgrep (every language)
+#    and ruff (Python, fast), as configured in STATIC_ANALYZERS
+#      * findings are cached per file blob (semgrep_cache.FindingsCache); only misses are analyzed
+#      * misses are cut into shards that run as parallel processes, each with its own
+#        adaptive timeout; a shard that fails or times out only loses its own files
+#  - Normalizing every tool's output into one finding shape:
+#      {tool, rule, severity, path, line, end_line, message, code}
+#  - Merging everything into one de-duplicated list, ranked by severity, then path and line
+
+import json
+import math
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from functools import lru_cache
+from typing import Callable, ContextManager, Dict, List, Optional, Tuple
+from config import (
+    SEMGREP_CONFIG, SEMGREP_TIMEOUT, STATIC_ANALYZERS, RUFF_SELECT, STATIC_WORKERS, STATIC_SHARD_FILES,
+)
+from diff_parser import language_of
+from semgrep_cache import (
+    blob_shas, from_cached, get_findings_cache, ruleset_digest, run_semgrep, semgrep_version, to_cached,
+)
+
+SEVERITY_RANK = {"ERROR": 0, "WARNING": 1, "INFO": 2}
+
+# Semgrep's newer severity names
+_SEMGREP_SEVERITY = {"CRITICAL": "ERROR", "HIGH": "ERROR", "MEDIUM": "WARNING", "LOW": "INFO"}
+
+# ruff rule prefixes, most specific first: real bugs are errors, the rest of pyflakes/bugbear warnings
+_RUFF_SEVERITY = (
+    ("E9", "ERROR"), ("F63", "ERROR"), ("F7", "ERROR"), ("F82", "ERROR"),
+    ("S", "WARNING"), ("B", "WARNING"), ("F", "WARNING"),
+)
+
+# Shard results: ({path: [findings]}, paths fully analyzed, error text)
+ShardResult = Tuple[Dict[str, List[dict]], set, str]
+
+
+@lru_cache(maxsize=1)
+def ruff_version() -> str:
+    try:
+        return subprocess.run(["ruff", "--version"], capture_output=True, text=True,
+                              timeout=30).stdout.strip() or "unknown"
+    except Exception:
+        return "unknown"
+
+
+def _finding(tool: str, rule: str, severity: str, path: str, line: int, end_line: int,
+             message: str, code: str = "") -> dict:
+    return {
+        "tool": tool, "rule": rule, "severity": severity, "path": path,
+        "line": line, "end_line": end_line, "message": message.strip(), "code": code.strip(),
+    }
+
+
+# ------------------------------
+# Analyzers
+# ------------------------------
+class SemgrepAnalyzer:
+    name = "semgrep"
+    # Timeout model (see ShardTimeout): process + rule loading, then scanning
+    startup_seconds, seconds_per_kb, min_timeout = 15.0, 0.05, 30.0
+
+    def available(self) -> bool:
+        return shutil.which("semgrep") is not None
+
+    def handles(self, path: str) -> bool:
+        return True  # the caller already kept only files in a known language
+
+    def version(self) -> str:
+        return semgrep_version()
+
+    def digest(self) -> str:
+        return ruleset_digest(SEMGREP_CONFIG)
+
+    def run(self, work_dir: str, paths: List[str], timeout: float, jobs: Optional[int]) -> ShardResult:
+        by_path, scanned, error_text = run_semgrep(work_dir, paths, SEMGREP_CONFIG, timeout, jobs)
+        findings = {}
+        for path, results in by_path.items():
+            findings[path] = []
+            for r in results:
+                extra = r.get("extra", {})
+                severity = str(extra.get("severity", "INFO")).upper()
+                lines = (extra.get("lines") or "").strip()
+                code = lines.splitlines()[0] if lines and lines != "requires login" else ""
+                findings[path].append(_finding(
+                    self.name, r.get("check_id", ""), _SEMGREP_SEVERITY.get(severity, severity), path,
+                    r.get("start", {}).get("line", 0), r.get("end", {}).get("line", 0),
+                    extra.get("message", ""), code,
+                ))
+        return findings, scanned, error_text
+
+
+class RuffAnalyzer:
+    name = "ruff"
+    startup_seconds, seconds_per_kb, min_timeout = 1.0, 0.002, 10.0
+
+    def available(self) -> bool:
+        return shutil.which("ruff") is not None
+
+    def handles(self, path: str) -> bool:
+        return language_of(path) == "python"
+
+    def version(self) -> str:
+        return ruff_version()
+
+    def digest(self) -> str:
+        # --isolated: the repo's own ruff config is ignored, so the rule selection is the whole ruleset
+        return f"select:{RUFF_SELECT}"
+
+    @staticmethod
+    def _severity(code: Optional[str]) -> str:
+        if not code:  # syntax error
+            return "ERROR"
+        for prefix, severity in _RUFF_SEVERITY:
+            if code.startswith(prefix):
+                return severity
+        return "INFO"
+
+    def run(self, work_dir: str, paths: List[str], timeout: float, jobs: Optional[int]) -> ShardResult:
+        cmd = ["ruff", "check", "--isolated", "--select", RUFF_SELECT, "--output-format", "json",
+               "--exit-zero", "--no-cache", "--quiet", *paths]
+        process = subprocess.run(cmd, cwd=work_dir, capture_output=True, text=True, check=False, timeout=timeout)
+        try:
+            report = json.loads(process.stdout)
+        except (json.JSONDecodeError, TypeError):
+            return {}, set(), process.stderr.strip() or f"ruff exit code {process.returncode}"
+
+        root = os.path.realpath(work_dir)
+        findings: Dict[str, List[dict]] = {}
+        for r in report:
+            path = os.path.relpath(os.path.realpath(os.path.join(work_dir, r.get("filename", ""))), root)
+            path = path.replace(os.sep, "/")
+            findings.setdefault(path, []).append(_finding(
+                self.name, r.get("code") or "syntax-error", self._severity(r.get("code")), path,
+                (r.get("location") or {}).get("row", 0), (r.get("end_location") or {}).get("row", 0),
+                r.get("message", ""),
+            ))
+        return findings, set(paths), ""
+
+
+ANALYZERS = {"semgrep": SemgrepAnalyzer, "ruff": RuffAnalyzer}
+
+
+# ------------------------------
+# Sharding and adaptive timeouts
+# ------------------------------
+class ShardTimeout:
+    """
+    Per-analyzer timeout: predicted = startup + KB * seconds_per_kb, scaled by
+    how past shards compared with their prediction (moving average), times a
+    safety factor, clamped to [min_timeout, SEMGREP_TIMEOUT]. A timeout makes
+    the next shards' budget larger.
+    """
+
+    SAFETY = 3.0
+
+    def __init__(self, startup: float, seconds_per_kb: float, min_timeout: float, max_timeout: float):
+        self.startup, self.seconds_per_kb = startup, seconds_per_kb
+        self.min_timeout, self.max_timeout = min_timeout, max_timeout
+        self.ratio = 1.0
+        self._lock = threading.Lock()
+
+    def _predict(self, kb: float) -> float:
+        return self.startup + kb * self.seconds_per_kb
+
+    def timeout(self, kb: float) -> float:
+        with self._lock:
+            return min(self.max_timeout, max(self.min_timeout, self.SAFETY * self.ratio * self._predict(kb)))
+
+    def observe(self, kb: float, elapsed: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.ratio = min(self.ratio * 1.5, 10.0)
+            else:
+                self.ratio = 0.7 * self.ratio + 0.3 * (elapsed / self._predict(kb))
+
+
+def make_shards(paths: List[str], sizes: Dict[str, int], max_files: int) -> List[List[str]]:
+    """Largest file first onto the lightest shard, so shards finish at about the same time."""
+    count = max(1, math.ceil(len(paths) / max(1, max_files)))
+    shards: List[List[str]] = [[] for _ in range(count)]
+    loads = [0] * count
+    for path in sorted(paths, key=lambda p: -sizes.get(p, 0)):
+        i = min((i for i in range(count) if len(shards[i]) < max_files), key=lambda i: loads[i])
+        shards[i].append(path)
+        loads[i] += sizes.get(path, 0)
+    return [shard for shard in shards if shard]
+
+
+def _run_shard(analyzer, work_dir: str, shard: List[str], sizes: Dict[str, int],
+               jobs: Optional[int]) -> ShardResult:
+    model = get_shard_timeout(analyzer)
+    kb = sum(sizes.get(p, 0) for p in shard) / 1024
+    timeout = model.timeout(kb)
+    start = time.time()
+    try:
+        result = analyzer.run(work_dir, shard, timeout, jobs)
+    except subprocess.TimeoutExpired:
+        model.observe(kb, time.time() - start, timed_out=True)
+        return {}, set(), f"{analyzer.name} shard of {len(shard)} files timed out after {timeout:.0f}s"
+    except Exception as e:
+        return {}, set(), f"{analyzer.name} shard of {len(shard)} files failed: {e}"
+    model.observe(kb, time.time() - start)
+    return result
+
+
+# ------------------------------
+# Merging
+# ------------------------------
+def merge_findings(findings: List[dict]) -> List[dict]:
+    """Drops repeats (same rule on the same line, or the same message there from another tool), ranks by severity."""
+    ranked = sorted(findings, key=lambda f: (SEVERITY_RANK.get(f["severity"], 3), f["path"], f["line"], f["tool"]))
+    seen = set()
+    merged = []
+    for f in ranked:
+        keys = {(f["path"], f["line"], f["rule"]), (f["path"], f["line"], f["message"].lower())}
+        if keys & seen:
+            continue
+        seen |= keys
+        merged.append(f)
+    return merged
+
+
+def severity_counts(findings: List[dict]) -> Dict[str, int]:
+    counts = {severity: 0 for severity in SEVERITY_RANK}
+    for f in findings:
+        counts[f["severity"]] = counts.get(f["severity"], 0) + 1
+    return counts
+
+
+def format_findings(findings: List[dict]) -> str:
+    """One blank-line separated block per finding, so prompt packing keeps the most severe ones."""
+    blocks = []
+    for f in findings:
+        block = f"{f['path']}:{f['line']} [{f['severity']}] {f['tool']}:{f['rule']}\n    {f['message']}"
+        if f["code"]:
+            block += f"\n    > {f['code'][:200]}"
+        blocks.append(block)
+    return "\n\n".join(blocks)
+
+
+# ------------------------------
+# Orchestration
+# ------------------------------
+def analyze(repo_path: str, rev: str, paths: List[str],
+            checkout: Optional[Callable[[List[str]], ContextManager[str]]] = None,
+            analyzer_names: Optional[List[str]] = None, workers: int = STATIC_WORKERS,
+            shard_files: int = STATIC_SHARD_FILES) -> dict:
+    """
+    Findings for `paths` at `rev` (blob SHAs are read from `repo_path`).
+    `checkout(miss_paths)` is entered once, only if some analyzer missed the
+    cache, and yields the directory holding `rev`'s files (default: `repo_path`).
+    Returns {"findings": merged list, "stats": per analyzer, "errors": [...]}.
+    """
+    cache = get_findings_cache()
+    analyzers, errors = [], []
+    for name in analyzer_names if analyzer_names is not None else STATIC_ANALYZERS:
+        analyzer = ANALYZERS[name]() if name in ANALYZERS else None
+        if analyzer is None:
+            errors.append(f"unknown analyzer '{name}'")
+        elif not analyzer.available():
+            errors.append(f"'{name}' command not found, skipped (pip install {name})")
+        else:
+            analyzers.append(analyzer)
+
+    shas = blob_shas(repo_path, rev, paths)
+    findings: List[dict] = []
+    stats: Dict[str, dict] = {}
+    misses: Dict[str, Dict[str, List[str]]] = {}  # analyzer -> cache key -> paths (identical files run once)
+
+    for analyzer in analyzers:
+        prefix, version = f"{analyzer.name}/{analyzer.digest()}", analyzer.version()
+        targets = [p for p in paths if p in shas and analyzer.handles(p)]
+        keys = {p: cache.key(shas[p], prefix, version) for p in targets}
+        cached = cache.get_many(list(set(keys.values())))
+        misses[analyzer.name] = {}
+        for path in targets:
+            if keys[path] in cached:
+                findings.extend(from_cached(cached[keys[path]], path))
+            else:
+                misses[analyzer.name].setdefault(keys[path], []).append(path)
+        stats[analyzer.name] = {
+            "files": len(targets),
+            "cached": sum(1 for p in targets if keys[p] in cached),
+            "scanned": sum(len(same) for same in misses[analyzer.name].values()),
+            "shards": 0,
+            "failed_shards": 0,
+        }
+
+    to_scan = sorted({same[0] for groups in misses.values() for same in groups.values()})
+    if to_scan:
+        with (checkout(to_scan) if checkout is not None else nullcontext(repo_path)) as work_dir:
+            sizes = {p: os.path.getsize(os.path.join(work_dir, p)) if os.path.exists(os.path.join(work_dir, p)) else 0
+                     for p in to_scan}
+            tasks = []
+            for analyzer in analyzers:
+                firsts = [same[0] for same in misses[analyzer.name].values()]
+                for shard in make_shards(firsts, sizes, shard_files):
+                    tasks.append((analyzer, shard))
+                stats[analyzer.name]["shards"] = sum(1 for a, _ in tasks if a is analyzer)
+            # Several shards share the cores: keep each Semgrep process single-threaded then
+            jobs = 1 if len(tasks) > 1 else None
+
+            results: Dict[str, tuple] = {}  # analyzer -> (findings by path, analyzed paths, errors)
+            with ThreadPoolExecutor(max_workers=max(1, min(workers, len(tasks)))) as pool:
+                futures = {pool.submit(_run_shard, a, work_dir, shard, sizes, jobs): (a, shard) for a, shard in tasks}
+                for future in as_completed(futures):
+                    analyzer, _ = futures[future]
+                    by_path, scanned, error_text = future.result()
+                    merged = results.setdefault(analyzer.name, ({}, set(), []))
+                    merged[0].update(by_path)
+                    merged[1].update(scanned)
+                    if error_text:
+                        merged[2].append(error_text)
+                        stats[analyzer.name]["failed_shards"] += 1
+
+        rows = []
+        for analyzer in analyzers:
+            by_path, scanned, shard_errors = results.get(analyzer.name, ({}, set(), []))
+            errors.extend(shard_errors)
+            for key, same in misses[analyzer.name].items():
+                stored = to_cached(by_path.get(same[0], []))
+                for path in same:
+                    findings.extend(from_cached(stored, path))
+                if same[0] in scanned:
+                    rows.append((key, stored))
+        cache.put_many(rows)
+
+    return {"findings": merge_findings(findings), "stats": stats, "errors": errors}
+
+
+# --- Cached Globals ---
+_timeouts: Dict[str, ShardTimeout] = {}
+_timeouts_lock = threading.Lock()
+
+
+def get_shard_timeout(analyzer) -> ShardTimeout:
+    """Timeout model per analyzer, shared across PRs so it keeps learning in batch runs."""
+    with _timeouts_lock:
+        if analyzer.name not in _timeouts:
+            _timeouts[analyzer.name] = ShardTimeout(analyzer.startup_seconds, analyzer.seconds_per_kb,
+                                                    analyzer.min_timeout, SEMGREP_TIMEOUT)
+        return _timeouts[analyzer.name]
@@ -0,0 +1,23 @@
+# conftest.py
+#
+# Responsible for:
+#  - Making the flat modules in "RAG_Version 1.3/" importable from the tests
+#  - Placeholder settings so config.py imports without a .env (no test talks to a service)
+#  - State and local index paths in a temporary directory, never in the checkout
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+for key, value in {
+    "OWNER": "test-owner",
+    "REPO": "test-repo",
+    "GITHUB_TOKEN": "test-token",
+    "GROQ_API_KEY": "test-key",
+    "VECTOR_BACKEND": "local",
+    "STATE_DIR": tempfile.mkdtemp(prefix="rag_state_"),
+    "LOCAL_INDEX_DIR": tempfile.mkdtemp(prefix="local_index_"),
+}.items():
+    os.environ.setdefault(key, value)
@@ -0,0 +1,92 @@
+import json
+import numpy as np
+from bandit import PromptBandit, REWARD_BASELINE, bandit_context
+
+PROMPTS = ["Zero-shot", "Few-shot", "Chain-of-Thought"]
+
+
+def _features(rng):
+    # 4 counts, signed net_changes, 9 flags (the layout of features_to_vector)
+    counts = rng.integers(0, 400, size=4)
+    return np.concatenate([counts, [counts[2] - counts[3]], rng.integers(0, 2, size=9)]).astype(float)
+
+
+def test_context_is_log_scaled_with_bias():
+    x = bandit_context([0, 9, 99, 999, -99] + [1] * 9)
+    assert len(x) == 15 and x[-1] == 1.0
+    assert np.allclose(x[:5], [0, np.log(10), np.log(100), np.log(1000), -np.log(100)])
+
+
+def test_rank_one_updates_match_the_direct_inverse():
+    rng = np.random.default_rng(0)
+    bandit = PromptBandit(PROMPTS, ridge=2.0, seed=0)
+    rows = {name: [] for name in PROMPTS}
+    for _ in range(40):
+        features, name, score = _features(rng), PROMPTS[rng.integers(3)], float(rng.uniform(1, 10))
+        bandit.update(features, name, score)
+        rows[name].append((bandit_context(features), score))
+
+    for name, observed in rows.items():
+        X = np.array([x for x, _ in observed])
+        r = np.array([score - REWARD_BASELINE for _, score in observed])
+        A_inv = np.linalg.inv(2.0 * np.eye(X.shape[1]) + X.T @ X)
+        arm = bandit.arms[name]
+        assert arm["n"] == len(observed)
+        assert np.allclose(arm["A_inv"], A_inv, atol=1e-8)
+        assert np.allclose(arm["b"], X.T @ r)
+
+
+def test_untried_arms_predict_the_baseline():
+    bandit = PromptBandit(PROMPTS, seed=0)
+    x = bandit._context(np.zeros(14))
+    mean, width = bandit.estimate("Few-shot", x)
+    assert mean == REWARD_BASELINE
+    assert np.isclose(width, np.sqrt(x @ x / bandit.ridge))
+
+
+def test_linucb_exploits_a_clearly_better_arm():
+    rng = np.random.default_rng(1)
+    bandit = PromptBandit(PROMPTS, policy="linucb", alpha=0.1, seed=0)
+    for _ in range(30):
+        for name, score in zip(PROMPTS, (3.0, 9.0, 4.0)):
+            bandit.update(_features(rng), name, score)
+    assert bandit.select(_features(rng)) == "Few-shot"
+
+
+def test_ties_go_to_the_least_tried_arm():
+    bandit = PromptBandit(PROMPTS, alpha=0.0, seed=0)
+    bandit.update(np.zeros(14), "Zero-shot", REWARD_BASELINE)
+    assert bandit.select(np.zeros(14)) == "Few-shot"
+
+
+def test_replay_skips_unknown_prompt_indices():
+    rng = np.random.default_rng(2)
+    features = [_features(rng) for _ in range(3)]
+    bandit = PromptBandit(PROMPTS, seed=0)
+    assert bandit.replay(features, [0, 7, 2], [6.0, 6.0, 8.0]) == 2
+    assert bandit.stats()["observations"] == {"Zero-shot": 1, "Chain-of-Thought": 1}
+
+
+def test_state_round_trips_through_json():
+    rng = np.random.default_rng(3)
+    bandit = PromptBandit(PROMPTS, seed=0)
+    for _ in range(10):
+        bandit.update(_features(rng), PROMPTS[rng.integers(3)], float(rng.uniform(1, 10)))
+
+    restored = PromptBandit(PROMPTS, seed=0)
+    assert restored.from_state(json.loads(json.dumps(bandit.to_state())))
+    probe = bandit._context(_features(rng))
+    for name in bandit.arms:
+        assert np.allclose(restored.estimate(name, probe), bandit.estimate(name, probe))
+
+
+def test_unusable_state_is_rejected():
+    bandit = PromptBandit(PROMPTS, ridge=1.0, seed=0)
+    bandit.update(np.ones(14), "Zero-shot", 7.0)
+    state = bandit.to_state()
+
+    assert not PromptBandit(PROMPTS, ridge=5.0).from_state(state)
+    assert not PromptBandit(PROMPTS).from_state(None)
+    broken = PromptBandit(PROMPTS)
+    assert not broken.from_state({"ridge": 1.0, "dim": 15, "arms": {"Zero-shot": {"b": []}}})
+    assert broken.arms == {} and broken.dim is None
@@ -0,0 +1,59 @@
+from code_splitter import CodeAwareSplitter, find_units
+
+
+def _big_class(methods=5, body_lines=9):
+    lines = ["import os", "", "class Big:", '    """Doc."""', "    attr = 1", ""]
+    for m in range(methods):
+        lines += [f"    def f{m}(self):"] + [f"        x{i} = {i}" for i in range(body_lines)] + [""]
+    return "\n".join(lines)
+
+
+def _assert_ranges_match(text, chunks):
+    lines = text.split("\n")
+    for body, start, end in chunks:
+        assert start <= end
+        assert body.strip("\n") in "\n".join(lines[start - 1:end])
+
+
+def test_oversize_python_class_is_cut_between_methods():
+    text = _big_class()
+    chunks = CodeAwareSplitter(code_chunk_size=300).split_code(text, "python")
+    _assert_ranges_match(text, chunks)
+    assert len(chunks) > 1
+    # Every chunk after the first starts at a method, never inside one
+    assert all(body.lstrip().startswith("def f") for body, _, _ in chunks[1:])
+
+
+def test_small_python_class_stays_one_unit():
+    text = _big_class(methods=2, body_lines=1)
+    # class Big: ... through the last method body (the trailing blank line is its own unit)
+    assert find_units(text, "python", max_chars=10_000) == [(0, 1), (2, 10), (11, 11)]
+
+
+def test_sub_split_pieces_get_their_own_line_ranges():
+    text = "def g():\n" + "\n".join(f"    y{i} = {i}" for i in range(60))
+    chunks = CodeAwareSplitter(code_chunk_size=300).split_code(text, "python")
+    _assert_ranges_match(text, chunks)
+    assert len(chunks) > 1
+    assert chunks[0][1] == 1 and chunks[-1][2] == 61
+    assert [start for _, start, _ in chunks] == sorted({start for _, start, _ in chunks})
+
+
+def test_brace_class_is_opened_per_member():
+    java = (
+        "@Entity\n"
+        "public class Foo extends Bar {\n"
+        "    private int x;\n"
+        "\n"
+        "    public void a() {\n"
+        "        if (x > 0) { x--; }\n"
+        "    }\n"
+        "\n"
+        "    public int b()\n"
+        "    {\n"
+        "        return \"}\".length();\n"
+        "    }\n"
+        "}"
+    )
+    assert find_units(java, "java") == [(0, 1), (2, 3), (4, 6), (7, 7), (8, 11), (12, 12)]
+    assert find_units("class A { int x; }", "java") == [(0, 0)]
@@ -0,0 +1,71 @@
+import pytest
+import context_packer
+from context_packer import TRUNCATION_MARK, _fit_item, count_tokens, pack_sections, section
+
+
+@pytest.fixture(autouse=True)
+def char_tokens(monkeypatch):
+    # The ~4 chars/token fallback: exact counts, whether or not tiktoken is installed
+    monkeypatch.setattr(context_packer, "_ENCODING", None)
+
+
+def _items(n, chars=40, prefix="x"):
+    return [f"{prefix}{i}".ljust(chars, prefix) for i in range(n)]
+
+
+def _lines(n, chars=28):
+    return "\n".join(f"line {i:02d} ".ljust(chars, "y") for i in range(n))
+
+
+def test_packed_output_never_exceeds_the_budget():
+    sections = [
+        section("diff", [_lines(12)] + _items(5, 60, "d"), 0.5),
+        section("findings", _items(7, 30, "f"), 0.2, joiner="\n\n"),
+        section("context", [_lines(30, 50)] + _items(20, 80, "c"), 0.3, joiner="\n---\n"),
+    ]
+    for budget in range(0, 900, 13):
+        packed, usage = pack_sections(sections, budget)
+        assert sum(u["tokens"] for u in usage.values()) <= budget
+        assert sum(count_tokens(text) for text in packed.values()) <= budget
+
+
+def test_unused_share_flows_to_the_other_sections():
+    # 10 tokens per context item, 1 per joiner; the diff needs 9 of its 50
+    sections = [section("diff", ["a" * 36], 0.5), section("context", _items(8), 0.5)]
+    packed, usage = pack_sections(sections, 100)
+    assert usage["diff"] == {"tokens": 9, "items": "1/1", "truncated": False}
+    assert usage["context"] == {"tokens": 87, "items": "8/8", "truncated": False}
+    assert packed["context"] == "\n".join(_items(8))
+
+
+def test_leftover_goes_to_the_highest_priority_section_first():
+    sections = [section("first", _items(10, prefix="a"), 0.3), section("second", _items(10, prefix="b"), 0.3)]
+    _, usage = pack_sections(sections, 100)
+    # Both fill their 30-token share with 2 whole items, then "first" takes the remaining 58
+    assert usage["second"] == {"tokens": 21, "items": "2/10", "truncated": True}
+    assert usage["first"] == {"tokens": 76, "items": "7/10", "truncated": True}
+
+
+def test_last_item_is_cut_line_aligned_when_leftover_allows():
+    sections = [section("diff", [_lines(20)], 0.5), section("context", _items(2), 0.5)]
+    packed, usage = pack_sections(sections, 100)
+    assert usage["context"]["tokens"] == 21
+    assert packed["diff"].endswith(TRUNCATION_MARK)
+    kept = packed["diff"][:-len(TRUNCATION_MARK)].split("\n")
+    assert kept == _lines(20).split("\n")[:len(kept)]
+    assert usage["diff"] == {"tokens": count_tokens(packed["diff"]), "items": "1/1", "truncated": True}
+
+
+def test_fit_item_keeps_the_longest_line_prefix():
+    item = _lines(10)
+    text, tokens = _fit_item(item, 30)
+    lines = item.split("\n")
+    assert text == "\n".join(lines[:3]) + TRUNCATION_MARK
+    assert tokens == count_tokens(text) <= 30
+    # One more line would not have fit
+    assert count_tokens("\n".join(lines[:4]) + TRUNCATION_MARK) > 30
+
+
+def test_fit_item_returns_nothing_when_no_line_fits():
+    assert _fit_item(_lines(3), 3) == ("", 0)
+    assert _fit_item("x" * 400, 50) == ("", 0)
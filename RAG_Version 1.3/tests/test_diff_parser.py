@@ -0,0 +1,107 @@
+from diff_parser import parse_diff_lines
+
+
+def _parse(text):
+    return parse_diff_lines(text.splitlines())
+
+
+def test_git_diff_counts_and_hunk_ranges():
+    parsed = _parse(
+        "diff --git a/app/main.py b/app/main.py\n"
+        "index 1111111..2222222 100644\n"
+        "--- a/app/main.py\n"
+        "+++ b/app/main.py\n"
+        "@@ -1,3 +1,4 @@ def main():\n"
+        " import os\n"
+        "--- removed line that looks like a header\n"
+        "+added = 1\n"
+        "+another = 2\n"
+        " print(os.getcwd())\n"
+    )
+    [f] = parsed.files
+    assert (f.old_path, f.new_path, f.status, f.language) == ("app/main.py", "app/main.py", "modified", "python")
+    assert (parsed.additions, parsed.deletions) == (2, 1)
+    [hunk] = f.hunks
+    assert hunk.context == "def main():"
+    assert f.added_ranges() == [(2, 3)]
+
+
+def test_git_rename_with_edits():
+    parsed = _parse(
+        "diff --git a/src/Old.java b/src/New.java\n"
+        "similarity index 90%\n"
+        "rename from src/Old.java\n"
+        "rename to src/New.java\n"
+        "--- a/src/Old.java\n"
+        "+++ b/src/New.java\n"
+        "@@ -1 +1 @@\n"
+        "-class Old {}\n"
+        "+class New {}\n"
+    )
+    [f] = parsed.files
+    assert (f.old_path, f.new_path, f.path) == ("src/Old.java", "src/New.java", "src/New.java")
+    assert f.status == "renamed" and f.language == "java"
+    assert (f.additions, f.deletions) == (1, 1)
+
+
+def test_pure_rename_has_no_hunks():
+    parsed = _parse(
+        "diff --git a/a.go b/b.go\n"
+        "similarity index 100%\n"
+        "rename from a.go\n"
+        "rename to b.go\n"
+    )
+    [f] = parsed.files
+    assert f.status == "renamed" and f.path == "b.go" and f.hunks == []
+
+
+def test_binary_added_and_deleted_files():
+    parsed = _parse(
+        "diff --git a/logo.png b/logo.png\n"
+        "index 1111111..2222222 100644\n"
+        "Binary files a/logo.png and b/logo.png differ\n"
+        "diff --git a/new.rs b/new.rs\n"
+        "new file mode 100644\n"
+        "--- /dev/null\n"
+        "+++ b/new.rs\n"
+        "@@ -0,0 +1 @@\n"
+        "+fn main() {}\n"
+        "diff --git a/gone.rb b/gone.rb\n"
+        "deleted file mode 100644\n"
+        "--- a/gone.rb\n"
+        "+++ /dev/null\n"
+        "@@ -1 +0,0 @@\n"
+        "-puts 1\n"
+    )
+    assert [(f.path, f.status) for f in parsed.files] == [
+        ("logo.png", "binary"), ("new.rs", "added"), ("gone.rb", "deleted"),
+    ]
+    assert parsed.files[0].hunks == []
+    assert parsed.files_by_language() == {"rust": ["new.rs"]}
+    assert parsed.files_by_language(include_deleted=True) == {"rust": ["new.rs"], "ruby": ["gone.rb"]}
+
+
+def test_plain_multi_file_diff_starts_a_file_at_each_header():
+    parsed = _parse(
+        "--- x.py\t2024-01-01 00:00:00\n"
+        "+++ x.py\t2024-01-02 00:00:00\n"
+        "@@ -1 +1 @@\n"
+        "-a = 1\n"
+        "+a = 2\n"
+        "--- /dev/null\n"
+        "+++ y.js\n"
+        "@@ -0,0 +1,2 @@\n"
+        "+let b = 1;\n"
+        "+let c = 2;\n"
+    )
+    assert [(f.path, f.status, f.language) for f in parsed.files] == [
+        ("x.py", "modified", "python"), ("y.js", "added", "javascript"),
+    ]
+    assert [(f.additions, f.deletions) for f in parsed.files] == [(1, 1), (2, 0)]
+
+
+def test_bare_hunk_without_headers():
+    parsed = _parse("@@ -1 +1,2 @@\n-x\n+y\n+z\n\\ No newline at end of file\n")
+    [f] = parsed.files
+    assert (f.additions, f.deletions) == (2, 1)
+    assert f.hunks[0].lines[-1] == "\\ No newline at end of file"
@@ -0,0 +1,91 @@
+import hashlib
+import itertools
+import sqlite3
+import pytest
+import embedding_cache
+from embedding_cache import CachedEmbeddings
+
+
+class CountingEmbedder:
+    """Vector = [len(text), call number]; records what reached the model."""
+
+    def __init__(self):
+        self.documents = []
+        self.queries = []
+
+    def embed_documents(self, texts):
+        self.documents.append(list(texts))
+        return [[float(len(t)), float(len(self.documents))] for t in texts]
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return [float(len(text)), -1.0]
+
+
+@pytest.fixture(autouse=True)
+def ticking_clock(monkeypatch):
+    # One tick per read: "least recently used" never depends on clock resolution
+    clock = itertools.count(1)
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: float(next(clock)))
+
+
+def _cache(tmp_path, max_entries=100):
+    model = CountingEmbedder()
+    return model, CachedEmbeddings(model, "mini", path=str(tmp_path / "emb.sqlite"), max_entries=max_entries)
+
+
+def _keys(tmp_path):
+    with sqlite3.connect(str(tmp_path / "emb.sqlite")) as conn:
+        return sorted(key for (key,) in conn.execute("SELECT key FROM embeddings"))
+
+
+def _sha(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def test_keys_are_model_kind_and_text_sha(tmp_path):
+    _, cache = _cache(tmp_path)
+    cache.embed_documents(["def a(): pass"])
+    cache.embed_query("def a(): pass")
+    # The same text as a document and as a query is two entries (models may embed them differently)
+    assert _keys(tmp_path) == sorted([f"mini:doc:{_sha('def a(): pass')}", f"mini:query:{_sha('def a(): pass')}"])
+
+
+def test_only_unique_misses_reach_the_model(tmp_path):
+    model, cache = _cache(tmp_path)
+    first = cache.embed_documents(["alpha", "beta", "alpha"])
+    assert model.documents == [["alpha", "beta"]]
+    assert first[0] == first[2]
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+    again = cache.embed_documents(["beta", "gamma", "alpha"])
+    assert model.documents[-1] == ["gamma"]
+    assert again[0] == first[1] and again[2] == first[0]
+    assert cache.stats() == {"hits": 3, "misses": 3, "hit_rate": 0.5, "entries": 3, "max_entries": 100}
+
+
+def test_cached_vectors_survive_a_reopen(tmp_path):
+    _, cache = _cache(tmp_path)
+    vectors = cache.embed_documents(["alpha", "beta"])
+
+    model, reopened = _cache(tmp_path)
+    assert reopened.embed_documents(["alpha", "beta"]) == vectors
+    assert model.documents == []
+    assert reopened.stats()["hit_rate"] == 1.0
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    model, cache = _cache(tmp_path, max_entries=3)
+    for text in ("a", "b", "c"):
+        cache.embed_documents([text])
+    cache.embed_documents(["a"])  # "a" is now more recent than "b" and "c"
+
+    cache.embed_documents(["d"])
+    assert cache.stats()["entries"] == 3
+    assert f"mini:doc:{_sha('b')}" not in _keys(tmp_path)
+
+    model.documents.clear()
+    cache.embed_documents(["a", "c", "d"])
+    assert model.documents == []
+    cache.embed_documents(["b"])
+    assert model.documents == [["b"]]
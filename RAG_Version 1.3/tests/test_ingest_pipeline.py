@@ -0,0 +1,132 @@
+import os
+from contextlib import nullcontext
+import pytest
+from git import Repo
+from ingest_pipeline import run_ingest
+from ingest_state import index_identity, load_ingest_state, save_ingest_state
+from lexical_index import LexicalIndex
+from local_vector_store import LocalVectorStore
+
+
+class CountingEmbeddings:
+    """Records every text it embeds; returns the same small vector for all of them."""
+
+    def __init__(self):
+        self.texts = []
+
+    def embed_documents(self, texts):
+        self.texts.extend(texts)
+        return [[1.0, 0.0, 0.0] for _ in texts]
+
+    def embed_query(self, text):
+        return [1.0, 0.0, 0.0]
+
+
+class Workspace:
+    """A git repo plus the index, state file and lexical index of one ingest setup."""
+
+    def __init__(self, tmp_path):
+        self.root = str(tmp_path / "repo")
+        self.repo = Repo.init(self.root)
+        with self.repo.config_writer() as config:
+            config.set_value("user", "name", "test")
+            config.set_value("user", "email", "test@example.com")
+        self.index = LocalVectorStore(str(tmp_path / "index"))
+        self.state_path = str(tmp_path / "ingest_state.json")
+        self.lexical_path = str(tmp_path / "lexical.sqlite")
+        self.embeddings = CountingEmbeddings()
+
+    def write(self, path, text):
+        with open(os.path.join(self.root, path), "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def commit(self):
+        self.repo.git.add(A=True)
+        self.repo.git.commit("-q", "-m", "change")
+        return self.repo.head.commit.hexsha
+
+    def ingest(self, head, checkout=None, full_rebuild=False):
+        self.embeddings.texts = []
+        return run_ingest(self.repo, head, checkout or (lambda: nullcontext(self.root)), full_rebuild,
+                          index=self.index, embeddings=self.embeddings, repo_name="test-repo",
+                          state_path=self.state_path, lexical_path=self.lexical_path)
+
+    def state(self):
+        return load_ingest_state(index_identity(), "test-repo", self.state_path)
+
+    def ids(self):
+        return sorted(vid for page in self.index.list() for vid in page)
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    ws = Workspace(tmp_path)
+    ws.write("a.py", "def alpha():\n    return 1\n")
+    ws.write("b.py", "def beta():\n    return 2\n")
+    return ws
+
+
+def _no_checkout():
+    raise AssertionError("nothing to ingest, the checkout must not be entered")
+
+
+def test_state_at_head_is_up_to_date(workspace):
+    head = workspace.commit()
+    assert workspace.ingest(head) == "full"
+    assert workspace.state()["commit"] == head
+    ids = workspace.ids()
+    assert len(ids) == 2
+
+    assert workspace.ingest(head, checkout=_no_checkout) == "up_to_date"
+    assert workspace.embeddings.texts == []
+    assert workspace.ids() == ids
+
+
+def test_incremental_run_embeds_only_changed_files(workspace):
+    workspace.ingest(workspace.commit())
+    a_ids = workspace.state()["files"]["a.py"]
+
+    workspace.write("b.py", "def beta():\n    return 3\n")
+    workspace.write("c.py", "def gamma():\n    return 4\n")
+    head = workspace.commit()
+    assert workspace.ingest(head) == "incremental"
+    assert sorted(workspace.embeddings.texts) == ["def beta():\n    return 3", "def gamma():\n    return 4"]
+
+    files = workspace.state()["files"]
+    assert files["a.py"] == a_ids
+    assert workspace.ids() == sorted(vid for ids in files.values() for vid in ids)
+
+    os.remove(os.path.join(workspace.root, "c.py"))
+    assert workspace.ingest(workspace.commit()) == "incremental"
+    assert "c.py" not in workspace.state()["files"]
+    assert len(workspace.ids()) == 2
+
+
+def test_missing_old_commit_falls_back_to_full_rebuild(workspace):
+    head = workspace.commit()
+    workspace.ingest(head)
+    # State from a commit this clone does not have (e.g. after a force-push)
+    state = workspace.state()
+    save_ingest_state(index_identity(), "test-repo", "f" * 40, state["files"], workspace.state_path)
+    workspace.index.upsert([{"id": "other-repo#a#0#x", "values": [0.0, 1.0, 0.0], "metadata": {"text": "x"}}])
+    workspace.index.persist()
+
+    assert workspace.ingest(head) == "full"
+    # Unchanged chunks keep their IDs, so a rebuild re-embeds but leaves the ID set as it was
+    assert len(workspace.embeddings.texts) == 2
+    assert workspace.state()["commit"] == head
+    assert workspace.state()["files"] == state["files"]
+    # Reconciliation stays under this repo's prefix
+    assert "other-repo#a#0#x" in workspace.ids()
+
+
+def test_empty_lexical_index_forces_full_rebuild(workspace):
+    workspace.ingest(workspace.commit())
+    lexical = LexicalIndex(workspace.lexical_path)
+    lexical.clear()
+    lexical.persist()
+
+    workspace.write("c.py", "def gamma():\n    return 4\n")
+    assert workspace.ingest(workspace.commit()) == "full"
+    assert len(workspace.embeddings.texts) == 3
+    assert len(LexicalIndex(workspace.lexical_path)) == 3
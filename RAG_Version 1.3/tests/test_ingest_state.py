@@ -0,0 +1,113 @@
+import os
+from git import Repo
+from langchain_core.documents import Document
+from ingest_pipeline import assign_ids, id_prefix
+from ingest_state import DELETE_BATCH_SIZE, delete_vectors, diff_since, reconcile_index
+from local_vector_store import LocalVectorStore, TEXT_KEY
+
+
+def _write(root, path, text):
+    with open(os.path.join(root, path), "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def _commit(repo, message):
+    repo.git.add(A=True)
+    repo.git.commit("-q", "-m", message)
+    return repo.head.commit.hexsha
+
+
+def _repo(tmp_path):
+    repo = Repo.init(str(tmp_path))
+    with repo.config_writer() as config:
+        config.set_value("user", "name", "test")
+        config.set_value("user", "email", "test@example.com")
+    return repo
+
+
+def _store(tmp_path, ids):
+    store = LocalVectorStore(str(tmp_path / "index"))
+    store.upsert([{"id": vid, "values": [1.0, 0.0], "metadata": {TEXT_KEY: vid}} for vid in ids])
+    store.persist()
+    return store
+
+
+def _ids(store):
+    return sorted(vid for page in store.list() for vid in page)
+
+
+def test_diff_since_classifies_add_modify_rename_delete(tmp_path):
+    repo = _repo(tmp_path)
+    for name in ("keep.py", "edit.py", "move.py", "gone.py"):
+        _write(tmp_path, name, f"def {name[:-3]}():\n    return '{name}' * 20\n")
+    old = _commit(repo, "one")
+
+    _write(tmp_path, "edit.py", "def edit():\n    return 2\n")
+    repo.git.mv("move.py", "moved.py")
+    os.remove(tmp_path / "gone.py")
+    _write(tmp_path, "new.py", "def new():\n    return 3\n")
+    new = _commit(repo, "two")
+
+    to_embed, to_remove = diff_since(repo, old, new)
+    # Modified and renamed files are removed and embedded again; unchanged files are not touched
+    assert sorted(to_embed) == ["edit.py", "moved.py", "new.py"]
+    assert sorted(to_remove) == ["edit.py", "gone.py", "move.py"]
+    assert diff_since(repo, new, new) == ([], [])
+
+
+def test_diff_since_unknown_commit_asks_for_a_full_rebuild(tmp_path):
+    repo = _repo(tmp_path)
+    _write(tmp_path, "a.py", "x = 1\n")
+    head = _commit(repo, "one")
+    assert diff_since(repo, "0" * 40, head) is None
+
+
+def test_unchanged_chunks_keep_their_ids(tmp_path):
+    source = str(tmp_path / "pkg" / "a.py")
+    first = [Document(page_content=text, metadata={"source": source}) for text in ("def a(): pass", "def b(): pass")]
+    manifest = {}
+    ids = [vid for vid, _ in assign_ids(first, str(tmp_path), "test-repo", manifest)]
+    assert manifest == {"pkg/a.py": ids}
+    assert all(vid.startswith(id_prefix("test-repo")) for vid in ids)
+
+    # Second chunk rewritten: only it is yielded for upload, the first keeps its ID
+    second = [Document(page_content=text, metadata={"source": source}) for text in ("def a(): pass", "def b(): return 1")]
+    rerun = {}
+    uploads = list(assign_ids(second, str(tmp_path), "test-repo", rerun, known_ids=set(ids)))
+    assert [chunk.page_content for _, chunk in uploads] == ["def b(): return 1"]
+    assert rerun["pkg/a.py"][0] == ids[0]
+    assert rerun["pkg/a.py"][1] != ids[1]
+    assert uploads[0][1].metadata["chunk_id"] == rerun["pkg/a.py"][1]
+
+
+def test_delete_vectors_removes_ids_in_batches(tmp_path):
+    store = _store(tmp_path, ["test-repo#a#0#x", "test-repo#a#1#y", "test-repo#b#0#z"])
+    delete_vectors(store, ["test-repo#a#0#x", "test-repo#a#1#y"])
+    store.persist()
+    assert _ids(store) == ["test-repo#b#0#z"]
+
+    class Recorder:
+        def __init__(self):
+            self.calls = []
+
+        def delete(self, ids):
+            self.calls.append(len(ids))
+
+    recorder = Recorder()
+    delete_vectors(recorder, [str(i) for i in range(DELETE_BATCH_SIZE + 1)])
+    assert recorder.calls == [DELETE_BATCH_SIZE, 1]
+
+
+def test_reconcile_only_purges_ids_under_the_repo_prefix(tmp_path):
+    live = {"test-repo#a#0#x"}
+    store = _store(tmp_path, ["test-repo#a#0#x", "test-repo#old#0#y", "other-repo#a#0#x", "3f2b9c1e-legacy"])
+
+    assert reconcile_index(store, id_prefix("test-repo"), live) == 1
+    store.persist()
+    # Another repo's vectors and unprefixed IDs are left alone
+    assert _ids(store) == ["3f2b9c1e-legacy", "other-repo#a#0#x", "test-repo#a#0#x"]
+
+    # purge_legacy also drops IDs that are not in the deterministic format at all
+    assert reconcile_index(store, id_prefix("test-repo"), live, purge_legacy=True) == 1
+    store.persist()
+    assert _ids(store) == ["other-repo#a#0#x", "test-repo#a#0#x"]
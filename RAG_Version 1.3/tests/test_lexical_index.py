@@ -0,0 +1,86 @@
+from langchain_core.documents import Document
+from lexical_index import LexicalIndex, TEXT_KEY, doc_key, reciprocal_rank_fusion, tokenize
+
+
+def _record(vid, text, **metadata):
+    # "values" are ignored by the lexical index, as they are for chunks sent by ingest
+    return {"id": vid, "values": [0.0], "metadata": {TEXT_KEY: text, "chunk_id": vid, **metadata}}
+
+
+def _index(tmp_path, records=(), identity="local:/idx/test-repo"):
+    index = LexicalIndex(str(tmp_path / "lexical.sqlite"), identity=identity)
+    index.upsert(vectors=list(records))
+    index.persist()
+    return index
+
+
+def test_tokenize_splits_identifiers():
+    assert tokenize("getUserName(MAX_FILE_BYTES)") == [
+        "getusername", "get", "user", "name", "max_file_bytes", "max", "file", "bytes",
+    ]
+    assert tokenize("return self.x") == []
+
+
+def test_bm25_ranks_rare_terms_and_short_chunks_first(tmp_path):
+    index = _index(tmp_path, [
+        _record("r#a.py#0", "def parse_config(path): return load(path)"),
+        _record("r#b.py#0", "def load(path): return open(path).read() " + "filler words here " * 20),
+        _record("r#c.py#0", "def load(path): return open(path).read()"),
+    ])
+    # "parse_config" only occurs in a.py
+    assert [vid for vid, _ in index.search_ids("parse_config", k=3)] == ["r#a.py#0"]
+    # Same term frequency: the shorter chunk scores higher
+    ranked = index.search_ids("open read", k=3)
+    assert [vid for vid, _ in ranked] == ["r#c.py#0", "r#b.py#0"]
+    assert ranked[0][1] > ranked[1][1] > 0
+    assert index.search_ids("nothing_matches", k=3) == []
+
+
+def test_search_returns_stored_text_and_metadata(tmp_path):
+    index = _index(tmp_path, [_record("r#a.py#0", "def parse_config(path): pass", source="a.py")])
+    [(doc, score)] = index.search("parse config", k=1)
+    assert doc.id == "r#a.py#0"
+    assert doc.page_content == "def parse_config(path): pass"
+    assert doc.metadata == {"chunk_id": "r#a.py#0", "source": "a.py"}
+    assert score > 0
+
+
+def test_stale_ids_disappear_from_search_and_list(tmp_path):
+    index = _index(tmp_path, [_record("r#a.py#0", "alpha_handler"), _record("r#a.py#1", "alpha_handler beta"),
+                              _record("r#b.py#0", "gamma")])
+    assert len(index.search_ids("alpha_handler", k=5)) == 2
+
+    index.delete(ids=["r#a.py#0", "r#a.py#1"])
+    index.persist()
+    assert index.search_ids("alpha_handler", k=5) == []
+    assert [vid for page in index.list(prefix="r#") for vid in page] == ["r#b.py#0"]
+    assert len(index) == 1
+
+
+def test_upsert_replaces_chunk_text(tmp_path):
+    index = _index(tmp_path, [_record("r#a.py#0", "legacyHandler")])
+    index.upsert(vectors=[_record("r#a.py#0", "streamWriter")])
+    assert index.search_ids("legacyHandler", k=5) == []
+    assert [vid for vid, _ in index.search_ids("streamWriter", k=5)] == ["r#a.py#0"]
+
+
+def test_identity_mismatch_clears_the_index(tmp_path):
+    _index(tmp_path, [_record("r#a.py#0", "alpha")], identity="local:/idx/one")
+    reader = LexicalIndex(str(tmp_path / "lexical.sqlite"))
+    assert reader.stored_identity() == "local:/idx/one" and len(reader) == 1
+
+    writer = LexicalIndex(str(tmp_path / "lexical.sqlite"), identity="local:/idx/two")
+    assert writer.stored_identity() == "local:/idx/two"
+    assert len(writer) == 0
+
+
+def test_fusion_merges_vector_and_lexical_hits_of_the_same_chunk():
+    # Vector stores may drop Document.id; the chunk_id stored in the metadata still matches
+    vector_hit = Document(page_content="def load(path): ...", metadata={"chunk_id": "r#a.py#0"})
+    other_hit = Document(page_content="def save(path): ...", metadata={"chunk_id": "r#b.py#0"})
+    lexical_hit = Document(id="r#a.py#0", page_content="def load(path): ...", metadata={"chunk_id": "r#a.py#0"})
+
+    assert doc_key(vector_hit) == doc_key(lexical_hit) == "r#a.py#0"
+    fused = reciprocal_rank_fusion([[(other_hit, 0.9), (vector_hit, 0.8)], [(lexical_hit, 7.5)]], rrf_k=60)
+    assert [doc_key(doc) for doc, _ in fused] == ["r#a.py#0", "r#b.py#0"]
+    assert fused[0][1] == 1 / 62 + 1 / 61
@@ -0,0 +1,153 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import llm_guard
+from llm_guard import GuardedLLM, LatencyTracker, LLMDeadlineExceeded, is_transient
+
+
+class ServerError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class ScriptedLLM:
+    """
+    Plays back one scripted step per request: a value is returned, an exception
+    raised, and a threading.Event blocks the request until the test sets it.
+    For streams, a step is a list of chunks (an exception in it is raised there).
+    """
+
+    def __init__(self, *steps):
+        self.steps = list(steps)
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def _next(self):
+        with self._lock:
+            self.requests += 1
+            return self.steps.pop(0)
+
+    def invoke(self, prompt_input, config=None):
+        step = self._next()
+        if isinstance(step, threading.Event):
+            step.wait()
+            return "late"
+        if isinstance(step, Exception):
+            raise step
+        return step
+
+    def stream(self, prompt_input, config=None):
+        for chunk in self._next():
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    # Full-jitter backoff drawn as 0: retries happen immediately and the tests stay deterministic
+    monkeypatch.setattr(llm_guard.random, "uniform", lambda low, high: 0.0)
+
+
+@pytest.fixture
+def executor():
+    pool = ThreadPoolExecutor(max_workers=8)
+    yield pool
+    pool.shutdown(wait=False)
+
+
+def _guarded(llm, executor, tracker=None, **policy):
+    policy = {"timeout": 5.0, "deadline": 10.0, "max_retries": 3, "hedge": False, **policy}
+    return GuardedLLM(llm, "test_prompt", tracker or LatencyTracker(), executor, **policy)
+
+
+def _stats(guarded):
+    return guarded.tracker.snapshot()["test_prompt"]
+
+
+def test_transient_errors_are_classified():
+    assert is_transient(TimeoutError())
+    assert is_transient(ServerError(503)) and is_transient(ServerError(429))
+    assert not is_transient(ServerError(400))
+    assert not is_transient(ValueError("bad prompt"))
+
+
+def test_transient_failure_is_retried_then_succeeds(executor):
+    llm = ScriptedLLM(ServerError(503), "review")
+    guarded = _guarded(llm, executor)
+    assert guarded.invoke("prompt") == "review"
+    assert llm.requests == 2
+    stats = _stats(guarded)
+    assert (stats["ok"], stats["failed"], stats["retries"]) == (1, 0, 1)
+
+
+def test_non_transient_error_is_raised_immediately(executor):
+    llm = ScriptedLLM(ServerError(400), "never reached")
+    guarded = _guarded(llm, executor)
+    with pytest.raises(ServerError):
+        guarded.invoke("prompt")
+    assert llm.requests == 1
+    stats = _stats(guarded)
+    assert (stats["failed"], stats["retries"]) == (1, 0)
+
+
+def test_deadline_bounds_the_call_retries_included(executor):
+    release = threading.Event()
+    llm = ScriptedLLM(*[release] * 20)
+    guarded = _guarded(llm, executor, timeout=0.1, deadline=0.35, max_retries=20)
+    started = time.monotonic()
+    try:
+        with pytest.raises(LLMDeadlineExceeded):
+            guarded.invoke("prompt")
+        elapsed = time.monotonic() - started
+    finally:
+        release.set()
+    assert 0.3 <= elapsed < 1.0
+    # Each request timed out on its own; retries stop at the deadline, not at max_retries
+    stats = _stats(guarded)
+    assert stats["timeouts"] >= 3 and stats["retries"] == stats["timeouts"] - 1 and stats["failed"] == 1
+
+
+def test_hedge_wins_when_the_primary_outlives_the_p95(executor):
+    tracker = LatencyTracker(hedge_min_samples=3)
+    for secs in (0.01, 0.02, 0.03):
+        tracker.observe_request("test_prompt", secs)
+    release = threading.Event()
+    llm = ScriptedLLM(release, "hedged answer")
+    guarded = _guarded(llm, executor, tracker=tracker, hedge=True)
+    try:
+        assert guarded.invoke("prompt") == "hedged answer"
+    finally:
+        release.set()
+    stats = _stats(guarded)
+    assert (stats["hedges"], stats["hedge_wins"], stats["retries"]) == (1, 1, 0)
+
+
+def test_no_hedge_before_enough_samples(executor):
+    llm = ScriptedLLM("answer")
+    guarded = _guarded(llm, executor, tracker=LatencyTracker(hedge_min_samples=3), hedge=True)
+    assert guarded.invoke("prompt") == "answer"
+    assert _stats(guarded)["hedges"] == 0
+
+
+def test_stream_retries_a_failure_before_the_first_chunk(executor):
+    llm = ScriptedLLM([ServerError(502)], ["par", "tial", " review"])
+    guarded = _guarded(llm, executor)
+    assert list(guarded.stream("prompt")) == ["par", "tial", " review"]
+    assert llm.requests == 2
+    assert _stats(guarded)["retries"] == 1
+
+
+def test_stream_is_not_retried_once_a_chunk_was_yielded(executor):
+    llm = ScriptedLLM(["first", ServerError(503)], ["never", "replayed"])
+    guarded = _guarded(llm, executor)
+    received = []
+    with pytest.raises(ServerError):
+        for chunk in guarded.stream("prompt"):
+            received.append(chunk)
+    assert received == ["first"]
+    assert llm.requests == 1
+    stats = _stats(guarded)
+    assert (stats["failed"], stats["retries"]) == (1, 0)
@@ -0,0 +1,101 @@
+import numpy as np
+from local_vector_store import LocalVectorStore, TEXT_KEY
+
+
+class FixedEmbeddings:
+    """Maps known texts to fixed vectors."""
+
+    def __init__(self, table):
+        self.table = table
+
+    def embed_query(self, text):
+        return self.table[text]
+
+    def embed_documents(self, texts):
+        return [self.table[t] for t in texts]
+
+
+def _record(vid, values, text, **metadata):
+    return {"id": vid, "values": values, "metadata": {TEXT_KEY: text, **metadata}}
+
+
+def _ids(store, prefix=None):
+    return [vid for page in store.list(prefix=prefix) for vid in page]
+
+
+def test_upsert_is_buffered_until_persist(tmp_path):
+    store = LocalVectorStore(str(tmp_path))
+    store.upsert([_record("r#a.py#0", [1, 0, 0], "alpha")])
+    assert len(store) == 0 and _ids(store) == []
+
+    store.persist()
+    assert len(store) == 1
+    assert _ids(store) == ["r#a.py#0"]
+
+
+def test_search_round_trip_and_reopen(tmp_path):
+    store = LocalVectorStore(str(tmp_path))
+    store.upsert([
+        _record("r#a.py#0", [1, 0, 0], "alpha", source="a.py"),
+        _record("r#b.py#0", [0, 1, 0], "beta", source="b.py"),
+        _record("r#c.py#0", [1, 1, 0], "gamma", source="c.py"),
+    ])
+    store.persist()
+
+    reopened = LocalVectorStore(str(tmp_path), FixedEmbeddings({"q": [1, 0.1, 0]}))
+    hits = reopened.similarity_search_with_score("q", k=2)
+    assert [doc.id for doc, _ in hits] == ["r#a.py#0", "r#c.py#0"]
+    doc, score = hits[0]
+    assert doc.page_content == "alpha"
+    assert doc.metadata == {"source": "a.py"}
+    assert np.isclose(score, 1 / np.sqrt(1.01), atol=1e-6)
+
+
+def test_upsert_replaces_existing_id(tmp_path):
+    store = LocalVectorStore(str(tmp_path))
+    store.upsert([_record("r#a.py#0", [1, 0], "old")])
+    store.persist()
+    store.upsert([_record("r#a.py#0", [0, 1], "new")])
+    store.persist()
+
+    assert len(store) == 1
+    [(doc, score)] = store.similarity_search_by_vector_with_score([0, 1], k=5)
+    assert doc.page_content == "new" and np.isclose(score, 1.0)
+
+
+def test_delete_compacts_rows(tmp_path):
+    store = LocalVectorStore(str(tmp_path))
+    store.upsert([_record(f"r#f{i}.py#0", [i + 1, 1], f"chunk {i}") for i in range(3)])
+    store.persist()
+
+    assert store.delete(ids=["r#f1.py#0"])
+    store.persist()
+    assert len(store) == 2
+    assert _ids(store) == ["r#f0.py#0", "r#f2.py#0"]
+    hits = store.similarity_search_by_vector_with_score([1, 0], k=5)
+    assert {doc.id for doc, _ in hits} == {"r#f0.py#0", "r#f2.py#0"}
+
+
+def test_delete_drops_pending_upsert(tmp_path):
+    store = LocalVectorStore(str(tmp_path))
+    store.upsert([_record("r#a.py#0", [1, 0], "alpha")])
+    store.delete(ids=["r#a.py#0"])
+    store.persist()
+    assert len(store) == 0
+
+
+def test_list_filters_by_prefix_and_pages(tmp_path, monkeypatch):
+    monkeypatch.setattr("local_vector_store.LIST_PAGE_SIZE", 2)
+    store = LocalVectorStore(str(tmp_path))
+    store.upsert([_record(f"r#a.py#{i}", [1, i], "a") for i in range(3)] + [_record("r#b.py#0", [0, 1], "b")])
+    store.persist()
+
+    pages = list(store.list(prefix="r#a.py#"))
+    assert [len(page) for page in pages] == [2, 1]
+    assert sorted(vid for page in pages for vid in page) == ["r#a.py#0", "r#a.py#1", "r#a.py#2"]
+    assert _ids(store, prefix="r#b") == ["r#b.py#0"]
+
+
+def test_empty_store_search(tmp_path):
+    store = LocalVectorStore(str(tmp_path))
+    assert store.similarity_search_by_vector_with_score([1, 0], k=3) == []
@@ -0,0 +1,168 @@
+import subprocess
+from contextlib import contextmanager
+import pytest
+from git import Repo
+import static_analyzers
+from semgrep_cache import FindingsCache
+from static_analyzers import ShardTimeout, analyze, make_shards, merge_findings
+
+
+def _finding(path, line, rule="R1", severity="WARNING", tool="stub", message="problem"):
+    return {"tool": tool, "rule": rule, "severity": severity, "path": path,
+            "line": line, "end_line": line, "message": message, "code": ""}
+
+
+class StubAnalyzer:
+    """One WARNING on line 1 of every file it runs on; paths in `slow` time out like a stuck process."""
+
+    name = "stub"
+    startup_seconds, seconds_per_kb, min_timeout = 1.0, 0.0, 1.0
+    slow = set()
+    runs = []
+
+    def available(self):
+        return True
+
+    def handles(self, path):
+        return path.endswith(".py")
+
+    def version(self):
+        return "1.0"
+
+    def digest(self):
+        return "rules"
+
+    def run(self, work_dir, paths, timeout, jobs):
+        type(self).runs.append(sorted(paths))
+        if self.slow & set(paths):
+            raise subprocess.TimeoutExpired(["stub", *paths], timeout)
+        return {p: [_finding(p, 1)] for p in paths}, set(paths), ""
+
+
+@pytest.fixture
+def stub(monkeypatch, tmp_path):
+    monkeypatch.setitem(static_analyzers.ANALYZERS, "stub", StubAnalyzer)
+    monkeypatch.setattr(StubAnalyzer, "slow", set())
+    monkeypatch.setattr(StubAnalyzer, "runs", [])
+    monkeypatch.setattr(static_analyzers, "_timeouts", {})
+    cache = FindingsCache(str(tmp_path / "findings.sqlite"))
+    monkeypatch.setattr(static_analyzers, "get_findings_cache", lambda: cache)
+    return StubAnalyzer
+
+
+@pytest.fixture
+def repo(tmp_path):
+    root = tmp_path / "repo"
+    repo = Repo.init(str(root))
+    with repo.config_writer() as config:
+        config.set_value("user", "name", "test")
+        config.set_value("user", "email", "test@example.com")
+    for name in ("a.py", "b.py", "slow.py"):
+        (root / name).write_text(f"def {name[:-3]}():\n    return '{name}'\n")
+    (root / "same.py").write_text((root / "a.py").read_text())
+    repo.git.add(A=True)
+    repo.git.commit("-q", "-m", "files")
+    return str(root)
+
+
+class Checkouts:
+    """Records the paths every checkout was asked for."""
+
+    def __init__(self, root):
+        self.root = root
+        self.requested = []
+
+    @contextmanager
+    def __call__(self, paths):
+        self.requested.append(sorted(paths))
+        yield self.root
+
+
+def _run(repo, checkout, paths=("a.py", "b.py", "slow.py")):
+    return analyze(repo, "HEAD", list(paths), checkout=checkout, analyzer_names=["stub"], shard_files=1)
+
+
+def test_cache_hit_skips_checkout_and_analyzer(stub, repo):
+    first = Checkouts(repo)
+    report = _run(repo, first)
+    assert first.requested == [["a.py", "b.py", "slow.py"]]
+    assert report["stats"]["stub"]["scanned"] == 3
+
+    def no_checkout(paths):
+        raise AssertionError("every file is cached, nothing to check out")
+
+    stub.runs.clear()
+    again = _run(repo, no_checkout)
+    assert stub.runs == []
+    assert again["findings"] == report["findings"]
+    assert again["stats"]["stub"]["cached"] == 3 and again["stats"]["stub"]["scanned"] == 0
+
+
+def test_identical_files_are_analyzed_once(stub, repo):
+    report = _run(repo, Checkouts(repo), paths=["a.py", "same.py"])
+    assert stub.runs == [["a.py"]]
+    assert sorted(f["path"] for f in report["findings"]) == ["a.py", "same.py"]
+
+
+def test_timed_out_shard_only_loses_its_own_files(stub, repo):
+    stub.slow = {"slow.py"}
+    report = _run(repo, Checkouts(repo))
+    assert sorted(f["path"] for f in report["findings"]) == ["a.py", "b.py"]
+    assert report["stats"]["stub"]["shards"] == 3
+    assert report["stats"]["stub"]["failed_shards"] == 1
+    assert len(report["errors"]) == 1 and "timed out" in report["errors"][0]
+
+
+def test_only_scanned_paths_are_cached(stub, repo):
+    stub.slow = {"slow.py"}
+    _run(repo, Checkouts(repo))
+
+    # The timed-out file was not cached: the next run checks out and analyzes only it
+    stub.slow = set()
+    stub.runs.clear()
+    checkouts = Checkouts(repo)
+    report = _run(repo, checkouts)
+    assert checkouts.requested == [["slow.py"]]
+    assert stub.runs == [["slow.py"]]
+    assert report["stats"]["stub"]["cached"] == 2
+    assert sorted(f["path"] for f in report["findings"]) == ["a.py", "b.py", "slow.py"]
+
+
+def test_merge_drops_cross_tool_repeats_and_ranks_by_severity():
+    findings = [
+        _finding("b.py", 9, rule="F401", tool="ruff", message="`os` imported but unused"),
+        _finding("b.py", 9, rule="python.unused-import", tool="semgrep", message="`OS` imported but unused"),
+        _finding("a.py", 3, rule="B006", tool="ruff", severity="INFO", message="mutable default"),
+        _finding("z.py", 1, rule="eval", tool="semgrep", severity="ERROR", message="eval of user input"),
+        _finding("z.py", 1, rule="eval", tool="semgrep", severity="ERROR", message="eval of user input"),
+        _finding("a.py", 2, rule="E999", tool="ruff", severity="ERROR", message="syntax error"),
+    ]
+    merged = merge_findings(findings)
+    assert [(f["path"], f["line"], f["tool"]) for f in merged] == [
+        ("a.py", 2, "ruff"), ("z.py", 1, "semgrep"), ("b.py", 9, "ruff"), ("a.py", 3, "ruff"),
+    ]
+
+
+def test_make_shards_balances_sizes_and_caps_files():
+    sizes = {"big.py": 900, "mid.py": 500, "small1.py": 300, "small2.py": 200, "tiny.py": 10}
+    shards = make_shards(list(sizes), sizes, max_files=3)
+    assert len(shards) == 2
+    assert sorted(p for shard in shards for p in shard) == sorted(sizes)
+    assert all(len(shard) <= 3 for shard in shards)
+    loads = sorted(sum(sizes[p] for p in shard) for shard in shards)
+    assert loads == [910, 1000]
+    assert make_shards([], {}, max_files=3) == []
+
+
+def test_shard_timeout_clamps_and_grows_after_a_timeout():
+    model = ShardTimeout(startup=1.0, seconds_per_kb=0.1, min_timeout=5.0, max_timeout=60.0)
+    assert model.timeout(0) == 5.0
+    assert model.timeout(10_000) == 60.0
+    assert model.timeout(50) == 3.0 * 6.0
+
+    model.observe(50, 0, timed_out=True)
+    assert model.timeout(50) == pytest.approx(1.5 * 18.0)
+    # Shards finishing faster than predicted shrink the budget again
+    for _ in range(20):
+        model.observe(50, 1.0)
+    assert model.timeout(50) < 18.0
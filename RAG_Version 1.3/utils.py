@@ -14,4 +14,4 @@ def safe_truncate(text: str, max_len: int = 4000) -> str:
     last_newline = truncated.rfind('\n')
     if last_newline != -1:
         return truncated[:last_newline] + "\n\n... (Output truncated)"
-    return truncated + " ... (Output truncated)"
\ No newline at end of file
+    return truncated + " ... (Output truncated)"